@@ -1,8 +1,10 @@
 """
 题目相关 API
 """
-from fastapi import APIRouter, HTTPException
-import json
+from fastapi import APIRouter, HTTPException, Request, Response
+import functools
+import hashlib
+import orjson
 from pathlib import Path
 
 router = APIRouter(prefix="/api/questions", tags=["questions"])
@@ -11,64 +13,151 @@ router = APIRouter(prefix="/api/questions", tags=["questions"])
 QUESTIONS_DIR = Path(__file__).parent.parent
 QUESTIONS_FILE = QUESTIONS_DIR / "test_questions_level1.json"
 
+# 题库在一次部署内不变，允许客户端/CDN 缓存 1 小时
+QUESTIONS_CACHE_CONTROL = "public, max-age=3600"
+
+# 可用级别列表（静态数据，启动时序列化一次）
+LEVELS_BODY = orjson.dumps({
+    "levels": [
+        {"id": "level1", "name": "Level 1"}
+        # 可以扩展更多级别
+    ]
+})
+LEVELS_ETAG = f'"{hashlib.md5(LEVELS_BODY).hexdigest()}"'
+
+
+@functools.lru_cache(maxsize=1)
+def _load_questions() -> dict:
+    """
+    读取并缓存题库（题库文件是静态的，进程内只解析一次）
+
+    Returns:
+        按 ID 索引的题库:
+        {level_id: {"level_name": ..., "sections": {section_id: section_dict}}}
+        每个 section_dict 额外带有 "parts_by_id": {part_id: part_dict}
+    """
+    with open(QUESTIONS_FILE, "rb") as f:
+        questions_data = orjson.loads(f.read())
 
-@router.get("/levels")
-async def get_levels():
-    """获取可用的级别列表"""
     return {
-        "levels": [
-            {"id": "level1", "name": "Level 1"}
-            # 可以扩展更多级别
-        ]
+        lv["level_id"]: {
+            "level_name": lv.get("level_name"),
+            "sections": {
+                s["section_id"]: {
+                    **s,
+                    "parts_by_id": {p["part_id"]: p for p in s.get("parts", [])}
+                }
+                for s in lv.get("sections", [])
+            }
+        }
+        for lv in questions_data.get("levels", [])
     }
 
 
+@functools.lru_cache(maxsize=1)
+def _questions_etag() -> str:
+    """
+    计算题库文件的 ETag（文件内容的 MD5，进程内只计算一次）
+
+    Returns:
+        带引号的 ETag 字符串
+    """
+    with open(QUESTIONS_FILE, "rb") as f:
+        return f'"{hashlib.md5(f.read()).hexdigest()}"'
+
+
+def _cache_headers(etag: str) -> dict:
+    """题目接口统一的 HTTP 缓存响应头"""
+    return {"ETag": etag, "Cache-Control": QUESTIONS_CACHE_CONTROL}
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """
+    判断客户端缓存是否仍然有效（If-None-Match 与当前 ETag 匹配）
+
+    Args:
+        request: 当前请求
+        etag: 资源的 ETag
+
+    Returns:
+        是否可以返回 304
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def get_section(level: str, unit: str):
+    """
+    查找指定级别和单元的题目
+
+    Args:
+        level: 级别（如 level1）
+        unit: 单元（如 unit1-3）
+
+    Returns:
+        (level_data, section_data)
+
+    Raises:
+        HTTPException: 级别或单元不存在时返回 404
+    """
+    questions = _load_questions()
+
+    try:
+        level_data = questions[level]
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Level {level} not found")
+
+    try:
+        section_data = level_data["sections"][unit]
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unit {unit} not found in {level}")
+
+    return level_data, section_data
+
+
+@router.get("/levels")
+async def get_levels(request: Request):
+    """获取可用的级别列表"""
+    headers = _cache_headers(LEVELS_ETAG)
+    if _not_modified(request, LEVELS_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=LEVELS_BODY, media_type="application/json", headers=headers)
+
+
 @router.get("/{level}/{unit}")
-async def get_questions(level: str, unit: str):
+async def get_questions(level: str, unit: str, request: Request):
     """
     获取指定级别和单元的题目
     
     Args:
         level: 级别（如 level1）
         unit: 单元（如 unit1-3）
+        request: 当前请求（用于 If-None-Match 协商缓存）
     
     Returns:
-        题目数据
+        题目数据（带 ETag / Cache-Control，缓存命中时返回 304）
     """
     try:
-        # 读取题库文件
-        with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-            questions_data = json.load(f)
-        
-        # 查找对应的 level
-        level_data = None
-        for lv in questions_data.get("levels", []):
-            if lv.get("level_id") == level:
-                level_data = lv
-                break
+        level_data, section_data = get_section(level, unit)
+        etag = _questions_etag()
+        headers = _cache_headers(etag)
         
-        if not level_data:
-            raise HTTPException(status_code=404, detail=f"Level {level} not found")
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
         
-        # 查找对应的 section (unit)
-        section_data = None
-        for section in level_data.get("sections", []):
-            if section.get("section_id") == unit:
-                section_data = section
-                break
-        
-        if not section_data:
-            raise HTTPException(status_code=404, detail=f"Unit {unit} not found in {level}")
-        
-        return {
+        body = orjson.dumps({
             "level": level,
             "level_name": level_data.get("level_name"),
             "unit": unit,
             "unit_name": section_data.get("section_name"),
             "parts": section_data.get("parts", [])
-        }
+        })
+        return Response(content=body, media_type="application/json", headers=headers)
     
     except FileNotFoundError:
         raise HTTPException(status_code=500, detail="Questions file not found")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Questions file format error")
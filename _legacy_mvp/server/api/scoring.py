@@ -2,26 +2,138 @@
 评分 API
 支持两种评测引擎：讯飞语音评测（专业）和 Gemini AI（通用）
 """
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from sqlalchemy.orm import Session
-import json
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Response
+from sqlalchemy.orm import Session, selectinload
+import aiofiles
+import asyncio
+import orjson
+import os
 from typing import List
 from pathlib import Path
 
 from database import get_db
 from models import TestRecord, PartScore, AudioFile
-from schemas import TestResultResponse, PartScoreResponse
-from services.gemini_scorer import evaluate_part1, calculate_star_rating
-from services.part3_evaluator import evaluate_part3_single_question
+from schemas import TestResultResponse
+from services.gemini_scorer import evaluate_part1_async, calculate_star_rating, create_part1_prompt
+from services.part3_evaluator import evaluate_part3_single_question, evaluate_part2_all_async
 from services.xfyun_scorer import (
-    evaluate_words_with_xfyun, 
-    evaluate_part2_all_with_xfyun,
+    evaluate_words_with_xfyun_async,
+    evaluate_part2_all_with_xfyun_async,
     is_xfyun_configured
 )
-from api.questions import QUESTIONS_FILE
+from services.cost_calculator import estimate_tokens, estimate_audio_tokens, calculate_cost
+from services.file_cleanup import get_cleanup_service
+from api.questions import get_section
 
 router = APIRouter(prefix="/api/scoring", tags=["scoring"])
 
+# 上传文件分块写盘的块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+async def _save_upload(upload: UploadFile, dst: Path) -> int:
+    """
+    分块将上传的音频异步写入磁盘，避免整个文件驻留内存，也不阻塞事件循环
+    
+    Args:
+        upload: 上传的文件
+        dst: 目标路径
+    
+    Returns:
+        写入的字节数
+    """
+    size = 0
+    async with aiofiles.open(dst, "wb") as f:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def _discard_uploads(paths: List[str]):
+    """
+    删除评分失败时已写入的音频文件，避免残留在上传目录中
+    
+    Args:
+        paths: 音频文件路径列表
+    """
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ 删除失败: {path}, 错误: {str(e)}")
+
+
+def _record_to_dict(record: TestRecord) -> dict:
+    """
+    将测试记录（含已加载的 part_scores）转换为可直接序列化的字典
+    
+    字段与 TestResultResponse 一致，历史接口直接用 orjson 序列化，跳过 Pydantic 校验
+    
+    Args:
+        record: 测试记录
+    
+    Returns:
+        测试结果字典
+    """
+    return {
+        "id": record.id,
+        "student_name": record.student_name,
+        "level": record.level,
+        "unit": record.unit,
+        "total_score": record.total_score,
+        "star_rating": record.star_rating,
+        # 旧记录的额外维度/成本列可能为空，回退为响应模型的默认值
+        "fluency_score": record.fluency_score or 0,
+        "pronunciation_score": record.pronunciation_score or 0,
+        "confidence_score": record.confidence_score or 0,
+        "total_tokens": record.total_tokens or 0,
+        "api_cost": record.api_cost or 0.0,
+        "created_at": record.created_at,
+        "part_scores": [
+            {
+                "part_number": ps.part_number,
+                "score": ps.score,
+                "max_score": ps.max_score,
+                "feedback": ps.feedback,
+                "correct_items": ps.correct_items or [],
+                "incorrect_items": ps.incorrect_items or []
+            }
+            for ps in record.part_scores
+        ]
+    }
+
+
+def _record_to_response(record: TestRecord) -> TestResultResponse:
+    """
+    将测试记录（含已加载的 part_scores）转换为响应模型
+    
+    Args:
+        record: 测试记录
+    
+    Returns:
+        测试结果响应
+    """
+    return TestResultResponse(**_record_to_dict(record))
+
+
+def _records_json_response(records: List[TestRecord]) -> Response:
+    """
+    将测试记录列表直接序列化为 JSON 响应（不构造 Pydantic 模型）
+    
+    Args:
+        records: 测试记录列表
+    
+    Returns:
+        JSON 响应
+    """
+    return Response(
+        content=orjson.dumps([_record_to_dict(record) for record in records], default=str),
+        media_type="application/json"
+    )
+
 
 @router.post("/evaluate", response_model=TestResultResponse)
 async def evaluate_test(
@@ -50,25 +162,22 @@ async def evaluate_test(
     Returns:
         测试结果
     """
+    saved_audio_paths = []  # 已写盘的音频路径（评分失败时删除，成功后交给清理服务）
+    test_record_id = None   # 提交成功后才有值
+    
     try:
-        # 1. 读取题目数据
-        with open(QUESTIONS_FILE, "r", encoding="utf-8") as f:
-            questions_data = json.load(f)
-        
-        # 查找对应的题目
-        level_data = next((lv for lv in questions_data["levels"] if lv["level_id"] == level), None)
-        if not level_data:
-            raise HTTPException(status_code=404, detail=f"Level {level} not found")
-        
-        section_data = next((s for s in level_data["sections"] if s["section_id"] == unit), None)
-        if not section_data:
-            raise HTTPException(status_code=404, detail=f"Unit {unit} not found")
+        # 1. 读取题目数据（题库已在内存中缓存）
+        _, section_data = get_section(level, unit)
         
-        parts = section_data["parts"]
+        parts_by_id = section_data["parts_by_id"]
+        try:
+            part1_data = parts_by_id[1]
+            part2_data = parts_by_id[2]
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"Part {e.args[0]} not found in {unit}")
         
         #2. 保存音频文件并记录大小用于成本计算
         # 使用环境变量配置的绝对路径
-        import os
         UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
         upload_dir = Path(UPLOAD_DIR)
         upload_dir.mkdir(parents=True, exist_ok=True)
@@ -78,37 +187,35 @@ async def evaluate_test(
         audio_files = {}
         audio_sizes = {}  # 记录音频文件大小
         
-        # 保存 Part 1 词汇朗读
+        # Part 1 词汇朗读
         file_path = upload_dir / f"{student_name}_{level}_{unit}_part1_{part1_audio.filename}"
-        content = await part1_audio.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
         audio_files[1] = str(file_path)
-        audio_sizes[1] = len(content)
         
-        # 保存 Part 2 音频文件（问答，一个文件包含所有12个问题）
+        # Part 2 音频文件（问答，一个文件包含所有12个问题）
         part2_file_path = upload_dir / f"{student_name}_{level}_{unit}_part2_{part2_audio.filename}"
-        part2_content = await part2_audio.read()
-        with open(part2_file_path, "wb") as f:
-            f.write(part2_content)
         part2_audio_path = str(part2_file_path)
-        part2_audio_size = len(part2_content)
+        
+        # 两个音频并发写盘（等两个都结束再处理异常，避免删除仍在写入的文件）
+        saved_audio_paths = [audio_files[1], part2_audio_path]
+        save_results = await asyncio.gather(
+            _save_upload(part1_audio, file_path),
+            _save_upload(part2_audio, part2_file_path),
+            return_exceptions=True
+        )
+        for save_result in save_results:
+            if isinstance(save_result, BaseException):
+                raise save_result
+        audio_sizes[1], part2_audio_size = save_results
 
         # 3. 评分 - 支持讯飞（专业）或 Gemini（通用）
-        from services.cost_calculator import estimate_tokens, calculate_cost
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
-        
         total_input_tokens = 0
         total_output_tokens = 0
         scores = []
         
         # Part 1 数据准备（词汇朗读）
-        part1_data = next(p for p in parts if p["part_id"] == 1)
         words_part1 = [item["word"] for item in part1_data["items"]]
         
         # Part 2 数据准备（问答 - 使用原来 Part 3 的数据结构）
-        part2_data = next(p for p in parts if p["part_id"] == 2)
         dialogues_part2 = part2_data["dialogues"]
         
         # 检查是否使用讯飞评测
@@ -119,27 +226,14 @@ async def evaluate_test(
             print("🎯 使用讯飞语音评测引擎")
             
             async def evaluate_with_xfyun_async():
-                """使用讯飞进行评测"""
-                loop = asyncio.get_event_loop()
-                with ThreadPoolExecutor() as executor:
+                """使用讯飞进行评测（两个 WebSocket 会话在事件循环内并发进行，不占用线程池）"""
+                questions = [d["question"] for d in dialogues_part2]
+                return await asyncio.gather(
                     # Part 1: 单词评测
-                    part1_result = await loop.run_in_executor(
-                        executor,
-                        evaluate_words_with_xfyun,
-                        audio_files[1],
-                        words_part1
-                    )
-                    
+                    evaluate_words_with_xfyun_async(audio_files[1], words_part1),
                     # Part 2: 问答评测（所有问题）
-                    questions = [d["question"] for d in dialogues_part2]
-                    part2_result = await loop.run_in_executor(
-                        executor,
-                        evaluate_part2_all_with_xfyun,
-                        part2_audio_path,
-                        questions
-                    )
-                    
-                    return part1_result, part2_result
+                    evaluate_part2_all_with_xfyun_async(part2_audio_path, questions)
+                )
             
             print("🚀 开始讯飞评测：Part 1 + Part 2...")
             xf_part1_result, xf_part2_result = await evaluate_with_xfyun_async()
@@ -189,30 +283,22 @@ async def evaluate_test(
             # ========== 使用 Gemini AI 评测 ==========
             print("🤖 使用 Gemini AI 评测引擎")
             
-            # Part 1 评估函数（异步包装）
+            # Part 1 评估函数（原生异步调用）
             async def evaluate_part_async(part_num, audio_path, audio_size, eval_func, *args):
                 """异步评估Part 1"""
-                loop = asyncio.get_event_loop()
-                with ThreadPoolExecutor() as executor:
-                    score, result = await loop.run_in_executor(executor, eval_func, audio_path, *args)
+                score, result = await eval_func(audio_path, *args)
                 return part_num, score, result, audio_size
             
             # 启动 Part 1 评估任务
-            part1_task = evaluate_part_async(1, audio_files[1], audio_sizes[1], evaluate_part1, words_part1)
+            part1_task = evaluate_part_async(1, audio_files[1], audio_sizes[1], evaluate_part1_async, words_part1)
             
             # Part 2 评估任务（所有12个问题使用一个音频文件）
-            from services.part3_evaluator import evaluate_part2_all
-            
             async def evaluate_part2_async(audio_path, audio_size, dialogues):
                 """异步评估Part 2的所有12个问题"""
-                loop = asyncio.get_event_loop()
-                with ThreadPoolExecutor() as executor:
-                    total_score, question_results, overall_scores = await loop.run_in_executor(
-                        executor,
-                        evaluate_part2_all,
-                        audio_path,
-                        dialogues
-                    )
+                total_score, question_results, overall_scores = await evaluate_part2_all_async(
+                    audio_path,
+                    dialogues
+                )
                 
                 # 计算tokens
                 tokens = estimate_tokens("", audio_size)
@@ -250,16 +336,15 @@ async def evaluate_test(
             part2_overall_scores = part2_result["overall_scores"]
             part2_all_feedback = [f"Q{r.get('question_num', i+1)}: {r.get('feedback', '')}" for i, r in enumerate(part2_question_results)]
             
-            # Part 1 token估算（使用音频大小）
-            from services.gemini_scorer import create_part1_prompt
-            part1_prompt = create_part1_prompt(words_part1)
+            # Part 1 token估算（使用音频大小，prompt 与评分时共用缓存）
+            part1_prompt = create_part1_prompt(tuple(words_part1))
             part1_tokens = estimate_tokens(part1_prompt, audio_sizes[1])
-            total_input_tokens += part1_tokens["input_tokens"]
-            total_output_tokens += part1_tokens["output_tokens"]
+            total_input_tokens += part1_tokens.input_tokens
+            total_output_tokens += part1_tokens.output_tokens
 
             # Part 2 token累加
-            total_input_tokens += part2_result["tokens"]["input_tokens"]
-            total_output_tokens += part2_result["tokens"]["output_tokens"]
+            total_input_tokens += part2_result["tokens"].input_tokens
+            total_output_tokens += part2_result["tokens"].output_tokens
             
             scores.append({
                 "part_number": 2,
@@ -284,20 +369,10 @@ async def evaluate_test(
         
         # 6. 计算API成本（区分文本token和音频token）
         # token已经在前面累加完成，直接计算成本
-        total_text_tokens = 0
-        total_audio_tokens = 0
-        
-        # Part 1 音频token估算
-        total_audio_tokens += int((audio_sizes[1] / (16 * 1024)) * 32)
+        total_audio_tokens = estimate_audio_tokens(audio_sizes[1]) + estimate_audio_tokens(part2_audio_size)
         
-        # Part 2 音频token
-        total_audio_tokens += int((part2_audio_size / (16 * 1024)) * 32)
-        
-        # 文本token粗略估算
-        total_text_tokens = total_input_tokens - total_audio_tokens
-        if total_text_tokens < 0:
-            total_text_tokens = total_input_tokens // 3  # 粗略估算
-
+        # 文本token = 输入token - 音频token（讯飞不消耗 token，此时为 0）
+        total_text_tokens = max(total_input_tokens - total_audio_tokens, 0)
         
         total_tokens = total_input_tokens + total_output_tokens
         api_cost = calculate_cost(total_text_tokens, total_audio_tokens, total_output_tokens)
@@ -322,75 +397,57 @@ async def evaluate_test(
         db.add(test_record)
         db.flush()  # 获取 test_record.id
         
-        # 保存分项评分
-        for score_data in scores:
-            part_score = PartScore(
+        # 保存分项评分（一次性批量添加）
+        part_scores = [
+            PartScore(
                 test_record_id=test_record.id,
                 part_number=score_data["part_number"],
                 score=score_data["score"],
                 max_score=score_data["max_score"],
                 feedback=score_data["feedback"],
-                correct_items=json.dumps(score_data["correct_items"], ensure_ascii=False),
-                incorrect_items=json.dumps(score_data["incorrect_items"], ensure_ascii=False)
+                correct_items=score_data["correct_items"],
+                incorrect_items=score_data["incorrect_items"]
             )
-            db.add(part_score)
-        
-        # 保存音频文件记录
-        saved_audio_paths = []  # 收集所有音频路径用于清理
+            for score_data in scores
+        ]
+        db.add_all(part_scores)
         
-        # Part 1 词汇录音
-        for part_num, file_path in audio_files.items():
-            audio_record = AudioFile(
+        # 保存音频文件记录（Part 1 词汇录音 + Part 2 问答录音）
+        audio_records_data = [
+            (1, audio_files[1], audio_sizes[1]),
+            (2, part2_audio_path, part2_audio_size),
+        ]
+        db.add_all([
+            AudioFile(
                 test_record_id=test_record.id,
                 part_number=part_num,
-                file_path=file_path,
-                file_size=audio_sizes.get(part_num, 0)
+                file_path=path,
+                file_size=size
             )
-            db.add(audio_record)
-            saved_audio_paths.append(file_path)
-        
-        # Part 2 问答音频文件
-        audio_record = AudioFile(
-            test_record_id=test_record.id,
-            part_number=2,  # Part 2
-            file_path=part2_audio_path,
-            file_size=part2_audio_size
-        )
-        db.add(audio_record)
-        saved_audio_paths.append(part2_audio_path)
+            for part_num, path, size in audio_records_data
+        ])
         
         db.commit()
+        test_record_id = test_record.id
         db.refresh(test_record)
         
-        # 🗑️ 调度文件清理任务（1小时后删除录音）
-        from services.file_cleanup import cleanup_service
-        cleanup_service.schedule_cleanup(test_record.id, saved_audio_paths)
-        
         # 6. 返回结果
-        return TestResultResponse(
-            id=test_record.id,
-            student_name=test_record.student_name,
-            level=test_record.level,
-            unit=test_record.unit,
-            total_score=test_record.total_score,
-            star_rating=test_record.star_rating,
-            created_at=test_record.created_at,
-            part_scores=[
-                PartScoreResponse(
-                    part_number=ps.part_number,
-                    score=ps.score,
-                    max_score=ps.max_score,
-                    feedback=ps.feedback,
-                    correct_items=json.loads(ps.correct_items) if ps.correct_items else [],
-                    incorrect_items=json.loads(ps.incorrect_items) if ps.incorrect_items else []
-                )
-                for ps in test_record.part_scores
-            ]
-        )
+        return _record_to_response(test_record)
     
+    except HTTPException:
+        db.rollback()
+        if test_record_id is None:
+            _discard_uploads(saved_audio_paths)
+        raise
     except Exception as e:
         db.rollback()
+        if test_record_id is None:
+            _discard_uploads(saved_audio_paths)
         raise HTTPException(status_code=500, detail=f"评分失败: {str(e)}")
+    finally:
+        # 🗑️ 记录已提交时调度文件清理任务（1小时后删除录音）
+        if test_record_id is not None:
+            get_cleanup_service().schedule_cleanup(test_record_id, saved_audio_paths)
 
 
 @router.get("/history", response_model=List[TestResultResponse])
@@ -404,31 +461,11 @@ async def get_all_history(db: Session = Depends(get_db)):
     Returns:
         所有测试记录列表
     """
-    records = db.query(TestRecord).order_by(TestRecord.created_at.desc()).all()
+    records = db.query(TestRecord).options(
+        selectinload(TestRecord.part_scores)
+    ).order_by(TestRecord.created_at.desc()).all()
     
-    return [
-        TestResultResponse(
-            id=record.id,
-            student_name=record.student_name,
-            level=record.level,
-            unit=record.unit,
-            total_score=record.total_score,
-            star_rating=record.star_rating,
-            created_at=record.created_at,
-            part_scores=[
-                PartScoreResponse(
-                    part_number=ps.part_number,
-                    score=ps.score,
-                    max_score=ps.max_score,
-                    feedback=ps.feedback,
-                    correct_items=json.loads(ps.correct_items) if ps.correct_items else [],
-                    incorrect_items=json.loads(ps.incorrect_items) if ps.incorrect_items else []
-                )
-                for ps in record.part_scores
-            ]
-        )
-        for record in records
-    ]
+    return _records_json_response(records)
 
 
 @router.get("/history/{student_name}", response_model=List[TestResultResponse])
@@ -443,33 +480,13 @@ async def get_history(student_name: str, db: Session = Depends(get_db)):
     Returns:
         测试记录列表
     """
-    records = db.query(TestRecord).filter(
+    records = db.query(TestRecord).options(
+        selectinload(TestRecord.part_scores)
+    ).filter(
         TestRecord.student_name == student_name
     ).order_by(TestRecord.created_at.desc()).all()
     
-    return [
-        TestResultResponse(
-            id=record.id,
-            student_name=record.student_name,
-            level=record.level,
-            unit=record.unit,
-            total_score=record.total_score,
-            star_rating=record.star_rating,
-            created_at=record.created_at,
-            part_scores=[
-                PartScoreResponse(
-                    part_number=ps.part_number,
-                    score=ps.score,
-                    max_score=ps.max_score,
-                    feedback=ps.feedback,
-                    correct_items=json.loads(ps.correct_items) if ps.correct_items else [],
-                    incorrect_items=json.loads(ps.incorrect_items) if ps.incorrect_items else []
-                )
-                for ps in record.part_scores
-            ]
-        )
-        for record in records
-    ]
+    return _records_json_response(records)
 
 
 @router.get("/result/{result_id}", response_model=TestResultResponse)
@@ -484,28 +501,11 @@ async def get_result_by_id(result_id: int, db: Session = Depends(get_db)):
     Returns:
         测试结果
     """
-    record = db.query(TestRecord).filter(TestRecord.id == result_id).first()
+    record = db.query(TestRecord).options(
+        selectinload(TestRecord.part_scores)
+    ).filter(TestRecord.id == result_id).first()
     
     if not record:
         raise HTTPException(status_code=404, detail="测试记录不存在")
     
-    return TestResultResponse(
-        id=record.id,
-        student_name=record.student_name,
-        level=record.level,
-        unit=record.unit,
-        total_score=record.total_score,
-        star_rating=record.star_rating,
-        created_at=record.created_at,
-        part_scores=[
-            PartScoreResponse(
-                part_number=ps.part_number,
-                score=ps.score,
-                max_score=ps.max_score,
-                feedback=ps.feedback,
-                correct_items=json.loads(ps.correct_items) if ps.correct_items else [],
-                incorrect_items=json.loads(ps.incorrect_items) if ps.incorrect_items else []
-            )
-            for ps in record.part_scores
-        ]
-    )
+    return _record_to_response(record)
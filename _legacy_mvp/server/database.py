@@ -1,7 +1,7 @@
 """
 数据库配置 - 支持 SQLite 和 PostgreSQL
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -44,9 +44,51 @@ def init_db():
     # 导入所有模型以确保它们被注册
     import models  # noqa
     Base.metadata.create_all(bind=engine)
+    # create_all 不会给已存在的表补建索引，这里逐个补齐
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # create_all 也不会修改已存在列的类型，旧库中的 JSON 文本列在这里迁移
+    _migrate_json_columns()
     print(f"✅ 数据库表已创建: {DATABASE_URL[:50]}...")
 
 
+# 由 Text（JSON 字符串）改为原生 JSON 的列：(表名, 列名)
+JSON_COLUMNS = (
+    ("part_scores", "correct_items"),
+    ("part_scores", "incorrect_items"),
+)
+
+
+def _migrate_json_columns():
+    """
+    把 PostgreSQL 中仍为 text 的 JSON 列转换为 json 类型
+    
+    psycopg2 下 JSON 列依赖驱动解码，text 列读出来仍是字符串，必须迁移列类型；
+    SQLite 的 JSON 列本身按文本存储，无需处理
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table, column in JSON_COLUMNS:
+            data_type = conn.execute(
+                text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() "
+                    "AND table_name = :table AND column_name = :column"
+                ),
+                {"table": table, "column": column}
+            ).scalar()
+            if data_type != "text":
+                continue
+            # 旧数据由 json.dumps 写入；空字符串视为 NULL
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} "
+                f"TYPE JSON USING NULLIF({column}, '')::json"
+            ))
+            print(f"✅ 已迁移列类型: {table}.{column} text -> json")
+
+
 def get_db():
     """获取数据库会话"""
     db = SessionLocal()
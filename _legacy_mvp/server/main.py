@@ -3,23 +3,40 @@ FastAPI 主应用
 学生口语测试系统后端
 使用 Gemini 2.5 Flash 进行音频分析评分
 """
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from database import init_db
 from api import questions, audio, scoring
+from services.file_cleanup import get_cleanup_service
+
+# 日志级别（生产环境可设为 WARNING，跳过评分过程中的 INFO 日志格式化）
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
 
 # 创建数据库表（启动时自动初始化）
 init_db()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：退出时停止录音清理协程"""
+    yield
+    await get_cleanup_service().shutdown()
+
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="Speaking Test API",
     description="学生口语测试系统 API - 使用 Gemini 2.5 Flash 进行智能评分",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # 使用 orjson 序列化响应
 )
 
 # CORS 配置
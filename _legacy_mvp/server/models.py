@@ -1,7 +1,7 @@
 """
 数据库模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -10,6 +10,10 @@ from database import Base
 class TestRecord(Base):
     """测试记录"""
     __tablename__ = "test_records"
+    __table_args__ = (
+        # 按学生查询历史并按时间倒序
+        Index("ix_student_created", "student_name", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_name = Column(String(100), index=True)
@@ -27,7 +31,7 @@ class TestRecord(Base):
     total_tokens = Column(Integer, default=0)  # 总token数
     api_cost = Column(Float, default=0.0)  # API调用成本（美元）
     
-    created_at = Column(DateTime, default=lambda: datetime.utcnow())
+    created_at = Column(DateTime, default=lambda: datetime.utcnow(), index=True)
 
     
     # 关系
@@ -45,8 +49,8 @@ class PartScore(Base):
     score = Column(Float)
     max_score = Column(Float)
     feedback = Column(Text)  # Gemini 的详细反馈
-    correct_items = Column(Text)  # JSON 字符串存储正确项目
-    incorrect_items = Column(Text)  # JSON 字符串存储错误项目
+    correct_items = Column(JSON)  # 正确项目列表（原生 JSON 列）
+    incorrect_items = Column(JSON)  # 错误项目列表（原生 JSON 列）
     
     # 关系
     test_record = relationship("TestRecord", back_populates="part_scores")
@@ -24,8 +24,12 @@ def main():
     # 1. 运行测试
     print("\n📋 步骤 1: 运行 pytest 测试")
     import subprocess
+    # 按文件分配到多个进程并行执行（同一文件的测试共享 patch 和模块级 fixture）
     result = subprocess.run(
-        ["pytest", "tests/", "-v", "--json-report", "--json-report-file=test_results.json"],
+        [
+            "pytest", "tests/", "-v", "-n", "auto", "--dist=loadfile",
+            "--json-report", "--json-report-file=test_results.json",
+        ],
         capture_output=True,
         text=True
     )
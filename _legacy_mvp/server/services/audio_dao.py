@@ -0,0 +1,27 @@
+"""
+音频文件记录的数据库操作
+"""
+from datetime import datetime
+from typing import Iterable
+from sqlalchemy.orm import Session
+from models import AudioFile
+
+
+def mark_records_deleted(session: Session, test_record_ids: Iterable[int], now: datetime) -> int:
+    """
+    将一批测试记录的音频文件标记为已清理（单条 UPDATE，不加载行对象，不提交）
+
+    Args:
+        session: 数据库会话
+        test_record_ids: 测试记录ID列表
+        now: 清理时间
+
+    Returns:
+        更新的音频文件记录数
+    """
+    return session.query(AudioFile).filter(
+        AudioFile.test_record_id.in_(list(test_record_ids))
+    ).update(
+        {AudioFile.file_path: None, AudioFile.deleted_at: now},
+        synchronize_session=False
+    )
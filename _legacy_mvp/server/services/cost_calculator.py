@@ -3,17 +3,39 @@ API成本计算工具
 基于Gemini API定价计算token使用和成本
 """
 
+from typing import NamedTuple
+
 # Gemini 2.5 Flash 定价（2024年12月 - 付费层级）
 # 参考: https://ai.google.dev/gemini-api/docs/pricing?hl=zh-cn#gemini-2.5-flash
 PRICE_PER_1K_INPUT_TOKENS_TEXT = 0.0003  # $0.30 per 1M tokens (文字/图片/视频)
 PRICE_PER_1K_INPUT_TOKENS_AUDIO = 0.001  # $1.00 per 1M tokens (音频)
 PRICE_PER_1K_OUTPUT_TOKENS = 0.0025      # $2.50 per 1M tokens (输出，包括思考token)
 
+# 预先换算为每个 token 的单价，避免每次计算都做除法
+PRICE_PER_TOKEN_TEXT = PRICE_PER_1K_INPUT_TOKENS_TEXT / 1000
+PRICE_PER_TOKEN_AUDIO = PRICE_PER_1K_INPUT_TOKENS_AUDIO / 1000
+PRICE_PER_TOKEN_OUTPUT = PRICE_PER_1K_OUTPUT_TOKENS / 1000
+
 
 # 音频token计算（官方标准）
 # 参考: https://ai.google.dev/gemini-api/docs/tokens?hl=zh-cn&lang=python#video-audio
 TOKENS_PER_SECOND_AUDIO = 32  # 音频：每秒 32 个 token
 
+# WebM/Opus 音频大约 16KB/秒（取决于比特率）
+AUDIO_BYTES_PER_SECOND = 16 * 1024
+AUDIO_SECONDS_PER_BYTE = 1.0 / AUDIO_BYTES_PER_SECOND
+AUDIO_TOKENS_PER_BYTE = TOKENS_PER_SECOND_AUDIO * AUDIO_SECONDS_PER_BYTE
+
+
+class TokenEstimate(NamedTuple):
+    """token 估算结果"""
+    text_tokens: int               # 文本token（用于计算成本）
+    audio_tokens: int              # 音频token（用于计算成本）
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    audio_duration_seconds: float
+
 
 def estimate_audio_duration(audio_bytes: int) -> float:
     """
@@ -26,13 +48,24 @@ def estimate_audio_duration(audio_bytes: int) -> float:
     Returns:
         音频时长（秒）
     """
-    # WebM/Opus 音频大约 16KB/秒（取决于比特率）
     # 这是一个粗略估算，实际应该用音频库获取精确时长
-    estimated_duration = audio_bytes / (16 * 1024)
-    return max(1, estimated_duration)  # 至少1秒
+    return max(1, audio_bytes * AUDIO_SECONDS_PER_BYTE)  # 至少1秒
 
 
-def estimate_tokens(text: str, audio_bytes: int = 0) -> dict:
+def estimate_audio_tokens(audio_bytes: int) -> int:
+    """
+    按音频文件大小估算音频 token 数（不做最短时长修正，用于成本拆分）
+    
+    Args:
+        audio_bytes: 音频文件大小（字节）
+    
+    Returns:
+        音频 token 数
+    """
+    return int(audio_bytes * AUDIO_TOKENS_PER_BYTE)
+
+
+def estimate_tokens(text: str, audio_bytes: int = 0) -> TokenEstimate:
     """
     估算token数量（基于官方标准）
     
@@ -41,7 +74,7 @@ def estimate_tokens(text: str, audio_bytes: int = 0) -> dict:
         audio_bytes: 音频文件大小（字节）
     
     Returns:
-        包含input和output token估算的字典
+        TokenEstimate，包含input和output token估算
     """
     # 文本token估算（粗略估算：1个token约4个字符）
     text_tokens = len(text) // 4
@@ -54,20 +87,14 @@ def estimate_tokens(text: str, audio_bytes: int = 0) -> dict:
         audio_tokens = 0
         audio_duration = 0
     
-    # 总输入token
     input_tokens = text_tokens + audio_tokens
-    
     # 输出token估算（通常远少于输入，假设为输入的1/5）
     output_tokens = input_tokens // 5
     
-    return {
-        "text_tokens": text_tokens,      # 文本token（用于计算成本）
-        "audio_tokens": audio_tokens,    # 音频token（用于计算成本）
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-        "total_tokens": input_tokens + output_tokens,
-        "audio_duration_seconds": audio_duration
-    }
+    return TokenEstimate(
+        text_tokens, audio_tokens, input_tokens, output_tokens,
+        input_tokens + output_tokens, audio_duration
+    )
 
 
 def calculate_cost(text_tokens: int, audio_tokens: int, output_tokens: int) -> float:
@@ -82,10 +109,9 @@ def calculate_cost(text_tokens: int, audio_tokens: int, output_tokens: int) -> f
     Returns:
         成本（美元）
     """
-    text_input_cost = (text_tokens / 1000) * PRICE_PER_1K_INPUT_TOKENS_TEXT
-    audio_input_cost = (audio_tokens / 1000) * PRICE_PER_1K_INPUT_TOKENS_AUDIO
-    output_cost = (output_tokens / 1000) * PRICE_PER_1K_OUTPUT_TOKENS
-    return text_input_cost + audio_input_cost + output_cost
+    return (text_tokens * PRICE_PER_TOKEN_TEXT
+            + audio_tokens * PRICE_PER_TOKEN_AUDIO
+            + output_tokens * PRICE_PER_TOKEN_OUTPUT)
 
 
 
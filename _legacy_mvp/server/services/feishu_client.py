@@ -4,10 +4,222 @@
 """
 import os
 import json
+import asyncio
+import threading
+import time
+import httpx
+import orjson
 import requests
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+# tenant_access_token 提前刷新的余量（秒），避免临近过期的令牌在请求途中失效
+TOKEN_REFRESH_MARGIN = 300
+
+# 飞书返回的令牌无效错误码
+INVALID_TOKEN_CODES = frozenset({99991663})
+
+# 飞书限流错误码（HTTP 429 之外，部分接口以业务错误码返回限流）
+RATE_LIMIT_CODES = frozenset({99991400, 11232})
+
+# 限流时的最大重试次数
+FEISHU_MAX_RETRIES = 5
+
+# 进程内共享的令牌缓存 {app_id: (token, 过期时间)}，多个客户端/线程共用同一个有效令牌
+_token_cache: Dict[str, Tuple[str, float]] = {}
+_token_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    """
+    创建带连接池和自动重试的 HTTP 会话
+
+    复用 TCP/TLS 连接，避免每次调用飞书 API 都重新握手；
+    连接失败和 5xx 响应自动退避重试（POST 只重试连接错误，不重复提交）
+
+    Returns:
+        配置好的 requests 会话
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504]  # 429 由 _request_with_auth_retry 按飞书限流头处理
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+
+def _json(response) -> Dict:
+    """
+    解析响应体 JSON（orjson 直接解析字节，不先解码成 str）
+
+    Args:
+        response: requests 或 httpx 的响应对象
+
+    Returns:
+        解析后的字典
+    """
+    return orjson.loads(response.content)
+
+
+def _rate_limit_delay(headers, attempt: int) -> float:
+    """
+    计算限流后的等待时间：优先使用飞书的 x-ogw-ratelimit-reset / Retry-After 响应头，
+    否则按指数退避
+
+    Args:
+        headers: 响应头（大小写不敏感）
+        attempt: 第几次重试（从0开始）
+
+    Returns:
+        等待秒数
+    """
+    for name in ("x-ogw-ratelimit-reset", "Retry-After"):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                pass
+    return float(2 ** attempt)
+
+
+# 机器人 Webhook 通知共用的会话
+_WEBHOOK_SESSION = _build_session()
+
+# 请求超时（连接, 读取）：连接超时略高于 TCP 重传窗口，快速暴露不可达；读取给足时间
+FEISHU_TIMEOUT = (3.05, 15)
+# 机器人通知非关键路径，超时更短
+WEBHOOK_TIMEOUT = (1, 5)
+# 连续连接超时达到该次数后，在冷却时间内直接失败，不再占用线程等待
+MAX_CONSECUTIVE_CONNECT_TIMEOUTS = 2
+CONNECT_FAILURE_COOLDOWN = 30.0
+
+# 飞书创建子块接口单次最多 50 个 children
+MAX_CHILDREN_PER_REQUEST = 50
+
+# 报告中每个文本块最多列出的测试数，避免单个块过大
+TESTS_PER_TEXT_BLOCK = 50
+
+# 批量异步操作的并发上限和每秒请求数上限
+FEISHU_MAX_CONCURRENCY = int(os.getenv("FEISHU_MAX_CONCURRENCY", "50"))
+FEISHU_QPS = float(os.getenv("FEISHU_QPS", "100"))
+
+# 飞书 docx 块类型
+BLOCK_TYPE_TEXT = 2
+BLOCK_TYPE_HEADINGS = {1: (3, "heading1"), 2: (4, "heading2"), 3: (5, "heading3")}
+BLOCK_TYPE_CODE = 14
+
+
+def _text_elements(text: str) -> List[Dict]:
+    """构建块的文本元素"""
+    return [{"text_run": {"content": text}}]
+
+
+def _text_block(text: str) -> Dict:
+    """构建文本块"""
+    return {"block_type": BLOCK_TYPE_TEXT, "text": {"elements": _text_elements(text)}}
+
+
+def _heading_block(text: str, level: int = 1) -> Dict:
+    """构建标题块（level 1-3）"""
+    block_type, key = BLOCK_TYPE_HEADINGS[level]
+    return {"block_type": block_type, key: {"elements": _text_elements(text)}}
+
+
+def _code_block(text: str) -> Dict:
+    """构建代码块"""
+    return {"block_type": BLOCK_TYPE_CODE, "code": {"elements": _text_elements(text)}}
+
+
+# 请求体模板中的占位符
+_PLACEHOLDER = "__FEISHU_VALUE__"
+
+# 预序列化请求体的 Content-Type
+_JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+
+def _compile_payload(skeleton: Dict) -> List[bytes]:
+    """
+    预先序列化请求体骨架，按占位符拆成若干段
+
+    Args:
+        skeleton: 用 _PLACEHOLDER 标记可变字段的请求体
+
+    Returns:
+        序列化后的片段列表（片段数 = 占位符数 + 1）
+    """
+    serialized = json.dumps(skeleton, ensure_ascii=False, separators=(",", ":"))
+    return [part.encode("utf-8") for part in serialized.split(json.dumps(_PLACEHOLDER))]
+
+
+def _render_payload(template: List[bytes], *values) -> bytes:
+    """
+    按顺序把变化的值填入预序列化的模板
+
+    Args:
+        template: _compile_payload 的结果
+        *values: 依次替换各占位符的值
+
+    Returns:
+        JSON 请求体
+    """
+    parts = [template[0]]
+    for value, part in zip(values, template[1:]):
+        parts.append(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        parts.append(part)
+    return b"".join(parts)
+
+
+def _single_child_skeleton(block: Dict) -> Dict:
+    """只包含一个子块的创建请求骨架"""
+    return {"children": [block], "index": -1}
+
+
+_TEXT_BLOCK_TMPL = _compile_payload(
+    _single_child_skeleton({"text_block": {"elements": _text_elements(_PLACEHOLDER)}})
+)
+_HEADING_TMPLS = {
+    level: _compile_payload(
+        _single_child_skeleton({f"heading{level}": {"elements": _text_elements(_PLACEHOLDER)}})
+    )
+    for level in (1, 2, 3)
+}
+_TABLE_TMPL = _compile_payload(
+    _single_child_skeleton({"table": {"table_property": {"row_size": _PLACEHOLDER, "column_size": _PLACEHOLDER}}})
+)
+_CELL_TMPL = _compile_payload(
+    {"block_id": _PLACEHOLDER, "table_cell": {"elements": _text_elements(_PLACEHOLDER)}}
+)
+
+
+def _partition_tests(tests: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    一次遍历把测试结果按 outcome 分组
+
+    Args:
+        tests: pytest 测试结果列表
+
+    Returns:
+        (passed_tests, failed_tests, skipped_tests)
+    """
+    groups = {"passed": [], "failed": [], "skipped": []}
+    for test in tests:
+        group = groups.get(test.get("outcome"))
+        if group is not None:
+            group.append(test)
+    return groups["passed"], groups["failed"], groups["skipped"]
+
+
+def _call_info(test: Dict) -> Tuple[Dict, Dict]:
+    """取出测试的 call 和 crash 信息（缺失或为 None 时返回空字典）"""
+    call_info = test.get("call") or {}
+    return call_info, call_info.get("crash") or {}
+
 
 class FeishuClient:
     """飞书 API 客户端"""
@@ -23,33 +235,132 @@ class FeishuClient:
         self.app_id = app_id or os.getenv("FEISHU_APP_ID")
         self.app_secret = app_secret or os.getenv("FEISHU_APP_SECRET")
         self.base_url = "https://open.feishu.cn/open-apis"
+        self._documents_url = f"{self.base_url}/docx/v1/documents"
         self._access_token: Optional[str] = None
+        self._token_expiry = 0.0  # time.monotonic() 时间
+        self._session = _build_session()
+        self._connect_timeouts = 0  # 连续连接超时次数
+        self._fail_fast_until = 0.0  # time.monotonic() 时间
+
+    def _block_url(self, document_id: str, block_id: str) -> str:
+        """文档中某个块的接口地址前缀（子块、单元格等接口在其后追加路径）"""
+        return f"{self._documents_url}/{document_id}/blocks/{block_id}"
 
     def get_access_token(self) -> str:
         """
-        获取 tenant_access_token
+        获取 tenant_access_token（按过期时间缓存，临近过期时提前刷新）
 
         Returns:
             访问令牌
         """
-        if self._access_token:
+        if self._access_token and time.monotonic() < self._token_expiry:
             return self._access_token
 
+        with _token_lock:
+            cached = _token_cache.get(self.app_id)
+            if cached is None or time.monotonic() >= cached[1]:
+                cached = self._fetch_access_token()
+                _token_cache[self.app_id] = cached
+            self._access_token, self._token_expiry = cached
+
+        # 鉴权头只在会话上设置一次，后续请求自动携带
+        self._session.headers.update({"Authorization": f"Bearer {self._access_token}"})
+        return self._access_token
+
+    def _fetch_access_token(self) -> Tuple[str, float]:
+        """
+        向飞书请求新的 tenant_access_token
+
+        Returns:
+            (令牌, 提前刷新的过期时间)
+        """
         url = f"{self.base_url}/auth/v3/tenant_access_token/internal"
         payload = {
             "app_id": self.app_id,
             "app_secret": self.app_secret
         }
 
-        response = requests.post(url, json=payload, timeout=10)
+        response = self._session.post(url, json=payload, timeout=FEISHU_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = _json(response)
 
         if data.get("code") != 0:
             raise Exception(f"获取飞书 token 失败: {data.get('msg')}")
 
-        self._access_token = data["tenant_access_token"]
-        return self._access_token
+        expire = data.get("expire", 7200)
+        return data["tenant_access_token"], time.monotonic() + expire - TOKEN_REFRESH_MARGIN
+
+    def _invalidate_token(self):
+        """丢弃当前令牌（只清理与自己相同的共享缓存，不影响其他线程刚刷新的令牌）"""
+        with _token_lock:
+            cached = _token_cache.get(self.app_id)
+            if cached and cached[0] == self._access_token:
+                del _token_cache[self.app_id]
+        self._access_token = None
+        self._token_expiry = 0.0
+
+    def _request_with_auth_retry(self, method: str, url: str, **kwargs) -> Dict:
+        """
+        发送带鉴权的请求
+        - 令牌失效（HTTP 401 或令牌无效错误码）时刷新令牌并重试一次
+        - 被限流（HTTP 429 或限流错误码）时按响应头/指数退避等待后重试，最多 FEISHU_MAX_RETRIES 次
+        - 连续 MAX_CONSECUTIVE_CONNECT_TIMEOUTS 次连接超时后，冷却期内的请求直接失败
+
+        Args:
+            method: HTTP 方法
+            url: 请求地址
+            **kwargs: 透传给 requests 的参数（json 等）
+
+        Returns:
+            响应 JSON
+        """
+        if time.monotonic() < self._fail_fast_until:
+            raise Exception("飞书连接连续超时，暂停请求")
+
+        auth_retried = False
+
+        for attempt in range(FEISHU_MAX_RETRIES + 1):
+            can_retry = attempt < FEISHU_MAX_RETRIES
+            self.get_access_token()
+            try:
+                response = self._session.request(method, url, timeout=FEISHU_TIMEOUT, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                self._connect_timeouts += 1
+                if self._connect_timeouts >= MAX_CONSECUTIVE_CONNECT_TIMEOUTS:
+                    print(f"⚠️ 飞书连接连续超时 {self._connect_timeouts} 次，{CONNECT_FAILURE_COOLDOWN:.0f}秒内直接失败")
+                    self._fail_fast_until = time.monotonic() + CONNECT_FAILURE_COOLDOWN
+                raise
+            self._connect_timeouts = 0
+
+            if response.status_code == 401 and not auth_retried and can_retry:
+                print("🔄 飞书令牌已失效，刷新后重试")
+                self._invalidate_token()
+                auth_retried = True
+                continue
+
+            if response.status_code == 429 and can_retry:
+                delay = _rate_limit_delay(response.headers, attempt)
+                print(f"⏳ 飞书接口限流，{delay:.1f}秒后重试 ({attempt + 1}/{FEISHU_MAX_RETRIES})")
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            data = _json(response)
+            code = data.get("code")
+
+            if code in INVALID_TOKEN_CODES and not auth_retried and can_retry:
+                print("🔄 飞书令牌已失效，刷新后重试")
+                self._invalidate_token()
+                auth_retried = True
+                continue
+
+            if code in RATE_LIMIT_CODES and can_retry:
+                delay = _rate_limit_delay(response.headers, attempt)
+                print(f"⏳ 飞书接口限流，{delay:.1f}秒后重试 ({attempt + 1}/{FEISHU_MAX_RETRIES})")
+                time.sleep(delay)
+                continue
+
+            return data
 
     def create_document(self, title: str = "测试报告") -> str:
         """
@@ -61,18 +372,14 @@ class FeishuClient:
         Returns:
             文档 ID
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents"
-        headers = {"Authorization": f"Bearer {token}"}
+        url = self._documents_url
 
         payload = {
             "title": title,
             "folder_token": ""  # 空字符串表示根目录
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("POST", url, json=payload)
 
         if data.get("code") != 0:
             raise Exception(f"创建文档失败: {data.get('msg')}")
@@ -93,30 +400,10 @@ class FeishuClient:
         Returns:
             新创建的块 ID
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{block_id}/children"
-        headers = {"Authorization": f"Bearer {token}"}
+        url = f"{self._block_url(document_id, block_id)}/children"
+        body = _render_payload(_TEXT_BLOCK_TMPL, text)
 
-        payload = {
-            "children": [
-                {
-                    "text_block": {
-                        "elements": [
-                            {
-                                "text_run": {
-                                    "content": text
-                                }
-                            }
-                        ]
-                    }
-                }
-            ],
-            "index": -1
-        }
-
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("POST", url, data=body, headers=_JSON_HEADERS)
 
         if data.get("code") != 0:
             raise Exception(f"添加文本块失败: {data.get('msg')}")
@@ -136,30 +423,10 @@ class FeishuClient:
         Returns:
             新创建的块 ID
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{block_id}/children"
-        headers = {"Authorization": f"Bearer {token}"}
-
-        payload = {
-            "children": [
-                {
-                    "heading1" if level == 1 else "heading2" if level == 2 else "heading3": {
-                        "elements": [
-                            {
-                                "text_run": {
-                                    "content": text
-                                }
-                            }
-                        ]
-                    }
-                }
-            ],
-            "index": -1
-        }
+        url = f"{self._block_url(document_id, block_id)}/children"
+        body = _render_payload(_HEADING_TMPLS.get(level, _HEADING_TMPLS[3]), text)
 
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("POST", url, data=body, headers=_JSON_HEADERS)
 
         if data.get("code") != 0:
             raise Exception(f"添加标题块失败: {data.get('msg')}")
@@ -179,28 +446,12 @@ class FeishuClient:
         Returns:
             表格块信息（包含 table_id）
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{block_id}/children"
-        headers = {"Authorization": f"Bearer {token}"}
+        url = f"{self._block_url(document_id, block_id)}/children"
 
         # 创建表格
-        payload = {
-            "children": [
-                {
-                    "table": {
-                        "table_property": {
-                            "row_size": rows,
-                            "column_size": columns
-                        }
-                    }
-                }
-            ],
-            "index": -1
-        }
+        body = _render_payload(_TABLE_TMPL, rows, columns)
 
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("POST", url, data=body, headers=_JSON_HEADERS)
 
         if data.get("code") != 0:
             raise Exception(f"添加表格块失败: {data.get('msg')}")
@@ -225,30 +476,31 @@ class FeishuClient:
             column_index: 列索引（从0开始）
             text: 单元格文本
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{table_id}/table/cells/{row_index}/{column_index}"
-        headers = {"Authorization": f"Bearer {token}"}
-
-        payload = {
-            "block_id": table_id,
-            "table_cell": {
-                "elements": [
-                    {
-                        "text_run": {
-                            "content": text
-                        }
-                    }
-                ]
-            }
-        }
+        url = f"{self._block_url(document_id, table_id)}/table/cells/{row_index}/{column_index}"
+        body = _render_payload(_CELL_TMPL, table_id, text)
 
-        response = requests.put(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("PUT", url, data=body, headers=_JSON_HEADERS)
 
         if data.get("code") != 0:
             raise Exception(f"设置单元格失败: {data.get('msg')}")
 
+    def set_table_cells_bulk(self, document_id: str, table_id: str, cells: List[Tuple[int, int, str]]):
+        """
+        并发设置多个表格单元格（同步入口，内部使用 AsyncFeishuClient）
+
+        注意：不能在已运行的事件循环中调用，异步代码请直接使用 AsyncFeishuClient
+
+        Args:
+            document_id: 文档 ID
+            table_id: 表格 ID
+            cells: [(row_index, column_index, text), ...]
+        """
+        async def _run():
+            async with AsyncFeishuClient(self) as client:
+                await client.set_table_cells_bulk(document_id, table_id, cells)
+
+        asyncio.run(_run())
+
     def get_page_block_id(self, document_id: str) -> str:
         """
         获取文档的 page 块 ID（用于添加子块）
@@ -259,13 +511,9 @@ class FeishuClient:
         Returns:
             page 块 ID
         """
-        token = self.get_access_token()
-        url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{document_id}/children"
-        headers = {"Authorization": f"Bearer {token}"}
+        url = f"{self._block_url(document_id, document_id)}/children"
 
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = self._request_with_auth_retry("GET", url)
 
         if data.get("code") != 0:
             raise Exception(f"获取文档块失败: {data.get('msg')}")
@@ -280,6 +528,38 @@ class FeishuClient:
         print(f"ℹ️ 未找到 page 块，使用 document_id: {document_id}")
         return document_id
 
+    def add_children_blocks(self, document_id: str, block_id: str, children: List[Dict]) -> List[str]:
+        """
+        批量向文档添加子块（一次请求写入多个块，超过接口上限时分批）
+
+        Args:
+            document_id: 文档 ID
+            block_id: 父块 ID
+            children: 块列表（_text_block / _heading_block / _code_block 构建）
+
+        Returns:
+            新创建的块 ID 列表
+        """
+        url = f"{self._block_url(document_id, block_id)}/children"
+        block_ids = []
+
+        for start in range(0, len(children), MAX_CHILDREN_PER_REQUEST):
+            payload = {
+                "children": children[start:start + MAX_CHILDREN_PER_REQUEST],
+                "index": -1
+            }
+
+            data = self._request_with_auth_retry("POST", url, json=payload)
+
+            if data.get("code") != 0:
+                raise Exception(f"添加子块失败: {data.get('msg')}")
+
+            block_ids.extend(
+                child.get("block_id") for child in data.get("data", {}).get("children", [])
+            )
+
+        return block_ids
+
     def export_test_report(self, test_results: Dict) -> str:
         """
         导出测试报告到飞书云文档
@@ -303,64 +583,31 @@ class FeishuClient:
         skipped = summary.get("skipped", 0)
         duration = summary.get("duration", 0)
 
-        # 构建测试报告文本（作为文档描述）
-        report_text = f"""Python 单元测试报告
-
-测试概览:
+        # 构建测试报告块
+        children = [
+            _heading_block("Python 单元测试报告", 1),
+            _text_block(f"""测试概览:
 - 测试时间: {timestamp}
 - 总测试数: {total}
 - 通过: {passed}
 - 失败: {failed}
 - 跳过: {skipped}
 - 执行时间: {duration:.2f} 秒
-- 通过率: {(passed / total * 100) if total > 0 else 0:.1f}%
-
-"""
+- 通过率: {(passed / total * 100) if total > 0 else 0:.1f}%""")
+        ]
 
         if failed > 0:
-            report_text += "\n失败用例详情:\n\n"
-            for test in test_results.get("tests", []):
-                if test.get("outcome") == "failed":
-                    test_name = test.get("name", "未知")
-                    error_msg = test.get("call", {}).get("crash", {}).get("message", "无错误信息")
-                    report_text += f"❌ {test_name}\n{error_msg[:300]}\n\n"
-
-        # 使用块更新 API 添加内容
+            _, failed_tests, _ = _partition_tests(test_results.get("tests", ()))
+            children.append(_heading_block("失败用例详情", 2))
+            for test in failed_tests:
+                _, crash_info = _call_info(test)
+                error_msg = crash_info.get("message", "无错误信息")
+                children.append(_text_block(f"❌ {test.get('name', '未知')}\n{error_msg[:300]}"))
+
+        # 新创建的文档是空的，直接向 document_id 一次性添加所有子块
         try:
-            token = self.get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
-            # 新创建的文档是空的，直接向 document_id 添加子块
-            # 使用正确的 API 格式
-            url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{document_id}/children"
-
-            # 构建文本块 - block_type=2 表示文本块
-            payload = {
-                "children": [
-                    {
-                        "block_type": 2,  # 2 = text 块
-                        "text": {
-                            "elements": [
-                                {
-                                    "text_run": {
-                                        "content": report_text
-                                    }
-                                }
-                            ]
-                        }
-                    }
-                ],
-                "index": -1
-            }
-
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("code") == 0:
-                print("✅ 内容已成功添加到文档")
-            else:
-                print(f"⚠️ 添加内容时API返回错误: {data.get('msg')}")
+            self.add_children_blocks(document_id, document_id, children)
+            print("✅ 内容已成功添加到文档")
 
         except Exception as e:
             print(f"⚠️ 添加内容时出错: {str(e)}")
@@ -396,87 +643,51 @@ class FeishuClient:
         duration = summary.get("duration", 0)
         pass_rate = (passed / total * 100) if total > 0 else 0
 
-        # 构建详细报告文本
-        report_lines = [
-            f"# Python 单元测试报告",
-            f"",
-            f"## 测试概览",
-            f"- **测试时间**: {timestamp}",
-            f"- **总测试数**: {total}",
-            f"- **通过**: {passed} ✅",
-            f"- **失败**: {failed} ❌",
-            f"- **跳过**: {skipped} ⏭️",
-            f"- **执行时间**: {duration:.2f} 秒",
-            f"- **通过率**: {pass_rate:.1f}%",
-            f"",
-            f"## 通过的测试 ({passed})",
-            f""
+        # 构建详细报告块（标题 / 文本 / 代码块，一次请求写入）
+        children = [
+            _heading_block("Python 单元测试报告", 1),
+            _heading_block("测试概览", 2),
+            _text_block("\n".join([
+                f"测试时间: {timestamp}",
+                f"总测试数: {total}",
+                f"通过: {passed} ✅",
+                f"失败: {failed} ❌",
+                f"跳过: {skipped} ⏭️",
+                f"执行时间: {duration:.2f} 秒",
+                f"通过率: {pass_rate:.1f}%"
+            ])),
+            _heading_block(f"通过的测试 ({passed})", 2)
         ]
 
-        # 添加通过的测试列表
-        for test in test_results.get("tests", []):
-            if test.get("outcome") == "passed":
-                name = test.get("nodeid", "").replace("tests/", "")
-                test_duration = test.get("duration", 0)
-                report_lines.append(f"- ✅ `{name}` ({test_duration:.3f}s)")
+        passed_tests, failed_tests, _ = _partition_tests(test_results.get("tests", ()))
 
-        # 添加失败的测试详情
+        # 添加通过的测试列表（每 TESTS_PER_TEXT_BLOCK 个测试一个文本块）
+        passed_lines = [
+            f"✅ {test.get('nodeid', '').replace('tests/', '')} ({test.get('duration', 0):.3f}s)"
+            for test in passed_tests
+        ]
+        for start in range(0, len(passed_lines), TESTS_PER_TEXT_BLOCK):
+            children.append(_text_block("\n".join(passed_lines[start:start + TESTS_PER_TEXT_BLOCK])))
+
+        # 添加失败的测试详情（每个失败用例：标题 + 错误原因 + 堆栈信息）
         if failed > 0:
-            report_lines.append(f"")
-            report_lines.append(f"## 失败的测试 ({failed})")
-            report_lines.append(f"")
-
-            for test in test_results.get("tests", []):
-                if test.get("outcome") == "failed":
-                    name = test.get("nodeid", "").replace("tests/", "")
-                    # 获取错误信息
-                    call_info = test.get("call", {})
-                    crash_info = call_info.get("crash", {})
-                    error_msg = crash_info.get("message", "未知错误")
-                    longrepr = call_info.get("longrepr", "")
-
-                    report_lines.append(f"### ❌ `{name}`")
-                    report_lines.append(f"")
-                    report_lines.append(f"**错误原因**:")
-                    report_lines.append(f"```")
-                    report_lines.append(f"{error_msg[:500]}")
-                    report_lines.append(f"```")
-                    report_lines.append(f"")
-                    report_lines.append(f"**堆栈信息**:")
-                    report_lines.append(f"```")
-                    report_lines.append(f"{longrepr[:800]}")
-                    report_lines.append(f"```")
-                    report_lines.append(f"")
-
-        # 合并为单个文本
-        full_report = "\n".join(report_lines)
-
-        # 添加到飞书文档（使用 block_type=2）
-        try:
-            token = self.get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-            url = f"{self.base_url}/docx/v1/documents/{document_id}/blocks/{document_id}/children"
+            children.append(_heading_block(f"失败的测试 ({failed})", 2))
 
-            payload = {
-                "children": [{
-                    "block_type": 2,  # 文本块
-                    "text": {
-                        "elements": [{
-                            "text_run": {
-                                "content": full_report
-                            }
-                        }]
-                    }
-                }],
-                "index": -1
-            }
+            for test in failed_tests:
+                name = test.get("nodeid", "").replace("tests/", "")
+                # 获取错误信息
+                call_info, crash_info = _call_info(test)
+                error_msg = crash_info.get("message", "未知错误")
+                longrepr = call_info.get("longrepr", "")
 
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+                children.append(_heading_block(f"❌ {name}", 3))
+                children.append(_code_block(error_msg[:500]))
+                children.append(_code_block(longrepr[:800]))
 
-            if data.get("code") == 0:
-                print("✅ 详细报告内容已成功添加到文档")
+        # 添加到飞书文档
+        try:
+            self.add_children_blocks(document_id, document_id, children)
+            print("✅ 详细报告内容已成功添加到文档")
 
         except Exception as e:
             print(f"⚠️ 添加内容时出错: {str(e)}")
@@ -487,6 +698,198 @@ class FeishuClient:
         return doc_url
 
 
+class _AsyncRateLimiter:
+    """
+    自适应的异步限速器：相邻两次请求至少间隔 1/rate 秒
+
+    被限流时速率减半；连续成功 RATE_GROWTH_INTERVAL 次后速率提高 10%（不超过初始上限）
+    """
+
+    RATE_GROWTH_INTERVAL = 100
+    MIN_RATE = 1.0
+
+    def __init__(self, rate: float):
+        self.max_rate = rate
+        self.rate = rate
+        self._successes = 0
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """等待直到允许发出下一个请求"""
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """记录一次成功请求，累计到阈值后逐步恢复速率"""
+        self._successes += 1
+        if self._successes >= self.RATE_GROWTH_INTERVAL:
+            self._successes = 0
+            self.rate = min(self.rate * 1.1, self.max_rate)
+
+    def on_throttled(self):
+        """被限流时速率减半"""
+        self._successes = 0
+        self.rate = max(self.rate / 2, self.MIN_RATE)
+
+
+class AsyncFeishuClient:
+    """
+    飞书 API 异步客户端（用于批量操作）
+
+    共用 FeishuClient 的令牌缓存；请求受信号量（并发数）和限速器（QPS）双重约束，
+    N 个独立请求的耗时从 N·RTT 降到约 ⌈N/并发数⌉·RTT
+    """
+
+    def __init__(self, client: FeishuClient = None, max_concurrency: int = FEISHU_MAX_CONCURRENCY,
+                 qps: float = FEISHU_QPS, transport: httpx.AsyncBaseTransport = None):
+        """
+        初始化异步客户端
+
+        Args:
+            client: 同步客户端（提供令牌），默认使用全局单例
+            max_concurrency: 最大并发请求数
+            qps: 每秒最多请求数
+            transport: 自定义 httpx 传输层（测试用）
+        """
+        self._client = client or get_feishu_client()
+        self.base_url = self._client.base_url
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._limiter = _AsyncRateLimiter(qps)
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=httpx.Timeout(FEISHU_TIMEOUT[1], connect=FEISHU_TIMEOUT[0]),
+            transport=transport
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """关闭底层连接池"""
+        await self._http.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict:
+        """
+        发送带鉴权的请求；令牌失效时刷新并重试一次，被限流时降速并退避重试
+
+        Args:
+            method: HTTP 方法
+            url: 请求地址
+            **kwargs: 透传给 httpx 的参数
+
+        Returns:
+            响应 JSON
+        """
+        headers = kwargs.pop("headers", {})
+        auth_retried = False
+
+        for attempt in range(FEISHU_MAX_RETRIES + 1):
+            can_retry = attempt < FEISHU_MAX_RETRIES
+            # 令牌通常命中缓存；需要刷新时是同步请求，放到线程中执行
+            token = await asyncio.to_thread(self._client.get_access_token)
+
+            async with self._sem:
+                await self._limiter.acquire()
+                response = await self._http.request(
+                    method, url, headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs
+                )
+
+            if response.status_code == 401 and not auth_retried and can_retry:
+                self._client._invalidate_token()
+                auth_retried = True
+                continue
+
+            if response.status_code == 429 and can_retry:
+                self._limiter.on_throttled()
+                await asyncio.sleep(_rate_limit_delay(response.headers, attempt))
+                continue
+
+            response.raise_for_status()
+            data = _json(response)
+            code = data.get("code")
+
+            if code in INVALID_TOKEN_CODES and not auth_retried and can_retry:
+                self._client._invalidate_token()
+                auth_retried = True
+                continue
+
+            if code in RATE_LIMIT_CODES and can_retry:
+                self._limiter.on_throttled()
+                await asyncio.sleep(_rate_limit_delay(response.headers, attempt))
+                continue
+
+            self._limiter.on_success()
+            return data
+
+    async def set_table_cell(self, document_id: str, table_id: str, row_index: int, column_index: int, text: str):
+        """
+        设置表格单元格内容（异步）
+
+        Args:
+            document_id: 文档 ID
+            table_id: 表格 ID
+            row_index: 行索引（从0开始）
+            column_index: 列索引（从0开始）
+            text: 单元格文本
+        """
+        url = f"{self._client._block_url(document_id, table_id)}/table/cells/{row_index}/{column_index}"
+
+        body = _render_payload(_CELL_TMPL, table_id, text)
+
+        data = await self._request("PUT", url, content=body, headers=_JSON_HEADERS)
+
+        if data.get("code") != 0:
+            raise Exception(f"设置单元格失败: {data.get('msg')}")
+
+    async def set_table_cells_bulk(self, document_id: str, table_id: str, cells: List[Tuple[int, int, str]]):
+        """
+        并发设置多个表格单元格
+
+        Args:
+            document_id: 文档 ID
+            table_id: 表格 ID
+            cells: [(row_index, column_index, text), ...]
+        """
+        await asyncio.gather(*[
+            self.set_table_cell(document_id, table_id, row_index, column_index, text)
+            for row_index, column_index, text in cells
+        ])
+
+
+# 通过率分档：(最低通过率, emoji, 状态, 卡片模板颜色)，按阈值从高到低排列
+_STATUS_TABLE = (
+    (95, "🎉", "优秀", "green"),
+    (80, "👍", "良好", "orange"),
+    (50, "⚠️", "需改进", "red"),
+    (float("-inf"), "❌", "失败", "red"),
+)
+
+
+def _classify_pass_rate(pass_rate: float) -> Tuple[str, str, str]:
+    """
+    根据通过率选择 emoji、状态文字和卡片模板颜色
+
+    Args:
+        pass_rate: 通过率（百分比）
+
+    Returns:
+        (emoji, status, template)
+    """
+    return next(
+        (emoji, status, template)
+        for threshold, emoji, status, template in _STATUS_TABLE
+        if pass_rate >= threshold
+    )
+
+
 def send_test_notification(webhook_url: str, total: int, passed: int, failed: int,
                           pass_rate: float, doc_url: str, duration: float = 0):
     """
@@ -502,22 +905,15 @@ def send_test_notification(webhook_url: str, total: int, passed: int, failed: in
         duration: 执行时间（秒）
     """
     # 根据通过率选择 emoji 和模板颜色
-    if pass_rate >= 95:
-        emoji = "🎉"
-        status = "优秀"
-        template = "green"
-    elif pass_rate >= 80:
-        emoji = "👍"
-        status = "良好"
-        template = "orange"
-    elif pass_rate >= 50:
-        emoji = "⚠️"
-        status = "需改进"
-        template = "red"
-    else:
-        emoji = "❌"
-        status = "失败"
-        template = "red"
+    emoji, status, template = _classify_pass_rate(pass_rate)
+
+    fields = (
+        ("总测试数", total),
+        ("通过率", f"{pass_rate:.1f}%"),
+        ("通过", f"{passed} ✅"),
+        ("失败", f"{failed} ❌"),
+        ("执行时间", f"{duration:.2f}s"),
+    )
 
     card_content = {
         "msg_type": "interactive",
@@ -533,41 +929,8 @@ def send_test_notification(webhook_url: str, total: int, passed: int, failed: in
                 {
                     "tag": "div",
                     "fields": [
-                        {
-                            "is_short": True,
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**总测试数**: {total}"
-                            }
-                        },
-                        {
-                            "is_short": True,
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**通过率**: {pass_rate:.1f}%"
-                            }
-                        },
-                        {
-                            "is_short": True,
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**通过**: {passed} ✅"
-                            }
-                        },
-                        {
-                            "is_short": True,
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**失败**: {failed} ❌"
-                            }
-                        },
-                        {
-                            "is_short": True,
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**执行时间**: {duration:.2f}s"
-                            }
-                        }
+                        {"is_short": True, "text": {"tag": "lark_md", "content": f"**{label}**: {value}"}}
+                        for label, value in fields
                     ]
                 },
                 {
@@ -589,9 +952,11 @@ def send_test_notification(webhook_url: str, total: int, passed: int, failed: in
     }
 
     try:
-        response = requests.post(webhook_url, json=card_content, timeout=10)
+        response = _WEBHOOK_SESSION.post(
+            webhook_url, data=orjson.dumps(card_content), headers=_JSON_HEADERS, timeout=WEBHOOK_TIMEOUT
+        )
         response.raise_for_status()
-        result = response.json()
+        result = _json(response)
 
         if result.get("code") == 0:
             print("✅ 飞书机器人通知发送成功")
@@ -620,18 +985,7 @@ def send_test_message_to_user(client: FeishuClient, open_id: str, total: int, pa
         duration: 执行时间（秒）
     """
     # 根据通过率选择样式
-    if pass_rate >= 95:
-        emoji = "🎉"
-        status = "优秀"
-    elif pass_rate >= 80:
-        emoji = "👍"
-        status = "良好"
-    elif pass_rate >= 50:
-        emoji = "⚠️"
-        status = "需改进"
-    else:
-        emoji = "❌"
-        status = "失败"
+    emoji, status, _ = _classify_pass_rate(pass_rate)
 
     # 构建测试报告文本
     report_text = f"""{emoji} Python 单元测试报告
@@ -651,7 +1005,6 @@ def send_test_message_to_user(client: FeishuClient, open_id: str, total: int, pa
 
     # 使用飞书消息 API 发送
     # 注意：使用旧的 API 格式，直接传递 open_id 字段
-    token = client.get_access_token()
     url = f"{client.base_url}/message/v4/send"
 
     payload = {
@@ -661,9 +1014,7 @@ def send_test_message_to_user(client: FeishuClient, open_id: str, total: int, pa
     }
 
     try:
-        response = requests.post(url, json=payload, headers={"Authorization": f"Bearer {token}"}, timeout=10)
-        response.raise_for_status()
-        result = response.json()
+        result = client._request_with_auth_retry("POST", url, json=payload)
 
         if result.get("code") == 0:
             message_id = result.get("data", {}).get("message_id", "")
@@ -682,11 +1033,14 @@ def send_test_message_to_user(client: FeishuClient, open_id: str, total: int, pa
 
 # 全局单例
 _feishu_client: Optional[FeishuClient] = None
+_feishu_client_lock = threading.Lock()
 
 
 def get_feishu_client() -> FeishuClient:
-    """获取飞书客户端单例"""
+    """获取飞书客户端单例（双重检查加锁，多线程下只创建一个实例）"""
     global _feishu_client
     if _feishu_client is None:
-        _feishu_client = FeishuClient()
+        with _feishu_client_lock:
+            if _feishu_client is None:
+                _feishu_client = FeishuClient()
     return _feishu_client
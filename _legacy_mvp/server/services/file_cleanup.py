@@ -3,17 +3,48 @@
 在生成报告后1小时自动删除录音文件，节省存储空间
 """
 import os
+import time
+import functools
+import heapq
 import asyncio
-from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List
-from sqlalchemy.orm import Session
-from models import TestRecord, AudioFile
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from database import SessionLocal
+from services.audio_dao import mark_records_deleted
+
+
+# 删除文件用的线程池
+_DELETE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="file-cleanup")
+
+# 到期时间相差不超过该秒数的记录合并为一批清理（共用一个数据库会话和一条 UPDATE）
+CLEANUP_BATCH_WINDOW_SECONDS = 5.0
+
+
+def _remove_file(file_path: str) -> bool:
+    """
+    删除单个文件（直接 unlink，不存在时由 FileNotFoundError 判断，不先做 exists 检查）
+    
+    Args:
+        file_path: 文件路径
+    
+    Returns:
+        是否删除成功（文件不存在或删除失败返回 False）
+    """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"❌ 删除失败: {file_path}, 错误: {e}")
+        return False
+    print(f"✅ 已删除: {os.path.basename(file_path)}")
+    return True
 
 
 class FileCleanupService:
-    """录音文件定时清理服务"""
+    """录音文件定时清理服务（单个后台协程按到期时间依次清理）"""
     
     def __init__(self, cleanup_delay_hours: int = 1):
         """
@@ -23,7 +54,13 @@ class FileCleanupService:
             cleanup_delay_hours: 报告生成后多少小时清理文件（默认1小时）
         """
         self.cleanup_delay_hours = cleanup_delay_hours
-        self.cleanup_tasks = {}  # 存储待清理任务
+        # 小顶堆：(到期时间, 调度序号, 测试记录ID, 文件列表)
+        self._heap: List[Tuple[float, int, int, List[str]]] = []
+        # 测试记录ID -> 当前有效的调度序号；取消或重新调度后，堆中的旧条目出堆时直接跳过
+        self._scheduled: Dict[int, int] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker_task: Optional[asyncio.Task] = None
     
     def schedule_cleanup(self, test_record_id: int, audio_files: List[str]):
         """
@@ -33,60 +70,92 @@ class FileCleanupService:
             test_record_id: 测试记录ID
             audio_files: 需要清理的音频文件路径列表
         """
-        # 创建异步清理任务
-        task = asyncio.create_task(
-            self._cleanup_after_delay(test_record_id, audio_files)
-        )
-        self.cleanup_tasks[test_record_id] = task
+        deadline = time.monotonic() + self.cleanup_delay_hours * 3600
+        seq = next(self._seq)
+        heapq.heappush(self._heap, (deadline, seq, test_record_id, list(audio_files)))
+        self._scheduled[test_record_id] = seq
+        self._wakeup.set()
+        self._ensure_worker()
         print(f"🗑️ 已调度清理任务: 测试#{test_record_id}, {len(audio_files)}个文件, {self.cleanup_delay_hours}小时后清理")
     
-    async def _cleanup_after_delay(self, test_record_id: int, audio_files: List[str]):
+    def _ensure_worker(self):
+        """在事件循环中启动后台清理协程（已在运行则跳过；无事件循环时等下次调度再启动）"""
+        if self._worker_task is not None and not self._worker_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._worker_task = loop.create_task(self._worker())
+    
+    async def _worker(self):
+        """等待堆顶任务到期，再把同一窗口内到期的记录合并为一批清理，堆空后退出"""
+        while self._heap:
+            deadline, seq, test_record_id, _ = self._heap[0]
+            if self._scheduled.get(test_record_id) != seq:
+                # 已取消或被重新调度
+                heapq.heappop(self._heap)
+                continue
+            
+            timeout = deadline - time.monotonic()
+            if timeout > 0:
+                # 等到堆顶到期，或有新任务加入时重新检查堆顶
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._run_cleanup(self._pop_expired())
+    
+    def _pop_expired(self) -> Dict[int, List[str]]:
+        """
+        弹出所有已到期（或在合并窗口内即将到期）的有效条目
+        
+        Returns:
+            测试记录ID -> 音频文件路径列表，按到期先后排列
+        """
+        horizon = time.monotonic() + CLEANUP_BATCH_WINDOW_SECONDS
+        expired: Dict[int, List[str]] = {}
+        while self._heap and self._heap[0][0] <= horizon:
+            _, seq, test_record_id, audio_files = heapq.heappop(self._heap)
+            if self._scheduled.get(test_record_id) == seq:
+                del self._scheduled[test_record_id]
+                expired[test_record_id] = audio_files
+        return expired
+    
+    async def _run_cleanup(self, expired: Dict[int, List[str]]):
         """
-        延迟后执行清理
+        在线程中执行清理，避免文件删除和数据库操作阻塞事件循环
         
         Args:
-            test_record_id: 测试记录ID
-            audio_files: 音频文件路径列表
+            expired: 测试记录ID -> 音频文件路径列表
         """
         try:
-            # 等待指定时间
-            await asyncio.sleep(self.cleanup_delay_hours * 3600)
-            
-            # 执行清理
-            deleted_count = 0
-            for file_path in audio_files:
-                if os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        deleted_count += 1
-                        print(f"✅ 已删除: {Path(file_path).name}")
-                    except Exception as e:
-                        print(f"❌ 删除失败: {file_path}, 错误: {e}")
-            
-            # 更新数据库记录（标记文件已清理）
-            db = SessionLocal()
-            try:
-                audio_records = db.query(AudioFile).filter(
-                    AudioFile.test_record_id == test_record_id
-                ).all()
-                
-                for record in audio_records:
-                    record.file_path = None  # 清空路径标记已删除
-                    record.deleted_at = datetime.now()
-                
-                db.commit()
-                print(f"🗑️ 清理完成: 测试#{test_record_id}, 删除{deleted_count}/{len(audio_files)}个文件")
-            finally:
-                db.close()
-            
-            # 清理任务记录
-            if test_record_id in self.cleanup_tasks:
-                del self.cleanup_tasks[test_record_id]
-                
-        except asyncio.CancelledError:
-            print(f"⚠️ 清理任务被取消: 测试#{test_record_id}")
+            await asyncio.to_thread(self._delete_files_and_update_db, expired)
         except Exception as e:
-            print(f"❌ 清理任务失败: 测试#{test_record_id}, 错误: {e}")
+            print(f"❌ 清理任务失败: 测试#{list(expired)}, 错误: {e}")
+    
+    def _delete_files_and_update_db(self, expired: Dict[int, List[str]]):
+        """
+        删除一批记录的音频文件，并在数据库中标记已清理
+        
+        Args:
+            expired: 测试记录ID -> 音频文件路径列表
+        """
+        audio_files = [path for files in expired.values() for path in files]
+        # 并发删除（慢速挂载盘上不必逐个串行等待）；不存在的文件直接跳过
+        deleted_count = sum(_DELETE_EXECUTOR.map(_remove_file, audio_files))
+        
+        # 更新数据库记录（整批记录共用一个会话和一条 UPDATE）
+        db = SessionLocal()
+        try:
+            mark_records_deleted(db, list(expired), datetime.now())
+            db.commit()
+            print(f"🗑️ 清理完成: 测试#{list(expired)}, 删除{deleted_count}/{len(audio_files)}个文件")
+        finally:
+            db.close()
     
     def cancel_cleanup(self, test_record_id: int):
         """
@@ -95,15 +164,29 @@ class FileCleanupService:
         Args:
             test_record_id: 测试记录ID
         """
-        if test_record_id in self.cleanup_tasks:
-            self.cleanup_tasks[test_record_id].cancel()
-            del self.cleanup_tasks[test_record_id]
+        if self._scheduled.pop(test_record_id, None) is not None:
+            # 唤醒后台协程丢弃失效的堆顶条目；没有待清理记录时协程随即退出，不会一直挂起到原到期时间
+            self._wakeup.set()
             print(f"✅ 已取消清理任务: 测试#{test_record_id}")
     
+    async def shutdown(self):
+        """停止后台清理协程并等待其真正结束（应用退出时调用，未到期的记录不再清理）"""
+        task, self._worker_task = self._worker_task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
     def get_pending_cleanups(self) -> int:
         """获取待清理任务数量"""
-        return len(self.cleanup_tasks)
+        return len(self._scheduled)
 
 
-# 全局清理服务实例
-cleanup_service = FileCleanupService(cleanup_delay_hours=1)
+# 全局清理服务实例（首次使用时创建）
+@functools.lru_cache(maxsize=1)
+def get_cleanup_service() -> FileCleanupService:
+    """获取全局清理服务单例"""
+    return FileCleanupService(cleanup_delay_hours=1)
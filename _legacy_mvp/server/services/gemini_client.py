@@ -4,8 +4,15 @@ Gemini API 客户端
 使用最新版 google-genai SDK
 """
 from google import genai  # type: ignore
+from google.genai import errors as genai_errors  # type: ignore
 from google.genai import types  # type: ignore
+import asyncio
+import functools
 import os
+import random
+import ssl
+import time
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,13 +25,157 @@ if not GEMINI_API_KEY:
 # 使用 Gemini 2.5 Flash 模型
 MODEL_NAME = "gemini-2.5-flash"
 
+# 请求失败时的最大尝试次数和初始重试延迟（秒）
+MAX_RETRIES = 3
+RETRY_DELAY = 2
+
+# 重试等待时间的随机抖动比例：乘以 [1 - RETRY_JITTER, 1 + RETRY_JITTER] 内的系数，
+# 避免多个请求同时遇到 503 后同步重试
+RETRY_JITTER = 0.5
+
+# SDK 底层 httpx 连接池上限（同步/异步客户端各一份），保持长连接复用 TLS 会话
+HTTP_POOL_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+# 按扩展名确定上传音频的 MIME 类型；未知扩展名按录音页面默认的 webm 处理
+AUDIO_MIME_TYPES = {
+    '.webm': 'audio/webm',
+    '.m4a': 'audio/mp4',
+    '.mp4': 'audio/mp4',
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+    '.aac': 'audio/aac',
+    '.flac': 'audio/flac',
+}
+DEFAULT_AUDIO_MIME_TYPE = 'audio/webm'
+
+# 缓存最近读取的音频数量（同一录音的重试/逐题评估不重复读盘）
+AUDIO_CACHE_SIZE = int(os.getenv("GEMINI_AUDIO_CACHE_SIZE", "8"))
+
+
+# 可重试的网络层异常（SSL 中断、连接重置、超时等）
+RETRYABLE_EXCEPTIONS = (ssl.SSLError, ConnectionError, TimeoutError, httpx.TransportError)
+
+# 可重试的 API 状态码（限流、服务过载、网关超时）
+RETRYABLE_STATUS_CODES = frozenset({429, 503, 504})
+
+
+def _is_retryable_error(error: Exception) -> bool:
+    """
+    判断是否是可重试的网络/服务过载错误
+    
+    优先按异常类型和 API 状态码判断；只有通用 Exception 才退回到按错误信息匹配
+    
+    Args:
+        error: 捕获到的异常
+    
+    Returns:
+        是否应该重试
+    """
+    if isinstance(error, RETRYABLE_EXCEPTIONS):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    if type(error) is not Exception:
+        return False
+    
+    error_str = str(error)
+    return (
+        '503' in error_str or 
+        'overloaded' in error_str.lower() or
+        'SSL' in error_str or
+        'EOF' in error_str or
+        'Connection' in error_str or
+        'timeout' in error_str.lower() or
+        'reset' in error_str.lower()
+    )
+
+
+def _retry_wait(error: Exception, attempt: int) -> float:
+    """
+    计算第 attempt 次（从 0 开始）请求失败后的重试等待时间（指数退避 + 随机抖动）
+    
+    同步和异步接口共用同一套重试判断，只是等待方式不同（time.sleep / asyncio.sleep）
+    
+    Args:
+        error: 本次请求抛出的异常
+        attempt: 当前尝试序号
+    
+    Returns:
+        等待秒数
+    
+    Raises:
+        Exception: 不可重试的错误，或已用完重试次数
+    """
+    error_str = str(error)
+    if not _is_retryable_error(error):
+        # 其他错误直接抛出
+        raise Exception(f"❌ 分析失败: {error_str}")
+    if attempt >= MAX_RETRIES - 1:
+        raise Exception(f"❌ 网络连接问题，已重试{MAX_RETRIES}次。请检查网络/VPN后再试。")
+    
+    wait_time = RETRY_DELAY * (2 ** attempt) * random.uniform(1 - RETRY_JITTER, 1 + RETRY_JITTER)
+    print(f"⏳ 网络/API错误，{wait_time:.1f}秒后重试... (错误: {error_str[:50]})")
+    return wait_time
+
+
+def _audio_mime_type(audio_path: str) -> str:
+    """根据文件扩展名返回音频 MIME 类型"""
+    ext = os.path.splitext(audio_path)[1].lower()
+    return AUDIO_MIME_TYPES.get(ext, DEFAULT_AUDIO_MIME_TYPE)
+
+
+def _audio_contents(prompt: str, audio_bytes: bytes, mime_type: str) -> list:
+    """构造内嵌音频数据的请求内容"""
+    return [
+        prompt,
+        types.Part.from_bytes(
+            data=audio_bytes,
+            mime_type=mime_type
+        )
+    ]
+
+
+def _uploaded_audio_contents(prompt: str, file_uri: str, audio_path: str) -> list:
+    """构造按 URI 引用已上传音频的请求内容"""
+    return [
+        prompt,
+        types.Part.from_uri(
+            file_uri=file_uri,
+            mime_type=_audio_mime_type(audio_path)
+        )
+    ]
+
+
+@functools.lru_cache(maxsize=AUDIO_CACHE_SIZE)
+def _read_audio_cached(audio_path: str, mtime_ns: int, size: int) -> bytes:
+    """按 (路径, 修改时间, 大小) 缓存音频内容，文件被改写后自动失效"""
+    with open(audio_path, 'rb') as f:
+        return f.read()
+
+
+def _read_audio(audio_path: str) -> bytes:
+    """读取音频文件内容（带缓存）"""
+    stat = os.stat(audio_path)
+    return _read_audio_cached(audio_path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client(api_key: str) -> genai.Client:
+    """进程内共用一个 SDK 客户端（及其 HTTP 连接池），避免每个实例重复握手"""
+    pool_args = {"limits": HTTP_POOL_LIMITS}
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(client_args=pool_args, async_client_args=pool_args)
+    )
+
 
 class GeminiClient:
     """Gemini API 客户端 - 使用最新版 SDK"""
     
     def __init__(self):
-        # 初始化 Gemini 客户端
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        # 复用进程内共享的 Gemini 客户端
+        self.client = _get_client(GEMINI_API_KEY)
     
     def analyze_audio_from_path(self, audio_path: str, prompt: str):
         """
@@ -42,59 +193,57 @@ class GeminiClient:
         Returns:
             Gemini 的响应内容
         """
-        import time
+        # 只读取一次，所有重试复用同一份音频数据
+        audio_bytes = _read_audio(audio_path)
+        mime_type = _audio_mime_type(audio_path)
         
-        max_retries = 3
-        retry_delay = 2  # 初始延迟（秒）
-        
-        for attempt in range(max_retries):
+        for attempt in range(MAX_RETRIES):
             try:
-                # 读取音频文件
-                with open(audio_path, 'rb') as f:
-                    audio_bytes = f.read()
-                
-                print(f"📊 尝试 {attempt + 1}/{max_retries}: 音频大小 {len(audio_bytes)/1024:.1f}KB")
+                print(f"📊 尝试 {attempt + 1}/{MAX_RETRIES}: 音频大小 {len(audio_bytes)/1024:.1f}KB")
                 
                 # 使用新 SDK 的 API - 内嵌音频数据
                 # 根据官方文档示例
                 response = self.client.models.generate_content(
                     model=MODEL_NAME,
-                    contents=[
-                        prompt,
-                        types.Part.from_bytes(
-                            data=audio_bytes,
-                            mime_type='audio/webm'
-                        )
-                    ]
+                    contents=_audio_contents(prompt, audio_bytes, mime_type)
                 )
                 
                 return response.text
                 
             except Exception as e:
-                error_str = str(e)
+                time.sleep(_retry_wait(e, attempt))
+    
+    async def analyze_audio_from_path_async(self, audio_path: str, prompt: str):
+        """
+        analyze_audio_from_path 的异步版本
+        
+        使用 SDK 的异步接口（client.aio）发起请求，重试等待使用 asyncio.sleep，
+        不占用线程也不阻塞事件循环
+        
+        Args:
+            audio_path: 音频文件路径
+            prompt: 分析提示词
+            
+        Returns:
+            Gemini 的响应内容
+        """
+        # 读取音频文件（放到线程中，避免阻塞事件循环），所有重试复用同一份数据
+        audio_bytes = await asyncio.to_thread(_read_audio, audio_path)
+        mime_type = _audio_mime_type(audio_path)
+        
+        for attempt in range(MAX_RETRIES):
+            try:
+                print(f"📊 尝试 {attempt + 1}/{MAX_RETRIES}: 音频大小 {len(audio_bytes)/1024:.1f}KB")
                 
-                # 检查是否是可重试的错误
-                is_retryable = (
-                    '503' in error_str or 
-                    'overloaded' in error_str.lower() or
-                    'SSL' in error_str or
-                    'EOF' in error_str or
-                    'Connection' in error_str or
-                    'timeout' in error_str.lower() or
-                    'reset' in error_str.lower()
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=_audio_contents(prompt, audio_bytes, mime_type)
                 )
                 
-                if is_retryable:
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)  # 指数退避
-                        print(f"⏳ 网络/API错误，{wait_time}秒后重试... (错误: {error_str[:50]})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        raise Exception(f"❌ 网络连接问题，已重试{max_retries}次。请检查网络/VPN后再试。")
-                else:
-                    # 其他错误直接抛出
-                    raise Exception(f"❌ 分析失败: {error_str}")
+                return response.text
+                
+            except Exception as e:
+                await asyncio.sleep(_retry_wait(e, attempt))
     
     def upload_and_analyze_audio(self, audio_path: str, prompt: str):
         """
@@ -113,10 +262,38 @@ class GeminiClient:
             myfile = self.client.files.upload(file=audio_path)
             print(f"File uploaded: {myfile.uri}")
             
-            # 使用上传的文件生成内容
+            # 按 URI 引用已上传的文件，请求中不再携带音频数据
             response = self.client.models.generate_content(
                 model=MODEL_NAME,
-                contents=[prompt, myfile]
+                contents=_uploaded_audio_contents(prompt, myfile.uri, audio_path)
+            )
+            
+            return response.text
+            
+        except Exception as e:
+            raise Exception(f"Failed to upload and analyze audio: {str(e)}")
+    
+    async def upload_and_analyze_audio_async(self, audio_path: str, prompt: str):
+        """
+        upload_and_analyze_audio 的异步版本
+        
+        上传和生成都走 SDK 的异步接口（client.aio），多个大文件可以在同一事件循环中并发评测
+        
+        Args:
+            audio_path: 音频文件路径
+            prompt: 分析提示词
+            
+        Returns:
+            Gemini 的响应内容
+        """
+        try:
+            print(f"Uploading audio file: {audio_path}")
+            myfile = await self.client.aio.files.upload(file=audio_path)
+            print(f"File uploaded: {myfile.uri}")
+            
+            response = await self.client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=_uploaded_audio_contents(prompt, myfile.uri, audio_path)
             )
             
             return response.text
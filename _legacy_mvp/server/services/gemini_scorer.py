@@ -2,63 +2,38 @@
 Gemini AI 评分服务
 使用 Gemini 2.5 Flash 分析音频并进行评分
 """
+import bisect
+import functools
 import json
+import re
+import orjson
 from typing import Dict, List, Tuple
 from services.gemini_client import gemini_client
 
 
-def calculate_star_rating(total_score: float, max_score: float = 44) -> int:
-    """
-    根据总分计算星级评分（基于百分比）
-    
-    Args:
-        total_score: 总分
-        max_score: 总分满分（默认44，Part 1: 20分 + Part 2: 24分）
-    
-    Returns:
-        星级评分（1-5）
-    """
-    percentage = (total_score / max_score) * 100
-    
-    if percentage >= 93:  # 93%+ = 杰出
-        return 5
-    elif percentage >= 80:  # 80-92% = 优秀
-        return 4
-    elif percentage >= 50:  # 50-79% = 良好
-        return 3
-    elif percentage >= 1:   # 1-49% = 中等
-        return 2
-    else:
-        return 1  # 0% = 需努力
-
-
-def create_part1_prompt(words: List[str]) -> str:
-    """
-    创建 Part 1（词汇朗读）的评分 prompt
-    
-    Args:
-        words: 需要朗读的单词列表
-    
-    Returns:
-        评分 prompt
-    """
-    words_str = ", ".join(words)
-    
-    prompt = f"""你是一位专业的英语口语评估专家。请分析这段学生朗读单词的录音。
+# 星级分档的百分比下限：<1% 为 1 星（需努力），1-49% 为 2 星（中等），
+# 50-79% 为 3 星（良好），80-92% 为 4 星（优秀），93%+ 为 5 星（杰出）
+_STAR_THRESHOLDS = (1, 50, 80, 93)
+
+# 数组或对象末尾的多余逗号
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
 
-**任务**：学生需要朗读以下 {len(words)} 个单词：
-{words_str}
+# Prompt 模板在模块加载时构造一次，调用时只做一次 format_map 填充
+_PART1_TEMPLATE = """你是一位专业的英语口语评估专家。请分析这段学生朗读单词的录音。
+
+**任务**：学生需要朗读以下 {word_count} 个单词：
+{words}
 
 **评分标准**：
 - 每个单词发音正确：1分
-- 总分：{len(words)}分
+- 总分：{word_count}分
 - 评估要点：元音准确性、辅音清晰度、重音位置
 
 **重要要求**：请识别每个单词在录音中的大致时间位置（秒），这将帮助验证评分准确性。
 
 **请以 JSON 格式返回评分结果**：
 {{
-  "score": 总分（0-{len(words)}的数字）,
+  "score": 总分（0-{word_count}的数字）,
   "correct_words": ["正确的单词1", "正确的单词2", ...],
   "incorrect_words": ["错误的单词1", "错误的单词2", ...],
   "word_timestamps": [
@@ -80,41 +55,24 @@ def create_part1_prompt(words: List[str]) -> str:
 3. word_timestamps 应包含所有尝试朗读的单词
 4. **重要**：feedback字段必须使用中文，但correct_words和incorrect_words保持英文原词
 """
-    
-    return prompt
 
-
-def create_part2_prompt(words: List[str], sentences: List[str]) -> str:
-    """
-    创建 Part 2（自然拼读）的评分 prompt
-    
-    Args:
-        words: 单词列表
-        sentences: 句子列表
-    
-    Returns:
-        评分 prompt
-    """
-    words_str = ", ".join(words)
-    sentences_str = "\n".join([f"{i+1}. {s}" for i, s in enumerate(sentences)])
-    
-    prompt = f"""你是一位专业的英语口语评估专家。请分析这段学生自然拼读的录音。
+_PART2_TEMPLATE = """你是一位专业的英语口语评估专家。请分析这段学生自然拼读的录音。
 
 **任务**：
-1. 单词朗读（{len(words)}个单词）：{words_str}
-2. 句子朗读（{len(sentences)}个句子）：
-{sentences_str}
+1. 单词朗读（{word_count}个单词）：{words}
+2. 句子朗读（{sentence_count}个句子）：
+{sentences}
 
 **评分标准**：
-- 单词部分：每个单词0.5分，总计{len(words) * 0.5}分
-- 句子部分：每个句子根据发音准确性、连读流畅度、语调自然度评分，每句2.5分，总计{len(sentences) * 2.5}分
-- 总分：{len(words) * 0.5 + len(sentences) * 2.5}分
+- 单词部分：每个单词0.5分，总计{word_total}分
+- 句子部分：每个句子根据发音准确性、连读流畅度、语调自然度评分，每句2.5分，总计{sentence_total}分
+- 总分：{total_score}分
 
 **重要要求**：请识别每个单词和句子在录音中的大致时间位置（秒），这将帮助验证评分准确性。
 
 **请以 JSON 格式返回评分结果**：
 {{
-  "score": 总分（0-{len(words) * 0.5 + len(sentences) * 2.5}的数字）,
+  "score": 总分（0-{total_score}的数字）,
   "word_score": 单词部分得分,
   "sentence_score": 句子部分得分,
   "correct_words": ["正确的单词"],
@@ -130,7 +88,7 @@ def create_part2_prompt(words: List[str], sentences: List[str]) -> str:
   ],
   "sentence_timestamps": [
     {{
-      "sentence_index": 句子序号（1-{len(sentences)}）,
+      "sentence_index": 句子序号（1-{sentence_count}）,
       "start_time": 开始时间（秒）,
       "end_time": 结束时间（秒）,
       "quality_score": 质量评分（0-2.5）
@@ -147,29 +105,11 @@ def create_part2_prompt(words: List[str], sentences: List[str]) -> str:
 3. 先朗读单词，后朗读句子，时间戳应体现这个顺序
 4. **重要**：feedback和sentence_quality字段必须使用中文，但单词和句子内容保持英文
 """
-    
-    return prompt
 
-
-def create_part3_prompt(dialogues: List[Dict]) -> str:
-    """
-    创建 Part 3（句子问答）的评分 prompt
-    
-    Args:
-        dialogues: 问答对话列表，格式为 [{"teacher": "问题", "student_options": ["答案选项"]}]
-    
-    Returns:
-        评分 prompt
-    """
-    questions_str = "\n".join([
-        f"{i+1}. Teacher: {d['teacher']}\n   Expected: {' / '.join(d.get('student_options', []))}"
-        for i, d in enumerate(dialogues)
-    ])
-    
-    prompt = f"""你是一位专业的英语口语评估专家。请分析这段学生回答问题的录音。
+_PART3_TEMPLATE = """你是一位专业的英语口语评估专家。请分析这段学生回答问题的录音。
 
 **任务**：学生需要回答以下 12 个问题：
-{questions_str}
+{questions}
 
 **评分标准**：
 - 每个问题回答完整且正确：2分
@@ -221,8 +161,80 @@ def create_part3_prompt(dialogues: List[Dict]) -> str:
 1. 只返回 JSON，不要包含其他文字
 2. **重要**：feedback和comment字段必须使用中文评价
 3. student_answer字段必须保持学生说的英文原话"""
+
+
+def calculate_star_rating(total_score: float, max_score: float = 44) -> int:
+    """
+    根据总分计算星级评分（基于百分比）
     
-    return prompt
+    Args:
+        total_score: 总分
+        max_score: 总分满分（默认44，Part 1: 20分 + Part 2: 24分）
+    
+    Returns:
+        星级评分（1-5）
+    """
+    percentage = (total_score / max_score) * 100
+    return bisect.bisect_right(_STAR_THRESHOLDS, percentage) + 1
+
+
+@functools.lru_cache(maxsize=128)
+def create_part1_prompt(words: Tuple[str, ...]) -> str:
+    """
+    创建 Part 1（词汇朗读）的评分 prompt（按单词元组缓存）
+    
+    Args:
+        words: 需要朗读的单词元组
+    
+    Returns:
+        评分 prompt
+    """
+    return _PART1_TEMPLATE.format_map({
+        "word_count": len(words),
+        "words": ", ".join(words),
+    })
+
+
+def create_part2_prompt(words: List[str], sentences: List[str]) -> str:
+    """
+    创建 Part 2（自然拼读）的评分 prompt
+    
+    Args:
+        words: 单词列表
+        sentences: 句子列表
+    
+    Returns:
+        评分 prompt
+    """
+    word_total = len(words) * 0.5
+    sentence_total = len(sentences) * 2.5
+    return _PART2_TEMPLATE.format_map({
+        "word_count": len(words),
+        "words": ", ".join(words),
+        "sentence_count": len(sentences),
+        "sentences": "\n".join([f"{i+1}. {s}" for i, s in enumerate(sentences)]),
+        "word_total": word_total,
+        "sentence_total": sentence_total,
+        "total_score": word_total + sentence_total,
+    })
+
+
+def create_part3_prompt(dialogues: List[Dict]) -> str:
+    """
+    创建 Part 3（句子问答）的评分 prompt
+    
+    Args:
+        dialogues: 问答对话列表，格式为 [{"teacher": "问题", "student_options": ["答案选项"]}]
+    
+    Returns:
+        评分 prompt
+    """
+    return _PART3_TEMPLATE.format_map({
+        "questions": "\n".join([
+            f"{i+1}. Teacher: {d['teacher']}\n   Expected: {' / '.join(d.get('student_options', []))}"
+            for i, d in enumerate(dialogues)
+        ]),
+    })
 
 from services.gemini_client import GeminiClient
 from services.retry_decorator import retry_on_error
@@ -240,8 +252,6 @@ def parse_gemini_response(response_text: str) -> Dict:
     Returns:
         解析后的字典
     """
-    import re
-    
     try:
         # 提取 JSON（可能被包裹在代码块中）
         if "```json" in response_text:
@@ -253,21 +263,20 @@ def parse_gemini_response(response_text: str) -> Dict:
             end = response_text.find("```", start)
             json_str = response_text[start:end].strip()
         else:
-            # 尝试查找第一个 { 和最后一个 }
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
+            # 取第一个 { 到最后一个 } 之间的内容
+            start = response_text.find("{")
+            end = response_text.rfind("}")
+            if start != -1 and end > start:
+                json_str = response_text[start:end + 1]
             else:
                 json_str = response_text.strip()
         
-        # 清理尾随逗号（Gemini 有时会生成不符合 JSON 标准的尾随逗号）
-        # 移除数组中的尾随逗号: ,]
-        json_str = re.sub(r',\s*]', ']', json_str)
-        # 移除对象中的尾随逗号: ,}
-        json_str = re.sub(r',\s*}', '}', json_str)
+        try:
+            result = orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            # Gemini 有时会生成不符合 JSON 标准的尾随逗号（,] 或 ,}），清理后再解析
+            result = orjson.loads(_TRAILING_COMMA_RE.sub(r"\1", json_str))
         
-        # 解析 JSON
-        result = json.loads(json_str)
         # 日志：支持单独 score 或 questions 数组格式
         if 'score' in result:
             print(f"✅ 评分完成: {result['score']} 分")
@@ -300,13 +309,32 @@ def evaluate_part1(audio_path: str, words: List[str]) -> Tuple[float, Dict]:
     Returns:
         (得分, 详细结果字典)
     """
-    prompt = create_part1_prompt(words)
+    prompt = create_part1_prompt(tuple(words))
     response = gemini_client.analyze_audio_from_path(audio_path, prompt)
     result = parse_gemini_response(response)
     
     return result.get("score", 0), result
 
 
+@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
+async def evaluate_part1_async(audio_path: str, words: List[str]) -> Tuple[float, Dict]:
+    """
+    evaluate_part1 的异步版本（带重试机制）
+    
+    Args:
+        audio_path: 音频文件路径
+        words: 单词列表
+    
+    Returns:
+        (得分, 详细结果字典)
+    """
+    prompt = create_part1_prompt(tuple(words))
+    response = await gemini_client.analyze_audio_from_path_async(audio_path, prompt)
+    result = parse_gemini_response(response)
+    
+    return result.get("score", 0), result
+
+
 @retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
 def evaluate_part2(audio_path: str, words: List[str], sentences: List[str]) -> Tuple[float, Dict]:
     """
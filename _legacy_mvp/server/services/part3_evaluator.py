@@ -1,99 +1,60 @@
 """
 单个Part 3问题评估函数
 """
+import asyncio
+import os
 from typing import List, Dict, Tuple
 from services.gemini_client import GeminiClient
 from services.gemini_scorer import parse_gemini_response
 from services.retry_decorator import retry_on_error
 
-@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
-def evaluate_part3_single_question(audio_path: str, dialogue: dict, question_num: int):
-    """
-    评估Part 3的单个问题（带重试机制）
-    
-    Args:
-        audio_path: 音频文件路径
-        dialogue: 问题对话数据
-        question_num: 问题编号
-    
-    Returns:
-        (score, result_dict)
-    """
-    prompt = f"""你是专业的英语口语评估专家。请评估学生对这个问题的回答。
+# 并发评估多组问题时同时进行的 Gemini 请求上限
+PART3_MAX_CONCURRENCY = int(os.getenv("PART3_MAX_CONCURRENCY", "3"))
 
-**问题 {question_num}**：
-Teacher: {dialogue['teacher']}
-Expected answers: {' / '.join(dialogue.get('student_options', []))}
+# 单个问题的描述模板
+_QUESTION_TMPL = "\n**问题 {q_num}**：\nTeacher: {teacher}\nExpected answers: {answers}\n"
 
-**评分标准**：
-- 回答完整且正确：2分
+# 每个问题共用的评分标准
+_SCORING_RUBRIC = """- 回答完整且正确：2分
 - 部分正确或不完整：1分
-- 无法回答或完全错误：0分
+- 无法回答或完全错误：0分"""
+
+# 单题评估的 prompt 头尾
+_SINGLE_PROMPT_HEADER = "你是专业的英语口语评估专家。请评估学生对这个问题的回答。\n"
+_SINGLE_PROMPT_FOOTER = """
+**评分标准**：
+""" + _SCORING_RUBRIC + """
 
 请返回JSON格式：
-{{
+{
   "score": 得分（0-2的数字）,
   "student_answer": "学生实际说的内容",
   "feedback": "简短评价",
   "fluency_score": 流畅度（0-10，可选）,
   "pronunciation_score": 发音（0-10，可选）,
   "confidence_score": 自信度（0-10，可选）
-}}
+}
 
 注意：只返回JSON，不要包含其他文字。
 """
-    
-    client = GeminiClient()
-    response_text = client.analyze_audio_from_path(audio_path, prompt)
-    result = parse_gemini_response(response_text)
-    
-    score = result.get("score", 0)
-    return score, result
-
-
-@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
-def evaluate_part3_group(audio_path: str, dialogues: List[Dict], start_question_num: int) -> Tuple[float, List[Dict]]:
-    """
-    评估Part 3的一组问题（6个问题使用一个音频文件）（带重试机制）
-    
-    Args:
-        audio_path: 音频文件路径
-        dialogues: 问题对话列表（6个）
-        start_question_num: 起始问题编号（1或7）
-    
-    Returns:
-        (total_score, list_of_result_dicts)
-    """
-    # 构建包含所有6个问题的prompt
-    questions_text = ""
-    for i, dialogue in enumerate(dialogues):
-        q_num = start_question_num + i
-        questions_text += f"""
-**问题 {q_num}**：
-Teacher: {dialogue['teacher']}
-Expected answers: {' / '.join(dialogue.get('student_options', []))}
-"""
-
-    prompt = f"""你是专业的英语口语评估专家。请评估学生对以下6个问题的回答。
-学生在一个音频中依次回答了以下问题：
 
-{questions_text}
+# 多题（同一音频）评估的 prompt 头尾，{count}/{start}/{end} 在构建时填充
+_PART_PROMPT_HEADER = "你是专业的英语口语评估专家。请评估学生对以下{count}个问题的回答。\n学生在一个音频中依次回答了以下问题：\n\n"
+_PART_PROMPT_FOOTER = """
 
 **评分标准**（每个问题）：
-- 回答完整且正确：2分
-- 部分正确或不完整：1分
-- 无法回答或完全错误：0分
+""" + _SCORING_RUBRIC + """
 
 请返回JSON格式，包含每个问题的评估结果：
 {{
   "questions": [
     {{
-      "question_num": {start_question_num},
+      "question_num": {start},
       "score": 得分（0-2的数字）,
       "student_answer": "学生实际说的内容",
       "feedback": "简短评价"
     }},
-    // ... 共6个问题
+    // ... 共{count}个问题
   ],
   "fluency_score": 整体流畅度（0-10）,
   "pronunciation_score": 整体发音（0-10）,
@@ -102,15 +63,77 @@ Expected answers: {' / '.join(dialogue.get('student_options', []))}
 
 注意：
 1. 只返回JSON，不要包含其他文字
-2. 请确保questions数组包含6个问题的评估结果，按顺序对应问题 {start_question_num} 到 {start_question_num + 5}
+2. 请确保questions数组包含{count}个问题的评估结果，按顺序对应问题 {start} 到 {end}
 3. **重要**：feedback字段必须使用中文评价
 4. student_answer字段必须保持学生说的英文原话
 """
+
+
+def _build_prompt(dialogues: List[Dict], start_num: int, expected_count: int) -> str:
+    """
+    构建评分prompt（单题与多题共用）
+    
+    Args:
+        dialogues: 问题对话列表
+        start_num: 起始问题编号
+        expected_count: 期望返回的问题数量，为1时使用单题格式
+    
+    Returns:
+        prompt 文本
+    """
+    questions_text = "".join(
+        _QUESTION_TMPL.format(
+            q_num=start_num + i,
+            teacher=dialogue['teacher'],
+            answers=' / '.join(dialogue.get('student_options', ()))
+        )
+        for i, dialogue in enumerate(dialogues)
+    )
+    if expected_count == 1:
+        return _SINGLE_PROMPT_HEADER + questions_text + _SINGLE_PROMPT_FOOTER
+    params = {"count": expected_count, "start": start_num, "end": start_num + expected_count - 1}
+    return (
+        _PART_PROMPT_HEADER.format(**params)
+        + questions_text
+        + _PART_PROMPT_FOOTER.format(**params)
+    )
+
+@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
+def evaluate_part3_single_question(audio_path: str, dialogue: dict, question_num: int):
+    """
+    评估Part 3的单个问题（带重试机制）
+    
+    Args:
+        audio_path: 音频文件路径
+        dialogue: 问题对话数据
+        question_num: 问题编号
+    
+    Returns:
+        (score, result_dict)
+    """
+    prompt = _build_prompt([dialogue], question_num, 1)
     
     client = GeminiClient()
     response_text = client.analyze_audio_from_path(audio_path, prompt)
     result = parse_gemini_response(response_text)
     
+    score = result.get("score", 0)
+    return score, result
+
+
+def _collect_part3_group_result(response_text: str, start_question_num: int) -> Tuple[float, List[Dict]]:
+    """
+    解析Part 3一组问题的响应，补齐缺失的问题并附加整体评分
+    
+    Args:
+        response_text: Gemini 返回的文本
+        start_question_num: 起始问题编号
+    
+    Returns:
+        (total_score, list_of_result_dicts)
+    """
+    result = parse_gemini_response(response_text)
+    
     # 解析结果
     question_results = result.get("questions", [])
     
@@ -140,62 +163,89 @@ Expected answers: {' / '.join(dialogue.get('student_options', []))}
 
 
 @retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
-def evaluate_part2_all(audio_path: str, dialogues: List[Dict]) -> Tuple[float, List[Dict], Dict]:
+def evaluate_part3_group(audio_path: str, dialogues: List[Dict], start_question_num: int) -> Tuple[float, List[Dict]]:
     """
-    评估Part 2的所有12个问题（使用一个音频文件）（带重试机制）
+    评估Part 3的一组问题（6个问题使用一个音频文件）（带重试机制）
     
     Args:
         audio_path: 音频文件路径
-        dialogues: 问题对话列表（12个）
+        dialogues: 问题对话列表（6个）
+        start_question_num: 起始问题编号（1或7）
     
     Returns:
-        (total_score, list_of_result_dicts, overall_scores)
+        (total_score, list_of_result_dicts)
     """
-    # 构建包含所有12个问题的prompt
-    questions_text = ""
-    for i, dialogue in enumerate(dialogues):
-        q_num = i + 1
-        questions_text += f"""
-**问题 {q_num}**：
-Teacher: {dialogue['teacher']}
-Expected answers: {' / '.join(dialogue.get('student_options', []))}
-"""
+    prompt = _build_prompt(dialogues, start_question_num, 6)
+    client = GeminiClient()
+    response_text = client.analyze_audio_from_path(audio_path, prompt)
+    return _collect_part3_group_result(response_text, start_question_num)
 
-    prompt = f"""你是专业的英语口语评估专家。请评估学生对以下12个问题的回答。
-学生在一个音频中依次回答了以下问题：
 
-{questions_text}
+@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
+async def evaluate_part3_group_async(audio_path: str, dialogues: List[Dict], start_question_num: int) -> Tuple[float, List[Dict]]:
+    """
+    evaluate_part3_group 的异步版本（带重试机制）
+    
+    Args:
+        audio_path: 音频文件路径
+        dialogues: 问题对话列表（6个）
+        start_question_num: 起始问题编号（1或7）
+    
+    Returns:
+        (total_score, list_of_result_dicts)
+    """
+    prompt = _build_prompt(dialogues, start_question_num, 6)
+    client = GeminiClient()
+    response_text = await client.analyze_audio_from_path_async(audio_path, prompt)
+    return _collect_part3_group_result(response_text, start_question_num)
 
-**评分标准**（每个问题）：
-- 回答完整且正确：2分
-- 部分正确或不完整：1分
-- 无法回答或完全错误：0分
 
-请返回JSON格式，包含每个问题的评估结果：
-{{
-  "questions": [
-    {{
-      "question_num": 1,
-      "score": 得分（0-2的数字）,
-      "student_answer": "学生实际说的内容",
-      "feedback": "简短评价"
-    }},
-    // ... 共12个问题
-  ],
-  "fluency_score": 整体流畅度（0-10）,
-  "pronunciation_score": 整体发音（0-10）,
-  "confidence_score": 整体自信度（0-10）
-}}
+async def evaluate_part3_groups_async(
+    groups: List[Tuple[str, List[Dict], int]],
+    max_concurrency: int = PART3_MAX_CONCURRENCY
+) -> List[Tuple[float, List[Dict]]]:
+    """
+    并发评估多组Part 3问题（各组互不依赖）
+    
+    Args:
+        groups: [(audio_path, dialogues, start_question_num), ...]
+        max_concurrency: 同时进行的 Gemini 请求上限
+    
+    Returns:
+        与 groups 顺序一致的 [(total_score, list_of_result_dicts), ...]
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run(audio_path, dialogues, start_question_num):
+        async with semaphore:
+            return await evaluate_part3_group_async(audio_path, dialogues, start_question_num)
+    
+    return list(await asyncio.gather(*(run(*group) for group in groups)))
 
-注意：
-1. 只返回JSON，不要包含其他文字
-2. 请确保questions数组包含12个问题的评估结果，按顺序对应问题 1 到 12
-3. **重要**：feedback字段必须使用中文评价
-4. student_answer字段必须保持学生说的英文原话
-"""
+
+def _build_part2_all_prompt(dialogues: List[Dict]) -> str:
+    """
+    构建包含Part 2全部12个问题的评分prompt
     
-    client = GeminiClient()
-    response_text = client.analyze_audio_from_path(audio_path, prompt)
+    Args:
+        dialogues: 问题对话列表（12个）
+    
+    Returns:
+        prompt 文本
+    """
+    return _build_prompt(dialogues, 1, 12)
+
+
+def _collect_part2_all_result(response_text: str) -> Tuple[float, List[Dict], Dict]:
+    """
+    解析Part 2整体评估的响应，补齐缺失的问题并汇总得分
+    
+    Args:
+        response_text: Gemini 返回的文本
+    
+    Returns:
+        (total_score, list_of_result_dicts, overall_scores)
+    """
     result = parse_gemini_response(response_text)
     
     # 解析结果
@@ -222,3 +272,39 @@ Expected answers: {' / '.join(dialogue.get('student_options', []))}
     
     return total_score, question_results, overall_scores
 
+
+
+@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
+def evaluate_part2_all(audio_path: str, dialogues: List[Dict]) -> Tuple[float, List[Dict], Dict]:
+    """
+    评估Part 2的所有12个问题（使用一个音频文件）（带重试机制）
+    
+    Args:
+        audio_path: 音频文件路径
+        dialogues: 问题对话列表（12个）
+    
+    Returns:
+        (total_score, list_of_result_dicts, overall_scores)
+    """
+    prompt = _build_part2_all_prompt(dialogues)
+    client = GeminiClient()
+    response_text = client.analyze_audio_from_path(audio_path, prompt)
+    return _collect_part2_all_result(response_text)
+
+
+@retry_on_error(max_retries=3, delay=2.0, backoff=2.0)
+async def evaluate_part2_all_async(audio_path: str, dialogues: List[Dict]) -> Tuple[float, List[Dict], Dict]:
+    """
+    evaluate_part2_all 的异步版本（带重试机制）
+    
+    Args:
+        audio_path: 音频文件路径
+        dialogues: 问题对话列表（12个）
+    
+    Returns:
+        (total_score, list_of_result_dicts, overall_scores)
+    """
+    prompt = _build_part2_all_prompt(dialogues)
+    client = GeminiClient()
+    response_text = await client.analyze_audio_from_path_async(audio_path, prompt)
+    return _collect_part2_all_result(response_text)
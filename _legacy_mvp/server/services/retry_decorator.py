@@ -2,20 +2,99 @@
 Gemini API 重试装饰器
 处理网络不稳定和地域限制问题
 """
+import asyncio
+import inspect
+import logging
+import random
 import time
 import functools
-from typing import Callable, Any
+from typing import Callable, Any, Tuple, Type
 
-def retry_on_error(max_retries: int = 3, delay: float = 2.0, backoff: float = 2.0):
+logger = logging.getLogger(__name__)
+
+# 重试也不会成功的永久性错误（鉴权/权限问题），出现时立即放弃
+NON_RETRYABLE_SUBSTRINGS = (
+    "api key not valid",
+    "api_key_invalid",
+    "invalid api key",
+    "unauthorized",
+    "permission_denied",
+)
+
+
+def _log_failure(error: Exception, attempt: int, max_retries: int):
+    """记录单次调用失败信息"""
+    # 检查是否是地域限制错误
+    if "User location is not supported" in str(error):
+        logger.warning("⚠️ 地域限制错误 (尝试 %d/%d): %s", attempt + 1, max_retries + 1, error)
+    else:
+        logger.warning("⚠️ API调用失败 (尝试 %d/%d): %s", attempt + 1, max_retries + 1, error)
+
+
+def _is_retryable(error: Exception, retryable_exceptions: Tuple[Type[BaseException], ...],
+                  non_retryable_substrings: Tuple[str, ...]) -> bool:
+    """判断一次失败是否值得重试"""
+    if not isinstance(error, retryable_exceptions):
+        return False
+    error_msg = str(error).lower()
+    return not any(s in error_msg for s in non_retryable_substrings)
+
+
+def retry_on_error(max_retries: int = 3, delay: float = 2.0, backoff: float = 2.0,
+                   jitter: float = 0.5,
+                   retryable_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+                   non_retryable_substrings: Tuple[str, ...] = NON_RETRYABLE_SUBSTRINGS):
     """
     重试装饰器，用于处理Gemini API调用失败
     
+    同时支持普通函数和协程函数；协程函数使用 asyncio.sleep 等待，不阻塞事件循环。
+    每次等待时间乘以 [1 - jitter, 1 + jitter] 内的随机系数，避免并发调用同步重试
+    
     Args:
         max_retries: 最大重试次数
         delay: 初始延迟时间（秒）
         backoff: 退避倍数
+        jitter: 等待时间随机抖动比例（0 表示不抖动）
+        retryable_exceptions: 允许重试的异常类型
+        non_retryable_substrings: 错误信息包含这些内容（不区分大小写）时不再重试
     """
+    def should_retry(error: Exception, attempt: int) -> bool:
+        if attempt >= max_retries:
+            logger.error("❌ 达到最大重试次数，放弃")
+            return False
+        if not _is_retryable(error, retryable_exceptions, non_retryable_substrings):
+            logger.error("❌ 错误不可重试，放弃")
+            return False
+        return True
+    
+    def next_sleep(current_delay: float) -> float:
+        sleep_time = current_delay * random.uniform(1 - jitter, 1 + jitter) if jitter else current_delay
+        logger.info("   等待 %.1f 秒后重试...", sleep_time)
+        return sleep_time
+    
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                current_delay = delay
+                last_exception = None
+                
+                for attempt in range(max_retries + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        last_exception = e
+                        _log_failure(e, attempt, max_retries)
+                        
+                        if not should_retry(e, attempt):
+                            break
+                        await asyncio.sleep(next_sleep(current_delay))
+                        current_delay *= backoff
+                
+                raise last_exception
+            
+            return async_wrapper
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
             current_delay = delay
@@ -26,22 +105,14 @@ def retry_on_error(max_retries: int = 3, delay: float = 2.0, backoff: float = 2.
                     return func(*args, **kwargs)
                 except Exception as e:
                     last_exception = e
-                    error_msg = str(e)
-                    
-                    # 检查是否是地域限制错误
-                    if "User location is not supported" in error_msg:
-                        print(f"⚠️ 地域限制错误 (尝试 {attempt + 1}/{max_retries + 1}): {error_msg}")
-                    else:
-                        print(f"⚠️ API调用失败 (尝试 {attempt + 1}/{max_retries + 1}): {error_msg}")
+                    _log_failure(e, attempt, max_retries)
                     
-                    if attempt < max_retries:
-                        print(f"   等待 {current_delay:.1f} 秒后重试...")
-                        time.sleep(current_delay)
-                        current_delay *= backoff
-                    else:
-                        print(f"❌ 达到最大重试次数，放弃")
+                    if not should_retry(e, attempt):
+                        break
+                    time.sleep(next_sleep(current_delay))
+                    current_delay *= backoff
             
-            # 所有重试都失败，抛出最后的异常
+            # 所有重试都失败（或遇到不可重试的错误），抛出最后的异常
             raise last_exception
         
         return wrapper
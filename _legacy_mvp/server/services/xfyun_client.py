@@ -3,18 +3,44 @@
 使用 WebSocket 进行实时语音评测
 文档：https://www.xfyun.cn/doc/Ise/IseAPI.html
 """
-import websocket
+import asyncio
+import copy
 import datetime
+import functools
 import hashlib
-import base64
 import hmac
-import json
+import math
+import orjson
 import time
 import os
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from urllib.parse import urlencode
 from dotenv import load_dotenv
 import ssl
-import xml.etree.ElementTree as ET
+import websockets
+
+# base64 编解码：优先使用 pybase64（SIMD 加速），未安装时回退标准库
+try:
+    from pybase64 import b64encode as _b64encode, b64decode as _b64decode
+except ImportError:
+    from base64 import b64encode as _b64encode, b64decode as _b64decode
+
+# XML 解析：优先使用 lxml（libxml2），未安装时回退标准库
+try:
+    from lxml.etree import fromstring as _xml_fromstring
+except ImportError:
+    from xml.etree.ElementTree import fromstring as _xml_fromstring
+
+# 进程内解码：numpy / scipy / soundfile 都已安装时，常见格式不再启动 ffmpeg 子进程
+try:
+    import numpy as np
+    import soundfile
+    from scipy.signal import resample_poly
+except ImportError:
+    soundfile = None
 
 load_dotenv()
 
@@ -26,6 +52,150 @@ XFYUN_API_SECRET = os.getenv("XFYUN_API_SECRET")
 # WebSocket 地址
 ISE_URL = "wss://ise-api.xfyun.cn/v2/open-ise"
 
+# 每帧大小（16kHz 16bit 单声道约 40ms 的音频）和发送间隔
+FRAME_SIZE = 1280
+FRAME_INTERVAL = 0.04
+
+# 音频帧消息模板：只有帧序号、状态和 base64 数据会变化（base64 字符无需 JSON 转义）
+# 讯飞 ISE v2 只接受 JSON 文本帧，音频必须 base64 编码，不能改发二进制帧；
+# base64 带来的约 33% 体积由 permessage-deflate 压缩回收（服务端协商支持时）
+_FRAME_TEMPLATE = '{"business":{"cmd":"auw","aus":%d,"aue":"raw"},"data":{"status":%d,"data":"%s"}}'
+
+# 讯飞要求的采样率
+SAMPLE_RATE = 16000
+
+# 可由 soundfile（libsndfile）直接解码的扩展名，其余格式（如 webm）交给 ffmpeg
+_SOUNDFILE_EXTS = {'.wav', '.flac', '.ogg', '.aiff', '.aif'}
+
+# ffmpeg 可执行文件（用于把录音转换为 PCM）
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# 缓存最近转换的 PCM 数量（同一录音被多次评测时不重复解码）
+PCM_CACHE_SIZE = int(os.getenv("XFYUN_PCM_CACHE_SIZE", "4"))
+
+# 与原实现一致：不校验讯飞网关证书
+_SSL_CONTEXT = ssl.create_default_context()
+_SSL_CONTEXT.check_hostname = False
+_SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+# 评测文本格式：单词 [word]...[/word]，句子 [sent]...[/sent]，篇章 [chapter]...[/chapter]
+_ISE_WRAP = {
+    "read_word": ("[word]", "[/word]"),
+    "read_sentence": ("[sent]", "[/sent]"),
+    "read_chapter": ("[chapter]", "[/chapter]"),
+}
+
+# 缓存最近的成功评测结果数量（同一录音 + 同一参考文本不重复请求讯飞）
+RESULT_CACHE_SIZE = int(os.getenv("XFYUN_RESULT_CACHE_SIZE", "64"))
+
+# 讯飞分数多为 0-100 的整数字符串，预先建好 str -> float 对照表
+_FLOAT_CACHE = {str(i): float(i) for i in range(101)}
+
+# 鉴权 URL 复用时长（秒），远小于讯飞允许的 300 秒时钟偏差
+URL_CACHE_SECONDS = 60
+
+
+@functools.lru_cache(maxsize=PCM_CACHE_SIZE)
+def _prepare_audio_cached(audio_path: str, mtime_ns: int, size: int) -> bytes:
+    """
+    把音频文件转换为 16kHz 16bit 单声道 PCM（结果按文件版本缓存）
+    
+    soundfile 支持的格式在进程内解码并用多相滤波重采样；其余格式（或进程内解码失败时）
+    由一次 ffmpeg 调用完成解码、混音和重采样，直接从 stdout 读取 raw PCM
+    
+    Args:
+        audio_path: 音频文件真实路径
+        mtime_ns: 文件修改时间（仅作缓存键）
+        size: 文件大小（仅作缓存键）
+    
+    Returns:
+        PCM 音频数据
+    """
+    ext = os.path.splitext(audio_path)[1].lower()
+    
+    if ext == '.pcm':
+        # 已经是 PCM 格式
+        with open(audio_path, 'rb') as f:
+            return f.read()
+    
+    if soundfile is not None and ext in _SOUNDFILE_EXTS:
+        pcm = _decode_with_soundfile(audio_path)
+        if pcm is not None:
+            return pcm
+    
+    completed = subprocess.run(
+        [
+            FFMPEG_BINARY, "-nostdin", "-loglevel", "error",
+            "-i", audio_path,
+            "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "pipe:1"
+        ],
+        capture_output=True
+    )
+    if completed.returncode != 0:
+        raise Exception(f"音频转换失败: {completed.stderr.decode('utf-8', 'replace').strip()}")
+    return completed.stdout
+
+
+def _decode_with_soundfile(audio_path: str):
+    """
+    用 soundfile 解码音频，混为单声道并重采样到 16kHz
+    
+    Args:
+        audio_path: 音频文件路径
+    
+    Returns:
+        16bit PCM 数据；libsndfile 无法解码时返回 None（由调用方回退到 ffmpeg）
+    """
+    try:
+        samples, sample_rate = soundfile.read(audio_path, dtype='float32', always_2d=True)
+    except Exception:
+        return None
+    
+    mono = samples.mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        g = math.gcd(sample_rate, SAMPLE_RATE)
+        mono = resample_poly(mono, SAMPLE_RATE // g, sample_rate // g)
+    
+    return np.clip(np.round(mono * 32768), -32768, 32767).astype('<i2').tobytes()
+
+
+@functools.lru_cache(maxsize=256)
+def _build_ise_text_cached(text: str, category: str) -> str:
+    """
+    按评测类型给文本加上讯飞要求的标记（同一文本重复评测时直接复用）
+    
+    Args:
+        text: 评测文本
+        category: 评测类型
+    
+    Returns:
+        带标记的评测文本，未知类型原样返回
+    """
+    prefix, suffix = _ISE_WRAP.get(category, ("", ""))
+    return f"{prefix}{text}{suffix}"
+
+
+def _getf(elem, key: str) -> float:
+    """读取 XML 元素的分数属性（缺失时为 0），整数分数直接查表"""
+    value = elem.get(key)
+    if value is None:
+        return 0.0
+    cached = _FLOAT_CACHE.get(value)
+    return cached if cached is not None else float(value)
+
+
+async def _discard_connection(connecting: asyncio.Future):
+    """放弃提前发起的连接：握手未完成则取消，已建立则关闭"""
+    if connecting.cancel():
+        await asyncio.gather(connecting, return_exceptions=True)
+        return
+    try:
+        ws = connecting.result()
+    except Exception:
+        return
+    await ws.close()
+
 
 class XfyunIseClient:
     """讯飞语音评测 WebSocket 客户端"""
@@ -38,7 +208,35 @@ class XfyunIseClient:
         self.api_key = XFYUN_API_KEY
         self.api_secret = XFYUN_API_SECRET
         
+        # 已载入密钥的 HMAC-SHA256 模板，每次签名 copy() 一份，省去重复的密钥处理
+        self._hmac_template = hmac.new(self.api_secret.encode('utf-8'), digestmod=hashlib.sha256)
+        
+        # 鉴权 URL 缓存：(生成时间, URL)，评测线程与调用线程可能同时访问
+        self._url_cache = (0.0, None)
+        self._url_lock = threading.Lock()
+        
+        # 评测结果缓存：(真实路径, 修改时间, 大小, 文本, 类型, 语言) -> 成功结果
+        self._result_cache = OrderedDict()
+        self._result_lock = threading.Lock()
+        
     def _create_url(self):
+        """
+        获取带鉴权的 WebSocket URL（URL_CACHE_SECONDS 内复用同一个签名）
+        """
+        with self._url_lock:
+            created_at, url = self._url_cache
+            now = time.monotonic()
+            if url is None or now - created_at >= URL_CACHE_SECONDS:
+                url = self._sign_url()
+                self._url_cache = (now, url)
+            return url
+    
+    def _invalidate_url(self):
+        """丢弃缓存的鉴权 URL（握手失败时调用，下次重新签名）"""
+        with self._url_lock:
+            self._url_cache = (0.0, None)
+    
+    def _sign_url(self):
         """
         生成带鉴权的 WebSocket URL
         """
@@ -50,17 +248,15 @@ class XfyunIseClient:
         signature_origin = f"host: ise-api.xfyun.cn\ndate: {date}\nGET /v2/open-ise HTTP/1.1"
         
         # HMAC-SHA256 签名
-        signature_sha = hmac.new(
-            self.api_secret.encode('utf-8'),
-            signature_origin.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
+        hasher = self._hmac_template.copy()
+        hasher.update(signature_origin.encode('utf-8'))
+        signature_sha = hasher.digest()
         
-        signature_sha_base64 = base64.b64encode(signature_sha).decode('utf-8')
+        signature_sha_base64 = _b64encode(signature_sha).decode('utf-8')
         
         # 构建 authorization
         authorization_origin = f'api_key="{self.api_key}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
-        authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode('utf-8')
+        authorization = _b64encode(authorization_origin.encode('utf-8')).decode('utf-8')
         
         # 构建请求 URL
         params = {
@@ -74,7 +270,7 @@ class XfyunIseClient:
     def evaluate_audio(self, audio_path: str, text: str, category: str = "read_sentence", 
                        language: str = "en_us") -> dict:
         """
-        评测音频文件
+        评测音频文件（同步接口，供线程池等同步调用方使用）
         
         Args:
             audio_path: 音频文件路径（支持 pcm, wav, mp3 等格式）
@@ -87,167 +283,252 @@ class XfyunIseClient:
                 - en_us: 英语
                 - zh_cn: 中文
         
+        Returns:
+            评测结果字典
+        """
+        return asyncio.run(self.evaluate_audio_async(audio_path, text, category, language))
+    
+    async def evaluate_audio_async(self, audio_path: str, text: str, category: str = "read_sentence",
+                                   language: str = "en_us") -> dict:
+        """
+        异步评测音频文件
+        
+        在事件循环内完成整个会话：发送任务按节奏推送音频帧，当前协程同时接收评测结果，
+        并发评测不再为每个会话占用两个线程
+        
+        Args:
+            audio_path: 音频文件路径（支持 pcm, wav, mp3 等格式）
+            text: 评测文本（学生需要朗读的内容）
+            category: 评测类型（read_word / read_sentence / read_chapter）
+            language: 语言（en_us / zh_cn）
+        
+        Returns:
+            评测结果字典
+        """
+        key = self._result_cache_key(audio_path, text, category, language)
+        cached = self._get_cached_result(key)
+        if cached is not None:
+            return cached
+        
+        result = await self._run_session(audio_path, text, category, language)
+        self._store_result(key, result)
+        return result
+    
+    def _result_cache_key(self, audio_path: str, text: str, category: str,
+                          language: str) -> Optional[Tuple]:
+        """生成评测结果缓存键，文件不存在时返回 None（不缓存）"""
+        try:
+            realpath = os.path.realpath(audio_path)
+            stat = os.stat(realpath)
+        except OSError:
+            return None
+        return (realpath, stat.st_mtime_ns, stat.st_size, text, category, language)
+    
+    def _get_cached_result(self, key: Optional[Tuple]) -> Optional[dict]:
+        """读取缓存的评测结果（返回副本，调用方可以随意修改）"""
+        if key is None:
+            return None
+        with self._result_lock:
+            result = self._result_cache.get(key)
+            if result is None:
+                return None
+            self._result_cache.move_to_end(key)
+        return copy.deepcopy(result)
+    
+    def _store_result(self, key: Optional[Tuple], result: dict):
+        """缓存成功的评测结果，超出 RESULT_CACHE_SIZE 时淘汰最久未用的"""
+        if key is None or result["status"] != "success":
+            return
+        result = copy.deepcopy(result)
+        with self._result_lock:
+            self._result_cache[key] = result
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    async def _run_session(self, audio_path: str, text: str, category: str, language: str) -> dict:
+        """
+        执行一次讯飞评测会话
+        
+        Args:
+            audio_path: 音频文件路径
+            text: 评测文本
+            category: 评测类型
+            language: 语言
+        
         Returns:
             评测结果字典
         """
         result = {"status": "pending", "data": None, "error": None}
         
-        def on_message(ws, message):
-            try:
-                msg = json.loads(message)
-                code = msg.get("code", -1)
-                
-                if code != 0:
-                    result["status"] = "error"
-                    result["error"] = f"评测错误: code={code}, message={msg.get('message', 'Unknown error')}"
-                    ws.close()
-                    return
-                
-                data = msg.get("data", {})
-                status = data.get("status", 0)
-                
-                if status == 2:  # 评测结束
-                    # 解析评测结果
-                    result_data = data.get("data", "")
-                    if result_data:
-                        # 结果是 Base64 编码的 XML
-                        xml_result = base64.b64decode(result_data).decode('utf-8')
-                        result["data"] = self._parse_result(xml_result)
-                        result["raw_xml"] = xml_result
-                    result["status"] = "success"
-                    ws.close()
-                    
-            except Exception as e:
-                result["status"] = "error"
-                result["error"] = f"解析响应失败: {str(e)}"
-                ws.close()
+        # 讯飞每个会话一条连接（返回最终结果后服务端即关闭），无法复用；
+        # 改为在转换音频的同时完成 TLS + WebSocket 握手，握手不再占用关键路径
+        connecting = asyncio.ensure_future(websockets.connect(
+            self._create_url(), ssl=_SSL_CONTEXT, compression="deflate"
+        ))
         
-        def on_error(ws, error):
+        try:
+            # 解码和切帧是阻塞操作，放到线程中执行
+            frames = await asyncio.to_thread(self._prepare_frames, audio_path)
+        except Exception as e:
+            await _discard_connection(connecting)
             result["status"] = "error"
-            result["error"] = f"WebSocket 错误: {str(error)}"
+            result["error"] = f"发送音频失败: {str(e)}"
+            return result
         
-        def on_close(ws, close_status_code, close_msg):
-            pass
+        first_frame = self._build_first_frame(text, category, language)
         
-        def on_open(ws):
-            def run():
+        try:
+            async with await connecting as ws:
+                await ws.send(orjson.dumps(first_frame).decode("utf-8"))
+                sender = asyncio.create_task(self._send_audio_frames(ws, frames))
                 try:
-                    # 读取并转换音频
-                    audio_data = self._prepare_audio(audio_path)
-                    
-                    # 构建评测文本
-                    ise_text = self._build_ise_text(text, category)
-                    
-                    # 每帧大小（约 40ms 的音频）
-                    frame_size = 1280
-                    interval = 0.04  # 发送间隔
-                    
-                    # 发送第一帧（包含参数）
-                    first_frame = {
-                        "common": {
-                            "app_id": self.app_id
-                        },
-                        "business": {
-                            "category": category,
-                            "rstcd": "utf8",
-                            "group": "pupil",
-                            "sub": "ise",
-                            "ent": "en_vip" if language == "en_us" else "cn_vip",
-                            "text": ise_text,
-                            "cmd": "ssb",
-                            "auf": "audio/L16;rate=16000",
-                            "aue": "raw",
-                            "tte": "utf-8"
-                        },
-                        "data": {
-                            "status": 0
-                        }
-                    }
-                    ws.send(json.dumps(first_frame))
-                    
-                    # 分帧发送音频
-                    audio_len = len(audio_data)
-                    offset = 0
-                    frame_count = 0
-                    
-                    while offset < audio_len:
-                        # 判断是否是最后一帧
-                        end = min(offset + frame_size, audio_len)
-                        is_last = (end >= audio_len)
-                        
-                        frame_data = audio_data[offset:end]
-                        frame_base64 = base64.b64encode(frame_data).decode('utf-8')
-                        
-                        frame = {
-                            "business": {
-                                "cmd": "auw",
-                                "aus": frame_count + 1,
-                                "aue": "raw"
-                            },
-                            "data": {
-                                "status": 2 if is_last else 1,
-                                "data": frame_base64
-                            }
-                        }
-                        
-                        ws.send(json.dumps(frame))
-                        frame_count += 1
-                        offset = end
-                        
-                        time.sleep(interval)
-                    
-                except Exception as e:
+                    async for message in ws:
+                        if self._handle_message(message, result):
+                            break
+                finally:
+                    if not sender.done():
+                        sender.cancel()
+                    send_results = await asyncio.gather(sender, return_exceptions=True)
+                
+                send_error = send_results[0]
+                if result["status"] == "pending" and isinstance(send_error, Exception):
                     result["status"] = "error"
-                    result["error"] = f"发送音频失败: {str(e)}"
-                    ws.close()
-            
-            import threading
-            threading.Thread(target=run).start()
-        
-        # 创建 WebSocket 连接
-        url = self._create_url()
-        ws = websocket.WebSocketApp(
-            url,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close,
-            on_open=on_open
-        )
-        
-        # 运行 WebSocket（阻塞直到完成）
-        ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+                    result["error"] = f"发送音频失败: {str(send_error)}"
+        except Exception as e:
+            self._invalidate_url()
+            result["status"] = "error"
+            result["error"] = f"WebSocket 错误: {str(e)}"
+            return result
+        
+        if result["status"] == "pending":
+            result["status"] = "error"
+            result["error"] = "WebSocket 错误: 连接在评测结束前关闭"
         
         return result
     
-    def _prepare_audio(self, audio_path: str) -> bytes:
+    def _prepare_frames(self, audio_path: str) -> List[str]:
+        """读取并转换音频，预先切帧编码"""
+        return self._build_audio_frames(self._prepare_audio(audio_path))
+    
+    def _build_first_frame(self, text: str, category: str, language: str) -> dict:
         """
-        准备音频数据（转换为 16kHz 16bit PCM）
+        构建第一帧（包含评测参数）
         """
-        from pydub import AudioSegment
-        
-        # 根据文件扩展名加载音频
-        ext = os.path.splitext(audio_path)[1].lower()
-        
-        if ext == '.pcm':
-            # 已经是 PCM 格式
-            with open(audio_path, 'rb') as f:
-                return f.read()
-        else:
-            # 使用 pydub 转换
-            if ext == '.webm':
-                audio = AudioSegment.from_file(audio_path, format='webm')
-            elif ext == '.mp3':
-                audio = AudioSegment.from_mp3(audio_path)
-            elif ext == '.wav':
-                audio = AudioSegment.from_wav(audio_path)
-            else:
-                audio = AudioSegment.from_file(audio_path)
+        return {
+            "common": {
+                "app_id": self.app_id
+            },
+            "business": {
+                "category": category,
+                "rstcd": "utf8",
+                "group": "pupil",
+                "sub": "ise",
+                "ent": "en_vip" if language == "en_us" else "cn_vip",
+                "text": self._build_ise_text(text, category),
+                "cmd": "ssb",
+                "auf": "audio/L16;rate=16000",
+                "aue": "raw",
+                "tte": "utf-8"
+            },
+            "data": {
+                "status": 0
+            }
+        }
+    
+    def _handle_message(self, message, result: dict) -> bool:
+        """
+        处理一条服务端消息，把结果写入 result
+        
+        Returns:
+            会话是否已结束（出错或评测完成）
+        """
+        try:
+            msg = orjson.loads(message)
+            code = msg.get("code", -1)
             
-            # 转换为 16kHz, 单声道, 16bit
-            audio = audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
+            if code != 0:
+                result["status"] = "error"
+                result["error"] = f"评测错误: code={code}, message={msg.get('message', 'Unknown error')}"
+                return True
+            
+            data = msg.get("data", {})
+            status = data.get("status", 0)
             
-            # 导出为 raw PCM
-            return audio.raw_data
+            if status == 2:  # 评测结束
+                # 解析评测结果
+                result_data = data.get("data", "")
+                if result_data:
+                    # 结果是 Base64 编码的 XML
+                    xml_result = _b64decode(result_data, validate=False).decode('utf-8')
+                    result["data"] = self._parse_result(xml_result)
+                    result["raw_xml"] = xml_result
+                result["status"] = "success"
+                return True
+            
+            return False
+                
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = f"解析响应失败: {str(e)}"
+            return True
+    
+    def _build_audio_frames(self, audio_data: bytes) -> List[str]:
+        """
+        预先把音频切帧并序列化成待发送的消息（编码工作不占用发送节奏）
+        
+        Args:
+            audio_data: 16kHz 16bit PCM 音频数据
+        
+        Returns:
+            按顺序排列的 JSON 消息列表，最后一帧 status=2
+        """
+        frames = []
+        audio_len = len(audio_data)
+        
+        for frame_index, offset in enumerate(range(0, audio_len, FRAME_SIZE)):
+            end = min(offset + FRAME_SIZE, audio_len)
+            frames.append(_FRAME_TEMPLATE % (
+                frame_index + 1,
+                2 if end >= audio_len else 1,
+                _b64encode(audio_data[offset:end]).decode('ascii')
+            ))
+        
+        return frames
+    
+    async def _send_audio_frames(self, ws, frames: List[str]):
+        """
+        按固定节奏发送音频帧
+        
+        第 n 帧在 start + n * FRAME_INTERVAL 时刻发出：只睡到下一帧的截止时间，
+        发送本身的耗时计入节奏预算，不会逐帧累加；最后一帧发出后不再等待
+        
+        Args:
+            ws: WebSocket 连接
+            frames: _build_audio_frames 生成的消息列表
+        """
+        start = time.monotonic()
+        last_index = len(frames) - 1
+        
+        for frame_index, frame in enumerate(frames):
+            await ws.send(frame)
+            
+            if frame_index == last_index:
+                break
+            
+            remaining = start + (frame_index + 1) * FRAME_INTERVAL - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+    
+    def _prepare_audio(self, audio_path: str) -> bytes:
+        """
+        准备音频数据（转换为 16kHz 16bit 单声道 PCM）
+        
+        按 (真实路径, 修改时间, 大小) 缓存转换结果，同一录音多次评测只解码一次
+        """
+        realpath = os.path.realpath(audio_path)
+        stat = os.stat(realpath)
+        return _prepare_audio_cached(realpath, stat.st_mtime_ns, stat.st_size)
     
     def _build_ise_text(self, text: str, category: str) -> str:
         """
@@ -255,27 +536,17 @@ class XfyunIseClient:
         
         讯飞评测要求特定的文本格式
         """
-        # 对于英文单词/句子评测
-        if category == "read_word":
-            # 单词格式：[word] word [/word]
-            return f"[word]{text}[/word]"
-        elif category == "read_sentence":
-            # 句子格式：[sent] sentence [/sent]
-            return f"[sent]{text}[/sent]"
-        elif category == "read_chapter":
-            # 篇章格式
-            return f"[chapter]{text}[/chapter]"
-        else:
-            return text
+        return _build_ise_text_cached(text, category)
     
     def _parse_result(self, xml_result: str) -> dict:
         """
         解析评测结果 XML
         
-        讯飞返回的评测结果是 XML 格式，包含详细的评分信息
+        讯飞返回的评测结果是 XML 格式，包含详细的评分信息。
+        用 lxml（未安装时回退标准库）解析，按标签直接遍历元素，不做 XPath 查找
         """
         try:
-            root = ET.fromstring(xml_result)
+            root = _xml_fromstring(xml_result.strip().encode('utf-8'))
             
             result = {
                 "total_score": 0,
@@ -285,48 +556,46 @@ class XfyunIseClient:
                 "details": []
             }
             
-            # 获取总体评分（rec_paper）
-            rec_paper = root.find('.//rec_paper')
+            # 获取总体评分（rec_paper，可能就是根节点）
+            rec_paper = next(root.iter('rec_paper'), None)
             if rec_paper is not None:
-                result["total_score"] = float(rec_paper.get('total_score', 0))
-                result["accuracy_score"] = float(rec_paper.get('accuracy_score', 0))
-                result["fluency_score"] = float(rec_paper.get('fluency_score', 0))
-                result["integrity_score"] = float(rec_paper.get('integrity_score', 0))
+                result["total_score"] = _getf(rec_paper, 'total_score')
+                result["accuracy_score"] = _getf(rec_paper, 'accuracy_score')
+                result["fluency_score"] = _getf(rec_paper, 'fluency_score')
+                result["integrity_score"] = _getf(rec_paper, 'integrity_score')
             
             # 获取句子评分（read_sentence）
-            read_sentence = root.find('.//read_sentence')
+            read_sentence = next(root.iter('read_sentence'), None)
             if read_sentence is not None:
                 sent = read_sentence.find('sentence')
                 if sent is not None:
-                    result["sentence_score"] = float(sent.get('total_score', 0))
+                    result["sentence_score"] = _getf(sent, 'total_score')
                     
                     # 获取单词详情
-                    for word in sent.findall('.//word'):
+                    for word in sent.iter('word'):
                         word_info = {
                             "content": word.get('content', ''),
-                            "total_score": float(word.get('total_score', 0)),
+                            "total_score": _getf(word, 'total_score'),
                             "dp_message": word.get('dp_message', '0'),  # 0=正确, 16=漏读, 32=增读, 64=回读, 128=替换
                         }
                         
                         # 获取音素详情
-                        syllables = []
-                        for syll in word.findall('.//syll'):
-                            syll_info = {
+                        word_info["syllables"] = [
+                            {
                                 "content": syll.get('content', ''),
-                                "score": float(syll.get('total_score', 0))
+                                "score": _getf(syll, 'total_score')
                             }
-                            syllables.append(syll_info)
-                        
-                        word_info["syllables"] = syllables
+                            for syll in word.iter('syll')
+                        ]
                         result["details"].append(word_info)
             
             # 获取单词评分（read_word）
-            read_word = root.find('.//read_word')
+            read_word = next(root.iter('read_word'), None)
             if read_word is not None:
-                for word in read_word.findall('.//word'):
+                for word in read_word.iter('word'):
                     word_info = {
                         "content": word.get('content', ''),
-                        "total_score": float(word.get('total_score', 0)),
+                        "total_score": _getf(word, 'total_score'),
                     }
                     result["details"].append(word_info)
             
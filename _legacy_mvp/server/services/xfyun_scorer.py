@@ -2,9 +2,17 @@
 讯飞语音评测评分服务
 使用讯飞 WebAPI 进行专业语音评测
 """
-from typing import Dict, List, Tuple
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
 from services.xfyun_client import get_xfyun_client
 
+logger = logging.getLogger(__name__)
+
+# 批量评测时同时进行的讯飞会话上限（受讯飞并发路数限制）
+XFYUN_MAX_CONCURRENCY = int(os.getenv("XFYUN_MAX_CONCURRENCY", "8"))
+
 
 def evaluate_words_with_xfyun(audio_path: str, words: List[str]) -> Dict:
     """
@@ -19,18 +27,14 @@ def evaluate_words_with_xfyun(audio_path: str, words: List[str]) -> Dict:
     """
     client = get_xfyun_client()
     if client is None:
-        return {
-            "error": "讯飞客户端未配置",
-            "score": 0,
-            "details": []
-        }
+        return _part1_error("讯飞客户端未配置")
     
     try:
         # 将单词列表拼接成句子进行评测
         # 讯飞对于单词列表，可以用空格分隔作为句子评测
         text = " ".join(words)
         
-        print(f"📊 讯飞评测 Part 1: {len(words)} 个单词")
+        logger.info("📊 讯飞评测 Part 1: %d 个单词", len(words))
         
         result = client.evaluate_audio(
             audio_path=audio_path,
@@ -38,64 +42,109 @@ def evaluate_words_with_xfyun(audio_path: str, words: List[str]) -> Dict:
             category="read_sentence",  # 用句子模式评测单词序列
             language="en_us"
         )
+        return _build_part1_result(result, words)
         
-        if result["status"] == "error":
-            print(f"❌ 讯飞评测失败: {result['error']}")
-            return {
-                "error": result["error"],
-                "score": 0,
-                "details": []
-            }
+    except Exception as e:
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _part1_error(str(e))
+
+
+async def evaluate_words_with_xfyun_async(audio_path: str, words: List[str]) -> Dict:
+    """
+    使用讯飞评测 Part 1 单词朗读（异步版本，直接在事件循环中完成 WebSocket 会话）
+    
+    Args:
+        audio_path: 音频文件路径
+        words: 需要朗读的单词列表
+    
+    Returns:
+        评测结果
+    """
+    client = get_xfyun_client()
+    if client is None:
+        return _part1_error("讯飞客户端未配置")
+    
+    try:
+        logger.info("📊 讯飞评测 Part 1: %d 个单词", len(words))
         
-        # 解析评测数据
-        data = result.get("data", {})
+        result = await client.evaluate_audio_async(
+            audio_path=audio_path,
+            text=" ".join(words),
+            category="read_sentence",
+            language="en_us"
+        )
+        return _build_part1_result(result, words)
         
-        # 计算单词正确数
-        details = data.get("details", [])
-        correct_count = 0
-        incorrect_words = []
-        correct_words = []
-        word_results = []
+    except Exception as e:
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _part1_error(str(e))
+
+
+def _part1_error(error: str) -> Dict:
+    """Part 1 评测失败时的返回值"""
+    return {
+        "error": error,
+        "score": 0,
+        "details": []
+    }
+
+
+def _build_part1_result(result: Dict, words: List[str]) -> Dict:
+    """
+    把讯飞原始评测结果整理为 Part 1 单词朗读结果
+    
+    Args:
+        result: evaluate_audio 返回的结果
+        words: 需要朗读的单词列表
+    
+    Returns:
+        评测结果
+    """
+    if result["status"] == "error":
+        logger.error("❌ 讯飞评测失败: %s", result["error"])
+        return _part1_error(result["error"])
+    
+    # 解析评测数据
+    data = result.get("data", {})
+    
+    # 计算单词正确数
+    details = data.get("details", [])
+    correct_count = 0
+    incorrect_words = []
+    correct_words = []
+    word_results = []
+    
+    for i, detail in enumerate(details):
+        word = detail.get("content", "")
+        score = detail.get("total_score", 0)
+        dp_message = detail.get("dp_message", "0")
         
-        for i, detail in enumerate(details):
-            word = detail.get("content", "")
-            score = detail.get("total_score", 0)
-            dp_message = detail.get("dp_message", "0")
-            
-            # 评分>=60 且没有错误标记视为正确
-            is_correct = score >= 60 and dp_message == "0"
-            
-            if is_correct:
-                correct_count += 1
-                correct_words.append(word)
-            else:
-                incorrect_words.append(word)
-            
-            word_results.append({
-                "word": word,
-                "correct": is_correct,
-                "score": score,
-                "dp_message": _get_dp_message_text(dp_message)
-            })
+        # 评分>=60 且没有错误标记视为正确
+        is_correct = score >= 60 and dp_message == "0"
         
-        return {
-            "score": correct_count,
-            "total": len(words),
-            "correct_words": correct_words,
-            "incorrect_words": incorrect_words,
-            "word_results": word_results,
-            "accuracy_score": data.get("accuracy_score", 0),
-            "fluency_score": data.get("fluency_score", 0),
-            "feedback": _generate_part1_feedback(word_results, data)
-        }
+        if is_correct:
+            correct_count += 1
+            correct_words.append(word)
+        else:
+            incorrect_words.append(word)
         
-    except Exception as e:
-        print(f"❌ 讯飞评测异常: {str(e)}")
-        return {
-            "error": str(e),
-            "score": 0,
-            "details": []
-        }
+        word_results.append({
+            "word": word,
+            "correct": is_correct,
+            "score": score,
+            "dp_message": _get_dp_message_text(dp_message)
+        })
+    
+    return {
+        "score": correct_count,
+        "total": len(words),
+        "correct_words": correct_words,
+        "incorrect_words": incorrect_words,
+        "word_results": word_results,
+        "accuracy_score": data.get("accuracy_score", 0),
+        "fluency_score": data.get("fluency_score", 0),
+        "feedback": _generate_part1_feedback(word_results, data, incorrect_words)
+    }
 
 
 def evaluate_sentence_with_xfyun(audio_path: str, question: str, 
@@ -116,17 +165,14 @@ def evaluate_sentence_with_xfyun(audio_path: str, question: str,
     """
     client = get_xfyun_client()
     if client is None:
-        return {
-            "error": "讯飞客户端未配置",
-            "scores": {"pronunciation": 0, "fluency": 0}
-        }
+        return _sentence_error("讯飞客户端未配置")
     
     try:
         # 对于自由回答，我们使用篇章模式进行评测
         # 讯飞会评测发音准确度和流利度
         # 由于是自由回答，我们设置一个通用的评测文本
         
-        print(f"📊 讯飞评测 Part 2 问题 {question_index + 1}")
+        logger.info("📊 讯飞评测 Part 2 问题 %d", question_index + 1)
         
         # 对于自由回答，讯飞需要知道学生应该说什么
         # 但由于是开放式回答，我们使用"自由说"模式
@@ -142,46 +188,159 @@ def evaluate_sentence_with_xfyun(audio_path: str, question: str,
             category="read_sentence",
             language="en_us"
         )
+        return _build_sentence_result(result)
         
-        if result["status"] == "error":
-            print(f"❌ 讯飞评测失败: {result['error']}")
-            return {
-                "error": result["error"],
-                "scores": {"pronunciation": 0, "fluency": 0}
-            }
-        
-        data = result.get("data", {})
-        
-        # 从评测结果提取分数（讯飞分数通常是0-100）
-        # 我们需要转换为0-4或0-2的量表
-        accuracy = data.get("accuracy_score", 0)  # 准确度 0-100
-        fluency = data.get("fluency_score", 0)    # 流利度 0-100
-        total = data.get("total_score", 0)        # 总分 0-100
-        
-        # 转换为 0-2 量表（Part 2 每项满分2分）
-        pronunciation_score = round((accuracy / 100) * 2, 1)
-        fluency_score = round((fluency / 100) * 2, 1)
+    except Exception as e:
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _sentence_error(str(e))
+
+
+async def evaluate_sentence_with_xfyun_async(audio_path: str, question: str,
+                                             question_index: int = 0) -> Dict:
+    """
+    使用讯飞评测 Part 2 口语回答（异步版本）
+    
+    Args:
+        audio_path: 音频文件路径
+        question: 问题文本（用于参考）
+        question_index: 问题序号
+    
+    Returns:
+        评测结果
+    """
+    client = get_xfyun_client()
+    if client is None:
+        return _sentence_error("讯飞客户端未配置")
+    
+    try:
+        logger.info("📊 讯飞评测 Part 2 问题 %d", question_index + 1)
         
-        return {
-            "scores": {
-                "pronunciation": pronunciation_score,
-                "fluency": fluency_score
-            },
-            "raw_scores": {
-                "accuracy": accuracy,
-                "fluency": fluency,
-                "total": total
-            },
-            "details": data.get("details", []),
-            "feedback": _generate_part2_feedback(accuracy, fluency)
-        }
+        result = await client.evaluate_audio_async(
+            audio_path=audio_path,
+            text=question,
+            category="read_sentence",
+            language="en_us"
+        )
+        return _build_sentence_result(result)
         
     except Exception as e:
-        print(f"❌ 讯飞评测异常: {str(e)}")
-        return {
-            "error": str(e),
-            "scores": {"pronunciation": 0, "fluency": 0}
-        }
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _sentence_error(str(e))
+
+
+async def evaluate_sentences_with_xfyun_async(
+    audio_paths: List[str],
+    questions: List[str],
+    max_concurrency: int = XFYUN_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    并发评测多段 Part 2 回答（每题一段录音）
+    
+    Args:
+        audio_paths: 各题音频文件路径
+        questions: 与 audio_paths 一一对应的问题
+        max_concurrency: 同时进行的讯飞会话上限
+    
+    Returns:
+        与输入顺序一致的评测结果列表
+    """
+    calls = [
+        (evaluate_sentence_with_xfyun_async, (audio_path, question, i))
+        for i, (audio_path, question) in enumerate(zip(audio_paths, questions))
+    ]
+    return await _gather_limited(calls, max_concurrency)
+
+
+async def evaluate_words_batch_with_xfyun_async(
+    audio_paths: List[str],
+    words_list: List[List[str]],
+    max_concurrency: int = XFYUN_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    并发评测多段 Part 1 单词朗读录音
+    
+    Args:
+        audio_paths: 各段音频文件路径
+        words_list: 与 audio_paths 一一对应的单词列表
+        max_concurrency: 同时进行的讯飞会话上限
+    
+    Returns:
+        与输入顺序一致的评测结果列表
+    """
+    calls = [
+        (evaluate_words_with_xfyun_async, (audio_path, words))
+        for audio_path, words in zip(audio_paths, words_list)
+    ]
+    return await _gather_limited(calls, max_concurrency)
+
+
+async def _gather_limited(calls: List[Tuple], max_concurrency: int) -> List[Dict]:
+    """
+    在并发上限内执行一组评测协程，结果保持输入顺序
+    
+    Args:
+        calls: [(async_func, args), ...]
+        max_concurrency: 同时进行的调用上限
+    
+    Returns:
+        各调用的返回值
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run(func, args):
+        async with semaphore:
+            return await func(*args)
+    
+    return list(await asyncio.gather(*(run(func, args) for func, args in calls)))
+
+
+def _sentence_error(error: str) -> Dict:
+    """Part 2 单题评测失败时的返回值"""
+    return {
+        "error": error,
+        "scores": {"pronunciation": 0, "fluency": 0}
+    }
+
+
+def _build_sentence_result(result: Dict) -> Dict:
+    """
+    把讯飞原始评测结果整理为 Part 2 单题结果
+    
+    Args:
+        result: evaluate_audio 返回的结果
+    
+    Returns:
+        评测结果
+    """
+    if result["status"] == "error":
+        logger.error("❌ 讯飞评测失败: %s", result["error"])
+        return _sentence_error(result["error"])
+    
+    data = result.get("data", {})
+    
+    # 从评测结果提取分数（讯飞分数通常是0-100）
+    # 我们需要转换为0-4或0-2的量表
+    accuracy = data.get("accuracy_score", 0)  # 准确度 0-100
+    fluency = data.get("fluency_score", 0)    # 流利度 0-100
+    total = data.get("total_score", 0)        # 总分 0-100
+    
+    # 转换为 0-2 量表（Part 2 每项满分2分）
+    pronunciation_score = round((accuracy / 100) * 2, 1)
+    fluency_score = round((fluency / 100) * 2, 1)
+    
+    return {
+        "scores": {
+            "pronunciation": pronunciation_score,
+            "fluency": fluency_score
+        },
+        "raw_scores": {
+            "accuracy": accuracy,
+            "fluency": fluency,
+            "total": total
+        },
+        "details": data.get("details", []),
+        "feedback": _generate_part2_feedback(accuracy, fluency)
+    }
 
 
 def evaluate_part2_all_with_xfyun(audio_path: str, questions: List[str]) -> Dict:
@@ -197,14 +356,10 @@ def evaluate_part2_all_with_xfyun(audio_path: str, questions: List[str]) -> Dict
     """
     client = get_xfyun_client()
     if client is None:
-        return {
-            "error": "讯飞客户端未配置",
-            "total_score": 0,
-            "question_scores": []
-        }
+        return _part2_all_error("讯飞客户端未配置")
     
     try:
-        print(f"📊 讯飞评测 Part 2: {len(questions)} 个问题的综合回答")
+        logger.info("📊 讯飞评测 Part 2: %d 个问题的综合回答", len(questions))
         
         # 将所有问题作为参考文本
         combined_text = " ".join(questions)
@@ -215,61 +370,106 @@ def evaluate_part2_all_with_xfyun(audio_path: str, questions: List[str]) -> Dict
             category="read_chapter",  # 使用篇章模式
             language="en_us"
         )
+        return _build_part2_all_result(result, questions)
         
-        if result["status"] == "error":
-            print(f"❌ 讯飞评测失败: {result['error']}")
-            return {
-                "error": result["error"],
-                "total_score": 0,
-                "question_scores": []
-            }
-        
-        data = result.get("data", {})
-        
-        # 获取整体评分
-        accuracy = data.get("accuracy_score", 0)
-        fluency = data.get("fluency_score", 0)
-        total = data.get("total_score", 0)
-        
-        # 每个问题的分数（平均分配）
-        # Part 2 每个问题最高2分，共12个问题 = 24分
-        per_question_max = 2.0
-        per_question_score = round((total / 100) * per_question_max, 1)
-        
-        question_scores = []
-        for i, q in enumerate(questions):
-            question_scores.append({
-                "question_index": i,
-                "question": q,
-                "score": per_question_score,
-                "pronunciation": round((accuracy / 100) * 2, 1),
-                "fluency": round((fluency / 100) * 2, 1)
-            })
-        
-        total_score = per_question_score * len(questions)
+    except Exception as e:
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _part2_all_error(str(e))
+
+
+async def evaluate_part2_all_with_xfyun_async(audio_path: str, questions: List[str]) -> Dict:
+    """
+    使用讯飞评测整个 Part 2 音频（异步版本）
+    
+    Args:
+        audio_path: 音频文件路径
+        questions: 所有问题列表
+    
+    Returns:
+        评测结果
+    """
+    client = get_xfyun_client()
+    if client is None:
+        return _part2_all_error("讯飞客户端未配置")
+    
+    try:
+        logger.info("📊 讯飞评测 Part 2: %d 个问题的综合回答", len(questions))
         
-        return {
-            "total_score": total_score,
-            "question_scores": question_scores,
-            "raw_scores": {
-                "accuracy": accuracy,
-                "fluency": fluency,
-                "total": total
-            },
-            "feedback": _generate_part2_overall_feedback(accuracy, fluency, len(questions)),
-            "summary": {
-                "average_pronunciation": round((accuracy / 100) * 2, 1),
-                "average_fluency": round((fluency / 100) * 2, 1)
-            }
-        }
+        result = await client.evaluate_audio_async(
+            audio_path=audio_path,
+            text=" ".join(questions),
+            category="read_chapter",
+            language="en_us"
+        )
+        return _build_part2_all_result(result, questions)
         
     except Exception as e:
-        print(f"❌ 讯飞评测异常: {str(e)}")
-        return {
-            "error": str(e),
-            "total_score": 0,
-            "question_scores": []
+        logger.error("❌ 讯飞评测异常: %s", e)
+        return _part2_all_error(str(e))
+
+
+def _part2_all_error(error: str) -> Dict:
+    """Part 2 整体评测失败时的返回值"""
+    return {
+        "error": error,
+        "total_score": 0,
+        "question_scores": []
+    }
+
+
+def _build_part2_all_result(result: Dict, questions: List[str]) -> Dict:
+    """
+    把讯飞原始评测结果整理为 Part 2 整体结果
+    
+    Args:
+        result: evaluate_audio 返回的结果
+        questions: 所有问题列表
+    
+    Returns:
+        评测结果
+    """
+    if result["status"] == "error":
+        logger.error("❌ 讯飞评测失败: %s", result["error"])
+        return _part2_all_error(result["error"])
+    
+    data = result.get("data", {})
+    
+    # 获取整体评分
+    accuracy = data.get("accuracy_score", 0)
+    fluency = data.get("fluency_score", 0)
+    total = data.get("total_score", 0)
+    
+    # 每个问题的分数（平均分配）
+    # Part 2 每个问题最高2分，共12个问题 = 24分
+    per_question_max = 2.0
+    per_question_score = round((total / 100) * per_question_max, 1)
+    
+    question_scores = []
+    for i, q in enumerate(questions):
+        question_scores.append({
+            "question_index": i,
+            "question": q,
+            "score": per_question_score,
+            "pronunciation": round((accuracy / 100) * 2, 1),
+            "fluency": round((fluency / 100) * 2, 1)
+        })
+    
+    total_score = per_question_score * len(questions)
+    
+    return {
+        "total_score": total_score,
+        "question_scores": question_scores,
+        "raw_scores": {
+            "accuracy": accuracy,
+            "fluency": fluency,
+            "total": total
+        },
+        "feedback": _generate_part2_overall_feedback(accuracy, fluency, len(questions)),
+        "summary": {
+            "average_pronunciation": round((accuracy / 100) * 2, 1),
+            "average_fluency": round((fluency / 100) * 2, 1)
         }
+    }
 
 
 def _get_dp_message_text(dp_message: str) -> str:
@@ -286,19 +486,26 @@ def _get_dp_message_text(dp_message: str) -> str:
     return messages.get(dp_message, "未知")
 
 
-def _generate_part1_feedback(word_results: List[Dict], data: Dict) -> str:
+def _generate_part1_feedback(word_results: List[Dict], data: Dict,
+                             incorrect_words: Optional[List[str]] = None) -> str:
     """
     生成 Part 1 的反馈
+    
+    Args:
+        word_results: 逐词评测结果
+        data: 讯飞评测数据
+        incorrect_words: 已统计好的错误单词（不传时从 word_results 统计）
     """
-    correct_count = sum(1 for w in word_results if w.get("correct", False))
+    if incorrect_words is None:
+        incorrect_words = [w["word"] for w in word_results if not w.get("correct", False)]
     total_count = len(word_results)
+    correct_count = total_count - len(incorrect_words)
     accuracy = data.get("accuracy_score", 0)
     
     if correct_count == total_count:
         return f"发音表现优秀！所有 {total_count} 个单词都发音正确。准确度评分: {accuracy:.0f}/100"
     elif correct_count >= total_count * 0.8:
-        incorrect = [w["word"] for w in word_results if not w.get("correct", False)]
-        return f"发音表现良好！{correct_count}/{total_count} 个单词正确。需要注意的单词: {', '.join(incorrect)}。准确度评分: {accuracy:.0f}/100"
+        return f"发音表现良好！{correct_count}/{total_count} 个单词正确。需要注意的单词: {', '.join(incorrect_words)}。准确度评分: {accuracy:.0f}/100"
     elif correct_count >= total_count * 0.5:
         return f"发音有待提高。{correct_count}/{total_count} 个单词正确。建议多练习发音基础。准确度评分: {accuracy:.0f}/100"
     else:
@@ -0,0 +1,54 @@
+"""
+测试共享 fixture
+"""
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def sample_questions_data():
+    """示例题目数据（整个测试会话共享，需要修改的测试请先 deepcopy）"""
+    return {
+        "levels": [
+            {
+                "level_id": "level1",
+                "sections": [
+                    {
+                        "section_id": "unit1-3",
+                        "parts": [
+                            {
+                                "part_id": 1,
+                                "items": [
+                                    {"word": "hello"},
+                                    {"word": "world"},
+                                    {"word": "test"}
+                                ]
+                            },
+                            {
+                                "part_id": 2,
+                                "dialogues": [
+                                    {"question": "What's your name?"},
+                                    {"question": "How are you?"}
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+
+
+@pytest.fixture(scope="session")
+def sample_questions_bytes(sample_questions_data):
+    """序列化后的示例题目数据（题库文件内容）"""
+    return json.dumps(sample_questions_data).encode()
+
+
+@pytest.fixture(scope="session")
+def sample_questions_file(tmp_path_factory, sample_questions_bytes):
+    """写入示例题目数据的题库文件（整个测试会话只写一次）"""
+    path = tmp_path_factory.mktemp("questions") / "questions.json"
+    path.write_bytes(sample_questions_bytes)
+    return path
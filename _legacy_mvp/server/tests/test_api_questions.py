@@ -0,0 +1,95 @@
+"""
+测试题目 API
+"""
+import pytest
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.questions as questions_api
+from api.questions import router, _load_questions, _questions_etag
+
+
+# 临时题库文件内容（模块加载时序列化一次）
+QUESTIONS_BYTES = json.dumps({
+    "levels": [{
+        "level_id": "level1",
+        "level_name": "Level 1",
+        "sections": [{
+            "section_id": "unit1-3",
+            "section_name": "Unit 1-3",
+            "parts": [{"part_id": 1, "items": [{"word": "hello"}]}]
+        }]
+    }]
+}).encode()
+
+
+@pytest.fixture
+def questions_file(tmp_path, monkeypatch):
+    """写入临时题库文件，并清空题库和 ETag 缓存"""
+    path = tmp_path / "questions.json"
+    path.write_bytes(QUESTIONS_BYTES)
+    monkeypatch.setattr(questions_api, "QUESTIONS_FILE", path)
+    _load_questions.cache_clear()
+    _questions_etag.cache_clear()
+    yield path
+    _load_questions.cache_clear()
+    _questions_etag.cache_clear()
+
+
+@pytest.fixture
+def client():
+    """只挂载题目路由的测试客户端"""
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+class TestGetQuestionsCaching:
+    """测试题目接口的 HTTP 缓存"""
+
+    def test_returns_etag_and_cache_control(self, client, questions_file):
+        """测试响应带 ETag 和 Cache-Control"""
+        response = client.get("/api/questions/level1/unit1-3")
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] == _questions_etag()
+        assert "max-age" in response.headers["Cache-Control"]
+        assert response.json()["unit_name"] == "Unit 1-3"
+        assert response.json()["parts"][0]["part_id"] == 1
+
+    def test_matching_if_none_match_returns_304(self, client, questions_file):
+        """测试 If-None-Match 命中时返回 304 且无响应体"""
+        etag = client.get("/api/questions/level1/unit1-3").headers["ETag"]
+
+        response = client.get("/api/questions/level1/unit1-3", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    def test_stale_if_none_match_returns_200(self, client, questions_file):
+        """测试 ETag 不匹配时返回完整内容"""
+        response = client.get("/api/questions/level1/unit1-3", headers={"If-None-Match": '"stale"'})
+
+        assert response.status_code == 200
+        assert response.json()["level"] == "level1"
+
+    def test_unknown_unit_still_404(self, client, questions_file):
+        """测试单元不存在时仍返回 404"""
+        response = client.get("/api/questions/level1/unit9", headers={"If-None-Match": "*"})
+
+        assert response.status_code == 404
+
+
+class TestGetLevelsCaching:
+    """测试级别列表接口的 HTTP 缓存"""
+
+    def test_levels_304(self, client):
+        """测试级别列表的 ETag 协商"""
+        first = client.get("/api/questions/levels")
+        assert first.status_code == 200
+        assert first.json()["levels"][0]["id"] == "level1"
+
+        second = client.get("/api/questions/levels", headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == 304
@@ -2,170 +2,224 @@
 测试评分 API
 """
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from fastapi import UploadFile
+import pytest_asyncio
+from unittest.mock import DEFAULT, Mock, patch, AsyncMock
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from io import BytesIO
+import copy
 import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
 
-from api.scoring import router, evaluate_test, get_all_history, get_history, get_result_by_id
+from api.scoring import router, evaluate_test, get_all_history, get_history, get_result_by_id, _record_to_response
+import api.questions as questions_api
+from api.questions import _load_questions
+import schemas
+
+
+@pytest.fixture(autouse=True)
+def clear_questions_cache():
+    """每个测试前清空题库缓存，避免不同测试的题目数据互相影响"""
+    _load_questions.cache_clear()
+    yield
+    _load_questions.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    """上传的音频写入临时目录"""
+    monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+    return tmp_path
 
 
 @pytest.fixture
-def mock_db():
-    """Mock 数据库会话"""
-    return Mock(spec=Session)
+def questions_file(monkeypatch, sample_questions_file):
+    """题库指向会话级的示例题库文件"""
+    monkeypatch.setattr(questions_api, "QUESTIONS_FILE", sample_questions_file)
+    return sample_questions_file
 
 
 @pytest.fixture
-def mock_part1_audio():
-    """Mock Part 1 音频文件"""
-    audio = Mock(spec=UploadFile)
-    audio.filename = "part1.webm"
-    audio.read = Mock(return_value=b"fake part1 audio data")
-    return audio
+def write_questions(tmp_path_factory, monkeypatch):
+    """把给定题目数据写入临时题库文件，并让题库指向它"""
+    def _write(data):
+        path = tmp_path_factory.mktemp("questions") / "questions.json"
+        path.write_text(json.dumps(data), encoding="utf-8")
+        monkeypatch.setattr(questions_api, "QUESTIONS_FILE", path)
+        return path
+    return _write
+
+
+def _fill_db_defaults(obj):
+    """模拟数据库在 flush 时生成的主键和创建时间"""
+    obj.id = obj.id or 1
+    obj.created_at = obj.created_at or datetime.now()
+
+
+def _set_query_result(db, result, *, filtered=False, first=False):
+    """
+    设置 db.query(...).options(...) 查询链的返回值
+
+    Args:
+        db: Mock 数据库会话
+        result: 查询返回的记录列表（first=True 时为单条记录或 None）
+        filtered: 查询链中是否有 filter(...)
+        first: 是否以 first() 结尾（否则为 order_by(...).all()）
+    """
+    query = db.query.return_value.options.return_value
+    if filtered:
+        query = query.filter.return_value
+    if first:
+        query.first.return_value = result
+    else:
+        query.order_by.return_value.all.return_value = result
+
+
+def _make_db():
+    """Mock 数据库会话：add 时补上主键和创建时间，历史查询默认返回空列表"""
+    db = Mock(spec=Session)
+    db.add.side_effect = _fill_db_defaults
+    _set_query_result(db, [])
+    _set_query_result(db, [], filtered=True)
+    return db
 
 
 @pytest.fixture
-def mock_part2_audio():
-    """Mock Part 2 音频文件"""
-    audio = Mock(spec=UploadFile)
-    audio.filename = "part2.webm"
-    audio.read = Mock(return_value=b"fake part2 audio data")
-    return audio
+def mock_db():
+    """Mock 数据库会话"""
+    return _make_db()
+
+
+class FakeUpload:
+    """UploadFile 的轻量替身，只提供 evaluate_test 用到的 filename 和分块 read"""
+
+    __slots__ = ("filename", "_buffer")
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._buffer = BytesIO(data)
+
+    async def read(self, size=-1):
+        return self._buffer.read(size)
 
 
 @pytest.fixture
-def sample_questions_data():
-    """示例题目数据"""
-    return {
-        "levels": [
-            {
-                "level_id": "level1",
-                "sections": [
-                    {
-                        "section_id": "unit1-3",
-                        "parts": [
-                            {
-                                "part_id": 1,
-                                "items": [
-                                    {"word": "hello"},
-                                    {"word": "world"},
-                                    {"word": "test"}
-                                ]
-                            },
-                            {
-                                "part_id": 2,
-                                "dialogues": [
-                                    {"question": "What's your name?"},
-                                    {"question": "How are you?"}
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        ]
-    }
+def mock_part1_audio():
+    """Part 1 上传音频"""
+    return FakeUpload("part1.webm", b"fake part1 audio data")
 
 
-class TestEvaluateTestWithXfyun:
-    """测试使用讯飞评测的评估功能"""
+@pytest.fixture
+def mock_part2_audio():
+    """Part 2 上传音频"""
+    return FakeUpload("part2.webm", b"fake part2 audio data")
 
-    @pytest.mark.asyncio
-    @patch("api.scoring.is_xfyun_configured", return_value=True)
-    @patch("api.scoring.evaluate_words_with_xfyun")
-    @patch("api.scoring.evaluate_part2_all_with_xfyun")
-    @patch("api.scoring.cleanup_service")
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    async def test_evaluate_with_xfyun_success(
-        self, mock_open, mock_cleanup, mock_part2, mock_part1, mock_xfyun,
-        mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data
-    ):
-        """测试使用讯飞成功评估"""
-        # Mock 文件读取
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        # Mock 讯飞结果
-        mock_part1.return_value = {
-            "score": 3,
-            "total": 3,
-            "correct_words": ["hello", "world", "test"],
-            "incorrect_words": [],
-            "accuracy_score": 95.0,
-            "fluency_score": 90.0,
-            "feedback": "优秀"
-        }
-
-        mock_part2.return_value = {
-            "total_score": 20,
-            "question_scores": [
-                {"question_index": 0, "score": 2.0},
-                {"question_index": 1, "score": 2.0}
-            ],
-            "summary": {
-                "fluency_score": 8.0,
-                "pronunciation_score": 7.5,
-                "confidence_score": 8.0
-            },
-            "feedback": "良好"
-        }
-
-        # Mock 数据库
-        mock_test_record = Mock()
-        mock_test_record.id = 1
-        mock_test_record.part_scores = []
-        mock_db.add = Mock()
-        mock_db.flush = Mock()
-        mock_db.commit = Mock()
-        mock_db.refresh = Mock()
 
-        # 执行测试
+@pytest.fixture
+def scoring_mocks():
+    """一次替换 api.scoring 依赖的评测服务和清理服务（异步函数自动替换为 AsyncMock）"""
+    with patch.multiple(
+        "api.scoring",
+        is_xfyun_configured=DEFAULT,
+        evaluate_words_with_xfyun_async=DEFAULT,
+        evaluate_part2_all_with_xfyun_async=DEFAULT,
+        evaluate_part1_async=DEFAULT,
+        evaluate_part2_all_async=DEFAULT,
+        get_cleanup_service=DEFAULT,
+    ) as mocks:
+        yield mocks
+
+
+XFYUN_PART1_RESULT = {
+    "score": 3,
+    "total": 3,
+    "correct_words": ["hello", "world", "test"],
+    "incorrect_words": [],
+    "accuracy_score": 95.0,
+    "fluency_score": 90.0,
+    "feedback": "优秀"
+}
+
+XFYUN_PART2_RESULT = {
+    "total_score": 20,
+    "question_scores": [
+        {"question_index": 0, "score": 2.0},
+        {"question_index": 1, "score": 2.0}
+    ],
+    "summary": {
+        "fluency_score": 8.0,
+        "pronunciation_score": 7.5,
+        "confidence_score": 8.0
+    },
+    "feedback": "良好"
+}
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def xfyun_run(tmp_path_factory, sample_questions_file):
+    """讯飞路径下完整执行一次 evaluate_test，模块内的测试共享这次调用的结果和 mock"""
+    db = _make_db()
+    cleanup_service = Mock()
+    calculate_cost = Mock(return_value=0.05)
+    upload_dir = tmp_path_factory.mktemp("uploads")
+
+    _load_questions.cache_clear()
+    with patch.dict(os.environ, {"UPLOAD_DIR": str(upload_dir)}), \
+            patch.object(questions_api, "QUESTIONS_FILE", sample_questions_file), \
+            patch.multiple(
+                "api.scoring",
+                is_xfyun_configured=Mock(return_value=True),
+                evaluate_words_with_xfyun_async=AsyncMock(return_value=XFYUN_PART1_RESULT),
+                evaluate_part2_all_with_xfyun_async=AsyncMock(return_value=XFYUN_PART2_RESULT),
+                get_cleanup_service=Mock(return_value=cleanup_service),
+                calculate_cost=calculate_cost,
+            ):
         result = await evaluate_test(
             student_name="TestStudent",
             level="level1",
             unit="unit1-3",
-            part1_audio=mock_part1_audio,
-            part2_audio=mock_part2_audio,
-            db=mock_db
+            part1_audio=FakeUpload("part1.webm", b"fake part1 audio data"),
+            part2_audio=FakeUpload("part2.webm", b"fake part2 audio data"),
+            db=db
         )
+    _load_questions.cache_clear()
 
-        # 验证结果
-        assert mock_db.add.called
-        assert mock_db.commit.called
+    return SimpleNamespace(
+        result=result,
+        db=db,
+        cleanup_service=cleanup_service,
+        calculate_cost=calculate_cost,
+    )
+
+
+class TestEvaluateTestWithXfyun:
+    """测试使用讯飞评测的评估功能"""
+
+    def test_evaluate_with_xfyun_success(self, xfyun_run):
+        """测试使用讯飞成功评估"""
+        assert xfyun_run.db.add.called
+        assert xfyun_run.db.commit.called
 
 
 class TestEvaluateTestWithGemini:
     """测试使用 Gemini AI 评测的评估功能"""
 
-    @pytest.mark.asyncio
-    @patch("api.scoring.is_xfyun_configured", return_value=False)
-    @patch("api.scoring.evaluate_part1")
-    @patch("api.scoring.evaluate_part2_all")
-    @patch("api.scoring.cleanup_service")
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
     async def test_evaluate_with_gemini_success(
-        self, mock_open, mock_cleanup, mock_part2, mock_part1, mock_xfyun,
-        mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data
+        self, scoring_mocks, mock_db, mock_part1_audio, mock_part2_audio, questions_file
     ):
         """测试使用 Gemini 成功评估"""
-        # Mock 文件读取
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
+        scoring_mocks["is_xfyun_configured"].return_value = False
 
         # Mock Gemini 结果
-        mock_part1.return_value = (18, {
+        scoring_mocks["evaluate_part1_async"].return_value = (18, {
             "feedback": "良好",
             "correct_words": ["hello", "world", "test"],
             "incorrect_words": []
         })
 
-        mock_part2.return_value = (20, [
+        scoring_mocks["evaluate_part2_all_async"].return_value = (20, [
             {"question_num": 1, "score": 2, "feedback": "好"},
             {"question_num": 2, "score": 2, "feedback": "好"}
         ], {
@@ -174,15 +228,6 @@ class TestEvaluateTestWithGemini:
             "confidence_score": 8.0
         })
 
-        # Mock 数据库
-        mock_test_record = Mock()
-        mock_test_record.id = 1
-        mock_test_record.part_scores = []
-        mock_db.add = Mock()
-        mock_db.flush = Mock()
-        mock_db.commit = Mock()
-        mock_db.refresh = Mock()
-
         # 执行测试
         result = await evaluate_test(
             student_name="TestStudent",
@@ -201,16 +246,9 @@ class TestEvaluateTestWithGemini:
 class TestEvaluateTestErrors:
     """测试错误处理"""
 
-    @pytest.mark.asyncio
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    async def test_level_not_found(self, mock_open, mock_db, mock_part1_audio, mock_part2_audio):
+    async def test_level_not_found(self, mock_db, mock_part1_audio, mock_part2_audio, write_questions):
         """测试级别不存在"""
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps({"levels": []}).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        from fastapi import HTTPException
+        write_questions({"levels": []})
 
         with pytest.raises(HTTPException) as exc_info:
             await evaluate_test(
@@ -224,19 +262,34 @@ class TestEvaluateTestErrors:
 
         assert exc_info.value.status_code == 404
 
-    @pytest.mark.asyncio
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    async def test_unit_not_found(self, mock_open, mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data):
+    async def test_unit_not_found(self, mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data, write_questions):
         """测试单元不存在"""
         # 移除 unit1-3
-        sample_questions_data["levels"][0]["sections"] = []
+        data = copy.deepcopy(sample_questions_data)
+        data["levels"][0]["sections"] = []
 
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
+        write_questions(data)
 
-        from fastapi import HTTPException
+        with pytest.raises(HTTPException) as exc_info:
+            await evaluate_test(
+                student_name="TestStudent",
+                level="level1",
+                unit="unit1-3",
+                part1_audio=mock_part1_audio,
+                part2_audio=mock_part2_audio,
+                db=mock_db
+            )
+
+        assert exc_info.value.status_code == 404
+
+    async def test_part_not_found(self, mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data, write_questions):
+        """测试 Part 缺失"""
+        # 只保留 Part 1
+        data = copy.deepcopy(sample_questions_data)
+        parts = data["levels"][0]["sections"][0]["parts"]
+        data["levels"][0]["sections"][0]["parts"] = parts[:1]
+
+        write_questions(data)
 
         with pytest.raises(HTTPException) as exc_info:
             await evaluate_test(
@@ -251,102 +304,161 @@ class TestEvaluateTestErrors:
         assert exc_info.value.status_code == 404
 
 
+class TestRecordToResponse:
+    """测试记录到响应模型的转换"""
+
+    def test_record_to_response_with_part_scores(self):
+        """测试 part_scores 被转换，空的 JSON 列回退为空列表"""
+        mock_part_score = SimpleNamespace(
+            part_number=1,
+            score=18,
+            max_score=20,
+            feedback="良好",
+            correct_items=["hello"],
+            incorrect_items=None,
+        )
+
+        mock_record = SimpleNamespace(
+            id=1,
+            student_name="Student1",
+            level="level1",
+            unit="unit1-3",
+            total_score=18,
+            star_rating=3,
+            fluency_score=8.0,
+            pronunciation_score=7.5,
+            confidence_score=None,
+            total_tokens=1200,
+            api_cost=0.002,
+            created_at="2024-01-01",
+            part_scores=[mock_part_score],
+        )
+
+        result = _record_to_response(mock_record)
+
+        assert result.id == 1
+        assert result.student_name == "Student1"
+        assert len(result.part_scores) == 1
+        assert result.part_scores[0].correct_items == ["hello"]
+        assert result.part_scores[0].incorrect_items == []
+        assert result.fluency_score == 8.0
+        assert result.confidence_score == 0  # 空列回退为默认值
+        assert result.total_tokens == 1200
+
+
 class TestGetAllHistory:
     """测试获取所有历史记录"""
 
-    @pytest.mark.asyncio
     async def test_get_all_history_success(self, mock_db):
         """测试成功获取所有历史"""
         # Mock 数据库查询结果
-        mock_record = Mock()
-        mock_record.id = 1
-        mock_record.student_name = "Student1"
-        mock_record.level = "level1"
-        mock_record.unit = "unit1-3"
-        mock_record.total_score = 35
-        mock_record.star_rating = 3
-        mock_record.created_at = "2024-01-01"
-        mock_record.part_scores = []
+        mock_record = SimpleNamespace(
+            id=1,
+            student_name="Student1",
+            level="level1",
+            unit="unit1-3",
+            total_score=35,
+            star_rating=3,
+            fluency_score=8.0,
+            pronunciation_score=7.5,
+            confidence_score=None,
+            total_tokens=1200,
+            api_cost=0.002,
+            created_at="2024-01-01",
+            part_scores=[],
+        )
 
-        mock_db.query.return_value.order_by.return_value.all.return_value = [mock_record]
+        _set_query_result(mock_db, [mock_record])
 
-        result = await get_all_history(mock_db)
+        response = await get_all_history(mock_db)
+        result = json.loads(response.body)
 
+        assert response.media_type == "application/json"
         assert len(result) == 1
-        assert result[0].student_name == "Student1"
+        assert result[0]["student_name"] == "Student1"
+        assert result[0]["part_scores"] == []
+        # 与 TestResultResponse 的字段一致
+        assert set(result[0]) == set(schemas.TestResultResponse.model_fields)
+        assert result[0]["pronunciation_score"] == 7.5
+        assert result[0]["confidence_score"] == 0
+        assert result[0]["api_cost"] == 0.002
 
-    @pytest.mark.asyncio
     async def test_get_all_history_empty(self, mock_db):
         """测试空历史记录"""
-        mock_db.query.return_value.order_by.return_value.all.return_value = []
-
-        result = await get_all_history(mock_db)
+        response = await get_all_history(mock_db)
 
-        assert len(result) == 0
+        assert json.loads(response.body) == []
 
 
 class TestGetHistoryByStudent:
     """测试获取学生历史记录"""
 
-    @pytest.mark.asyncio
     async def test_get_student_history_success(self, mock_db):
         """测试成功获取学生历史"""
-        mock_record = Mock()
-        mock_record.id = 1
-        mock_record.student_name = "TestStudent"
-        mock_record.level = "level1"
-        mock_record.unit = "unit1-3"
-        mock_record.total_score = 35
-        mock_record.star_rating = 3
-        mock_record.created_at = "2024-01-01"
-        mock_record.part_scores = []
+        mock_record = SimpleNamespace(
+            id=1,
+            student_name="TestStudent",
+            level="level1",
+            unit="unit1-3",
+            total_score=35,
+            star_rating=3,
+            fluency_score=8.0,
+            pronunciation_score=7.5,
+            confidence_score=None,
+            total_tokens=1200,
+            api_cost=0.002,
+            created_at="2024-01-01",
+            part_scores=[],
+        )
 
-        mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = [mock_record]
+        _set_query_result(mock_db, [mock_record], filtered=True)
 
-        result = await get_history("TestStudent", mock_db)
+        response = await get_history("TestStudent", mock_db)
+        result = json.loads(response.body)
 
+        assert response.media_type == "application/json"
         assert len(result) == 1
-        assert result[0].student_name == "TestStudent"
+        assert result[0]["student_name"] == "TestStudent"
+        assert result[0]["part_scores"] == []
 
-    @pytest.mark.asyncio
     async def test_get_student_history_empty(self, mock_db):
         """测试学生无历史记录"""
-        mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = []
+        response = await get_history("NonExistent", mock_db)
 
-        result = await get_history("NonExistent", mock_db)
-
-        assert len(result) == 0
+        assert json.loads(response.body) == []
 
 
 class TestGetResultById:
     """测试通过 ID 获取结果"""
 
-    @pytest.mark.asyncio
     async def test_get_result_success(self, mock_db):
         """测试成功获取结果"""
-        mock_record = Mock()
-        mock_record.id = 1
-        mock_record.student_name = "TestStudent"
-        mock_record.level = "level1"
-        mock_record.unit = "unit1-3"
-        mock_record.total_score = 35
-        mock_record.star_rating = 3
-        mock_record.created_at = "2024-01-01"
-        mock_record.part_scores = []
-
-        mock_db.query.return_value.filter.return_value.first.return_value = mock_record
+        mock_record = SimpleNamespace(
+            id=1,
+            student_name="TestStudent",
+            level="level1",
+            unit="unit1-3",
+            total_score=35,
+            star_rating=3,
+            fluency_score=8.0,
+            pronunciation_score=7.5,
+            confidence_score=None,
+            total_tokens=1200,
+            api_cost=0.002,
+            created_at="2024-01-01",
+            part_scores=[],
+        )
+
+        _set_query_result(mock_db, mock_record, filtered=True, first=True)
 
         result = await get_result_by_id(1, mock_db)
 
         assert result.id == 1
         assert result.student_name == "TestStudent"
 
-    @pytest.mark.asyncio
     async def test_get_result_not_found(self, mock_db):
         """测试结果不存在"""
-        from fastapi import HTTPException
-
-        mock_db.query.return_value.filter.return_value.first.return_value = None
+        _set_query_result(mock_db, None, filtered=True, first=True)
 
         with pytest.raises(HTTPException) as exc_info:
             await get_result_by_id(999, mock_db)
@@ -358,126 +470,35 @@ class TestGetResultById:
 class TestAudioFileHandling:
     """测试音频文件处理"""
 
-    @pytest.mark.asyncio
-    @patch("api.scoring.is_xfyun_configured", return_value=True)
-    @patch("api.scoring.evaluate_words_with_xfyun")
-    @patch("api.scoring.evaluate_part2_all_with_xfyun")
-    @patch("api.scoring.cleanup_service")
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    @patch("api.scoring.Path")
-    async def test_audio_files_saved(
-        self, mock_path, mock_open, mock_cleanup, mock_part2, mock_part1, mock_xfyun,
-        mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data
-    ):
+    def test_audio_files_saved(self, xfyun_run):
         """测试音频文件保存"""
-        # Mock 文件
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        mock_upload_dir = Mock()
-        mock_upload_dir.mkdir = Mock()
-        mock_upload_dir.absolute.return_value = "/uploads"
-        mock_path.return_value = mock_upload_dir
-
-        # Mock 讯飞结果
-        mock_part1.return_value = {
-            "score": 3,
-            "total": 3,
-            "correct_words": ["hello"],
-            "incorrect_words": [],
-            "accuracy_score": 90.0,
-            "fluency_score": 85.0,
-            "feedback": "优秀"
-        }
-
-        mock_part2.return_value = {
-            "total_score": 20,
-            "question_scores": [],
-            "summary": {"fluency_score": 8.0, "pronunciation_score": 7.0, "confidence_score": 8.0},
-            "feedback": "良好"
-        }
-
-        # Mock 数据库
-        mock_test_record = Mock()
-        mock_test_record.id = 1
-        mock_test_record.part_scores = []
-        mock_db.add = Mock()
-        mock_db.flush = Mock()
-        mock_db.commit = Mock()
-        mock_db.refresh = Mock()
-
-        # 执行
-        await evaluate_test(
-            student_name="TestStudent",
-            level="level1",
-            unit="unit1-3",
-            part1_audio=mock_part1_audio,
-            part2_audio=mock_part2_audio,
-            db=mock_db
-        )
-
-        # 验证音频文件记录被添加
-        assert mock_db.add.called
+        # 验证音频文件记录被批量添加，且每个 Part 只有一条
+        assert xfyun_run.db.add_all.called
+        audio_records = [
+            obj
+            for c in xfyun_run.db.add_all.call_args_list
+            for obj in c[0][0]
+            if type(obj).__name__ == "AudioFile"
+        ]
+        assert sorted(r.part_number for r in audio_records) == [1, 2]
 
 
 class TestCleanupScheduling:
     """测试清理任务调度"""
 
-    @pytest.mark.asyncio
-    @patch("api.scoring.is_xfyun_configured", return_value=True)
-    @patch("api.scoring.evaluate_words_with_xfyun")
-    @patch("api.scoring.evaluate_part2_all_with_xfyun")
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    @patch("api.scoring.Path")
-    async def test_cleanup_scheduled(
-        self, mock_path, mock_open, mock_part2, mock_part1, mock_xfyun,
-        mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data
-    ):
+    def test_cleanup_scheduled(self, xfyun_run):
         """测试清理任务被调度"""
-        # Mock 文件
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        mock_upload_dir = Mock()
-        mock_upload_dir.mkdir = Mock()
-        mock_path.return_value = mock_upload_dir
-
-        # Mock 讯飞结果
-        mock_part1.return_value = {
-            "score": 3,
-            "total": 3,
-            "correct_words": [],
-            "incorrect_words": [],
-            "accuracy_score": 90.0,
-            "fluency_score": 85.0,
-            "feedback": "优秀"
-        }
-
-        mock_part2.return_value = {
-            "total_score": 20,
-            "question_scores": [],
-            "summary": {"fluency_score": 8.0, "pronunciation_score": 7.0, "confidence_score": 8.0},
-            "feedback": "良好"
-        }
-
-        # Mock 清理服务
-        mock_cleanup_service = Mock()
-        mock_cleanup_service.schedule_cleanup = Mock()
-
-        # Mock 数据库
-        mock_test_record = Mock()
-        mock_test_record.id = 1
-        mock_test_record.part_scores = []
-        mock_db.add = Mock()
-        mock_db.flush = Mock()
-        mock_db.commit = Mock()
-        mock_db.refresh = Mock()
-
-        with patch("api.scoring.cleanup_service", mock_cleanup_service):
+        xfyun_run.cleanup_service.schedule_cleanup.assert_called_once()
+
+    async def test_uploads_discarded_when_scoring_fails(
+        self, scoring_mocks, mock_db, mock_part1_audio, mock_part2_audio, questions_file, upload_dir
+    ):
+        """测试评分失败时删除已上传的音频，且不调度清理任务"""
+        scoring_mocks["is_xfyun_configured"].return_value = True
+        scoring_mocks["evaluate_words_with_xfyun_async"].side_effect = Exception("评测服务不可用")
+        scoring_mocks["evaluate_part2_all_with_xfyun_async"].return_value = {"total_score": 0, "question_scores": [], "feedback": ""}
+
+        with pytest.raises(HTTPException) as exc_info:
             await evaluate_test(
                 student_name="TestStudent",
                 level="level1",
@@ -487,65 +508,16 @@ class TestCleanupScheduling:
                 db=mock_db
             )
 
-        # 验证清理任务被调度
-        mock_cleanup_service.schedule_cleanup.assert_called_once()
+        assert exc_info.value.status_code == 500
+        assert list(upload_dir.iterdir()) == []
+        mock_db.rollback.assert_called_once()
+        mock_db.commit.assert_not_called()
+        scoring_mocks["get_cleanup_service"].return_value.schedule_cleanup.assert_not_called()
 
 
 class TestCostCalculation:
     """测试成本计算"""
 
-    @pytest.mark.asyncio
-    @patch("api.scoring.is_xfyun_configured", return_value=False)
-    @patch("api.scoring.evaluate_part1")
-    @patch("api.scoring.evaluate_part2_all")
-    @patch("api.scoring.cleanup_service")
-    @patch("api.scoring.calculate_cost")
-    @patch("builtins.open", new_callable=MagicMock)
-    @patch("api.scoring.QUESTIONS_FILE", "/fake/questions.json")
-    async def test_api_cost_calculated(
-        self, mock_open, mock_calculate_cost, mock_cleanup, mock_part2, mock_part1, mock_xfyun,
-        mock_db, mock_part1_audio, mock_part2_audio, sample_questions_data
-    ):
+    def test_api_cost_calculated(self, xfyun_run):
         """测试 API 成本计算"""
-        # Mock 文件
-        mock_file = MagicMock()
-        mock_file.read.return_value = json.dumps(sample_questions_data).encode()
-        mock_open.return_value.__enter__.return_value = mock_file
-
-        # Mock Gemini 结果
-        mock_part1.return_value = (18, {
-            "feedback": "良好",
-            "correct_words": [],
-            "incorrect_words": []
-        })
-
-        mock_part2.return_value = (20, [
-            {"question_num": 1, "score": 2, "feedback": "好"}
-        ], {
-            "fluency_score": 8.0,
-            "pronunciation_score": 7.5,
-            "confidence_score": 8.0
-        })
-
-        mock_calculate_cost.return_value = 0.05
-
-        # Mock 数据库
-        mock_test_record = Mock()
-        mock_test_record.id = 1
-        mock_test_record.part_scores = []
-        mock_db.add = Mock()
-        mock_db.flush = Mock()
-        mock_db.commit = Mock()
-        mock_db.refresh = Mock()
-
-        await evaluate_test(
-            student_name="TestStudent",
-            level="level1",
-            unit="unit1-3",
-            part1_audio=mock_part1_audio,
-            part2_audio=mock_part2_audio,
-            db=mock_db
-        )
-
-        # 验证成本计算被调用
-        assert mock_calculate_cost.called
+        assert xfyun_run.calculate_cost.called
@@ -0,0 +1,56 @@
+"""
+测试音频文件记录的数据库操作
+"""
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import AudioFile
+import models
+from services.audio_dao import mark_records_deleted
+
+
+@pytest.fixture
+def db_session():
+    """内存 SQLite 会话，包含两条测试记录各两个音频文件"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for test_record_id in (1, 2):
+        session.add(models.TestRecord(id=test_record_id, student_name="Tom"))
+        for part_number in (1, 2):
+            session.add(AudioFile(
+                test_record_id=test_record_id,
+                part_number=part_number,
+                file_path=f"/uploads/{test_record_id}_{part_number}.webm"
+            ))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestMarkRecordsDeleted:
+    """测试批量标记已清理"""
+
+    def test_marks_only_given_records(self, db_session):
+        """测试只更新指定测试记录的音频文件"""
+        now = datetime(2025, 1, 1, 12, 0)
+
+        updated = mark_records_deleted(db_session, [1], now)
+        db_session.commit()
+
+        assert updated == 2
+        rows = db_session.query(AudioFile).order_by(AudioFile.id).all()
+        assert [(row.test_record_id, row.file_path, row.deleted_at) for row in rows] == [
+            (1, None, now),
+            (1, None, now),
+            (2, "/uploads/2_1.webm", None),
+            (2, "/uploads/2_2.webm", None),
+        ]
+
+    def test_unknown_records_update_nothing(self, db_session):
+        """测试不存在的记录不更新任何行"""
+        assert mark_records_deleted(db_session, [999], datetime.now()) == 0
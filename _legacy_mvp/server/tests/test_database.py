@@ -0,0 +1,56 @@
+"""
+测试数据库初始化时的列类型迁移
+"""
+from unittest.mock import MagicMock, Mock, patch
+
+from database import JSON_COLUMNS, _migrate_json_columns
+
+
+def _mock_engine(dialect_name, data_type=None):
+    """构造 Mock 引擎，information_schema 查询返回指定列类型"""
+    engine = MagicMock()
+    engine.dialect.name = dialect_name
+    conn = engine.begin.return_value.__enter__.return_value
+    conn.execute.return_value = Mock(scalar=Mock(return_value=data_type))
+    return engine, conn
+
+
+def _alter_statements(conn):
+    """取出执行过的 ALTER TABLE 语句"""
+    statements = [str(c.args[0]) for c in conn.execute.call_args_list]
+    return [s for s in statements if s.startswith("ALTER TABLE")]
+
+
+class TestMigrateJsonColumns:
+    """测试 JSON 列从 text 迁移到 json"""
+
+    def test_sqlite_skipped(self):
+        """测试 SQLite 不做任何迁移"""
+        engine, _ = _mock_engine("sqlite")
+
+        with patch("database.engine", engine):
+            _migrate_json_columns()
+
+        engine.begin.assert_not_called()
+
+    def test_postgresql_text_columns_altered(self):
+        """测试 PostgreSQL 中仍为 text 的列被转换为 json"""
+        engine, conn = _mock_engine("postgresql", "text")
+
+        with patch("database.engine", engine):
+            _migrate_json_columns()
+
+        assert _alter_statements(conn) == [
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSON USING NULLIF({column}, '')::json"
+            for table, column in JSON_COLUMNS
+        ]
+
+    def test_postgresql_json_columns_untouched(self):
+        """测试已是 json 类型的列不重复迁移"""
+        engine, conn = _mock_engine("postgresql", "json")
+
+        with patch("database.engine", engine):
+            _migrate_json_columns()
+
+        assert conn.execute.call_count == len(JSON_COLUMNS)
+        assert _alter_statements(conn) == []
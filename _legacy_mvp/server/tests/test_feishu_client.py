@@ -2,145 +2,155 @@
 测试飞书客户端服务
 """
 import pytest
+import asyncio
+import json
+import time
+import threading
+import httpx
+import requests
 from unittest.mock import Mock, patch, MagicMock
-from services.feishu_client import FeishuClient
+import services.feishu_client as feishu_module
+from services.feishu_client import (
+    FeishuClient, AsyncFeishuClient, _token_cache, get_feishu_client, _classify_pass_rate,
+    send_test_notification
+)
 
 
-@pytest.fixture
-def feishu_client():
-    """创建飞书客户端测试 fixture"""
+@pytest.fixture(scope="module")
+def _feishu_client_base():
+    """整个模块共享的飞书客户端（环境变量只 patch 一次、客户端只构造一次）"""
     with patch.dict("os.environ", {
         "FEISHU_APP_ID": "test_app_id",
         "FEISHU_APP_SECRET": "test_app_secret"
     }):
-        client = FeishuClient()
-        # 重置 token
-        client._access_token = None
-        return client
+        yield FeishuClient()
+
+
+@pytest.fixture
+def feishu_client(_feishu_client_base):
+    """创建飞书客户端测试 fixture（每个测试前重置令牌和连接失败状态）"""
+    client = _feishu_client_base
+    # 重置 token（包括进程内共享的令牌缓存）
+    _token_cache.clear()
+    client._access_token = None
+    client._token_expiry = 0.0
+    client._session.headers.pop("Authorization", None)
+    client._connect_timeouts = 0
+    client._fail_fast_until = 0.0
+    yield client
+    _token_cache.clear()
+
+
+def _json_body(data):
+    """构造响应体字节"""
+    return json.dumps(data).encode("utf-8")
+
+
+def _json_response(data):
+    """构造响应体为给定 JSON 的 Mock 响应"""
+    response = Mock()
+    response.content = _json_body(data)
+    return response
+
+
+# 只读的飞书接口响应，模块内的测试共用
+TOKEN_OK_RESPONSE = _json_response({"code": 0, "tenant_access_token": "test_token_123"})
+TOKEN_ERROR_RESPONSE = _json_response({"code": 99901, "msg": "Invalid app_id or app_secret"})
+DOCUMENT_CREATED_RESPONSE = _json_response({
+    "code": 0,
+    "data": {"document": {"document_id": "docx_abc123"}}
+})
+PAGE_BLOCK_RESPONSE = _json_response({
+    "code": 0,
+    "data": {"items": [{"block": {"block_id": "page_block_123", "type": "page"}}]}
+})
+BLOCK_CREATED_RESPONSE = _json_response({
+    "code": 0,
+    "data": {"block": {"block_id": "new_block_id"}}
+})
+
+
+def _authorize(client):
+    """直接给客户端设置一个未过期的令牌，跳过获取令牌的请求"""
+    client._access_token = "test_token"
+    client._token_expiry = time.monotonic() + 3600
 
 
 class TestFeishuClient:
     """测试飞书客户端"""
 
-    @patch("services.feishu_client.requests.post")
+    @patch("services.feishu_client.requests.Session.post")
     def test_get_access_token(self, mock_post, feishu_client):
         """测试获取访问令牌"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "code": 0,
-            "tenant_access_token": "test_token_123"
-        }
-        mock_post.return_value = mock_response
+        mock_post.return_value = TOKEN_OK_RESPONSE
 
         token = feishu_client.get_access_token()
 
         assert token == "test_token_123"
         mock_post.assert_called_once()
+        # 令牌写入会话默认请求头，后续调用自动携带
+        assert feishu_client._session.headers["Authorization"] == "Bearer test_token_123"
+
+    def test_session_reuses_pooled_adapter(self, feishu_client):
+        """测试客户端复用带连接池和重试的会话"""
+        adapter = feishu_client._session.get_adapter("https://open.feishu.cn/open-apis")
 
-    @patch("services.feishu_client.requests.post")
+        assert adapter.max_retries.total == 3
+        assert 503 in adapter.max_retries.status_forcelist
+        # 429 交给 _request_with_auth_retry 按飞书限流头处理
+        assert 429 not in adapter.max_retries.status_forcelist
+
+    @patch("services.feishu_client.requests.Session.post")
     def test_get_access_token_error(self, mock_post, feishu_client):
         """测试获取访问令牌失败"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "code": 99901,
-            "msg": "Invalid app_id or app_secret"
-        }
-        mock_post.return_value = mock_response
+        mock_post.return_value = TOKEN_ERROR_RESPONSE
 
         with pytest.raises(Exception) as exc_info:
             feishu_client.get_access_token()
 
         assert "获取飞书 token 失败" in str(exc_info.value)
 
-    @patch("services.feishu_client.requests.post")
+    @patch("services.feishu_client.requests.Session.request")
     def test_create_document(self, mock_post, feishu_client):
         """测试创建文档"""
         # Mock get_access_token
-        feishu_client._access_token = "test_token"
+        _authorize(feishu_client)
 
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "code": 0,
-            "data": {
-                "document": {
-                    "document_id": "docx_abc123"
-                }
-            }
-        }
-        mock_post.return_value = mock_response
+        mock_post.return_value = DOCUMENT_CREATED_RESPONSE
 
         doc_id = feishu_client.create_document("测试文档")
 
         assert doc_id == "docx_abc123"
 
-    @patch("services.feishu_client.requests.get")
+    @patch("services.feishu_client.requests.Session.request")
     def test_get_page_block_id(self, mock_get, feishu_client):
         """测试获取 page 块 ID"""
-        feishu_client._access_token = "test_token"
+        _authorize(feishu_client)
 
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "code": 0,
-            "data": {
-                "items": [
-                    {
-                        "block": {
-                            "block_id": "page_block_123",
-                            "type": "page"
-                        }
-                    }
-                ]
-            }
-        }
-        mock_get.return_value = mock_response
+        mock_get.return_value = PAGE_BLOCK_RESPONSE
 
         block_id = feishu_client.get_page_block_id("docx_test")
 
         assert block_id == "page_block_123"
 
-    @patch("services.feishu_client.requests.post")
-    @patch("services.feishu_client.requests.get")
+    @patch("services.feishu_client.requests.Session.request")
+    @patch("services.feishu_client.requests.Session.get")
     def test_export_test_report(self, mock_get, mock_post, feishu_client):
         """测试导出测试报告"""
-        feishu_client._access_token = "test_token"
+        _authorize(feishu_client)
 
         # Mock get_page_block_id
-        mock_get_response = Mock()
-        mock_get_response.json.return_value = {
-            "code": 0,
-            "data": {
-                "items": [
-                    {"block": {"block_id": "page_block", "type": "page"}}
-                ]
-            }
-        }
-        mock_get.return_value = mock_get_response
+        mock_get.return_value = PAGE_BLOCK_RESPONSE
 
         # Mock 各个 API 调用 - create_document 需要返回 data
         def mock_post_side_effect(*args, **kwargs):
-            response = Mock()
             # 检查 URL 来区分不同的 API 调用
-            if "/documents" in args[0] and kwargs.get("json", {}).get("title"):
+            # Session.request(method, url, ...)
+            if "/documents" in args[1] and kwargs.get("json", {}).get("title"):
                 # create_document
-                response.json.return_value = {
-                    "code": 0,
-                    "data": {
-                        "document": {
-                            "document_id": "docx_test123"
-                        }
-                    }
-                }
-            else:
-                # 其他 API 调用 (add_text_block, add_heading_block)
-                response.json.return_value = {
-                    "code": 0,
-                    "data": {
-                        "block": {
-                            "block_id": "new_block_id"
-                        }
-                    }
-                }
-            return response
+                return DOCUMENT_CREATED_RESPONSE
+            # 其他 API 调用 (add_text_block, add_heading_block)
+            return BLOCK_CREATED_RESPONSE
 
         mock_post.side_effect = mock_post_side_effect
 
@@ -168,3 +178,417 @@ class TestFeishuClient:
         doc_url = feishu_client.export_test_report(test_results)
 
         assert "feishu.cn" in doc_url
+
+
+class TestFeishuAccessTokenCache:
+    """测试令牌缓存与失效重试"""
+
+    @patch("services.feishu_client.requests.Session.post")
+    def test_token_refreshed_after_expiry(self, mock_post, feishu_client):
+        """测试令牌临近过期时重新获取"""
+        mock_response = Mock()
+        mock_response.content = _json_body({"code": 0, "tenant_access_token": "token_1", "expire": 7200})
+        mock_post.return_value = mock_response
+
+        assert feishu_client.get_access_token() == "token_1"
+        assert feishu_client.get_access_token() == "token_1"
+        assert mock_post.call_count == 1
+
+        # 模拟已过期
+        feishu_client._token_expiry = 0.0
+        _token_cache["test_app_id"] = ("token_1", 0.0)
+        mock_response.content = _json_body({"code": 0, "tenant_access_token": "token_2", "expire": 7200})
+
+        assert feishu_client.get_access_token() == "token_2"
+        assert mock_post.call_count == 2
+
+    @patch("services.feishu_client.requests.Session.post")
+    def test_token_shared_between_clients(self, mock_post, feishu_client):
+        """测试多个客户端共用进程内缓存的令牌"""
+        mock_response = Mock()
+        mock_response.content = _json_body({"code": 0, "tenant_access_token": "shared", "expire": 7200})
+        mock_post.return_value = mock_response
+
+        feishu_client.get_access_token()
+        other = FeishuClient(app_id="test_app_id", app_secret="test_app_secret")
+
+        assert other.get_access_token() == "shared"
+        assert mock_post.call_count == 1
+
+    @patch("services.feishu_client.requests.Session.request")
+    @patch("services.feishu_client.requests.Session.post")
+    def test_request_retries_once_on_401(self, mock_post, mock_request, feishu_client):
+        """测试 401 时刷新令牌并重试一次"""
+        token_response = Mock()
+        token_response.content = _json_body({"code": 0, "tenant_access_token": "fresh", "expire": 7200})
+        mock_post.return_value = token_response
+
+        unauthorized = Mock(status_code=401)
+        ok = Mock(status_code=200)
+        ok.content = _json_body({"code": 0, "data": {"document": {"document_id": "docx_1"}}})
+        mock_request.side_effect = [unauthorized, ok]
+
+        _authorize(feishu_client)
+        doc_id = feishu_client.create_document("测试文档")
+
+        assert doc_id == "docx_1"
+        assert mock_request.call_count == 2
+        assert feishu_client._access_token == "fresh"
+        assert feishu_client._session.headers["Authorization"] == "Bearer fresh"
+
+
+class TestFeishuChildrenBlocks:
+    """测试批量写入子块"""
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_detailed_report_sends_typed_blocks_in_one_request(self, mock_request, feishu_client):
+        """测试详细报告以类型化的块一次性写入"""
+        _authorize(feishu_client)
+
+        def mock_request_side_effect(method, url, **kwargs):
+            response = Mock(status_code=200)
+            if kwargs.get("json", {}).get("title"):
+                response.content = _json_body({"code": 0, "data": {"document": {"document_id": "docx_1"}}})
+            else:
+                response.content = _json_body({"code": 0, "data": {"children": []}})
+            return response
+
+        mock_request.side_effect = mock_request_side_effect
+
+        test_results = {
+            "summary": {"total": 2, "passed": 1, "failed": 1, "skipped": 0, "duration": 1.0},
+            "tests": [
+                {"nodeid": "tests/test_a.py::test_ok", "outcome": "passed", "duration": 0.1},
+                {
+                    "nodeid": "tests/test_a.py::test_bad",
+                    "outcome": "failed",
+                    "call": {"crash": {"message": "AssertionError"}, "longrepr": "Traceback"}
+                }
+            ]
+        }
+
+        feishu_client.export_detailed_test_report(test_results)
+
+        # 1 次创建文档 + 1 次写入全部子块
+        assert mock_request.call_count == 2
+        children = mock_request.call_args_list[1].kwargs["json"]["children"]
+        block_types = [child["block_type"] for child in children]
+        assert block_types[0] == 3  # heading1
+        assert block_types[-3:] == [5, 14, 14]  # 失败用例：heading3 + 两个代码块
+        assert children[-2]["code"]["elements"][0]["text_run"]["content"] == "AssertionError"
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_add_children_blocks_batches_over_limit(self, mock_request, feishu_client):
+        """测试超过单次上限时分批写入"""
+        _authorize(feishu_client)
+        response = Mock(status_code=200)
+        response.content = _json_body({"code": 0, "data": {"children": [{"block_id": "b"}]}})
+        mock_request.return_value = response
+
+        from services.feishu_client import _text_block, MAX_CHILDREN_PER_REQUEST
+        children = [_text_block(str(i)) for i in range(MAX_CHILDREN_PER_REQUEST + 1)]
+
+        block_ids = feishu_client.add_children_blocks("docx_1", "docx_1", children)
+
+        assert mock_request.call_count == 2
+        assert len(mock_request.call_args_list[0].kwargs["json"]["children"]) == MAX_CHILDREN_PER_REQUEST
+        assert len(mock_request.call_args_list[1].kwargs["json"]["children"]) == 1
+        assert block_ids == ["b", "b"]
+
+
+class TestPartitionTests:
+    """测试测试结果分组"""
+
+    def test_partition_single_pass(self):
+        """测试按 outcome 分组，未知状态被忽略"""
+        from services.feishu_client import _partition_tests, _call_info
+
+        tests = [
+            {"outcome": "passed", "nodeid": "a"},
+            {"outcome": "failed", "nodeid": "b", "call": None},
+            {"outcome": "skipped", "nodeid": "c"},
+            {"outcome": "error", "nodeid": "d"},
+            {"outcome": "passed", "nodeid": "e"},
+        ]
+
+        passed, failed, skipped = _partition_tests(tests)
+
+        assert [t["nodeid"] for t in passed] == ["a", "e"]
+        assert [t["nodeid"] for t in failed] == ["b"]
+        assert [t["nodeid"] for t in skipped] == ["c"]
+        # call 为 None 时不报错
+        assert _call_info(failed[0]) == ({}, {})
+
+
+class TestAsyncFeishuClient:
+    """测试异步批量客户端"""
+
+    async def test_set_table_cells_bulk_runs_concurrently(self, feishu_client):
+        """测试批量设置单元格并发执行且不超过并发上限"""
+        _authorize(feishu_client)
+        state = {"in_flight": 0, "max_in_flight": 0}
+        seen = []
+
+        async def handler(request):
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            await asyncio.sleep(0.01)
+            state["in_flight"] -= 1
+            seen.append((request.method, request.url.path, json.loads(request.content)))
+            assert request.headers["Authorization"] == "Bearer test_token"
+            return httpx.Response(200, json={"code": 0})
+
+        cells = [(r, c, f"{r}-{c}") for r in range(3) for c in range(4)]
+        async with AsyncFeishuClient(
+            feishu_client, max_concurrency=4, qps=10000, transport=httpx.MockTransport(handler)
+        ) as client:
+            await client.set_table_cells_bulk("docx_1", "tbl_1", cells)
+
+        assert len(seen) == 12
+        assert 1 < state["max_in_flight"] <= 4
+        method, path, body = next(item for item in seen if item[1].endswith("/cells/2/3"))
+        assert method == "PUT"
+        assert body["table_cell"]["elements"][0]["text_run"]["content"] == "2-3"
+
+    async def test_bulk_raises_on_api_error(self, feishu_client):
+        """测试接口返回错误码时抛出异常"""
+        _authorize(feishu_client)
+
+        def handler(request):
+            return httpx.Response(200, json={"code": 1770001, "msg": "invalid param"})
+
+        async with AsyncFeishuClient(feishu_client, qps=10000, transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(Exception) as exc_info:
+                await client.set_table_cells_bulk("docx_1", "tbl_1", [(0, 0, "x")])
+
+        assert "设置单元格失败" in str(exc_info.value)
+
+
+class TestFeishuRateLimit:
+    """测试限流退避"""
+
+    @patch("services.feishu_client.time.sleep")
+    @patch("services.feishu_client.requests.Session.request")
+    def test_retries_after_429_using_reset_header(self, mock_request, mock_sleep, feishu_client):
+        """测试 429 时按 x-ogw-ratelimit-reset 等待后重试"""
+        _authorize(feishu_client)
+        throttled = Mock(status_code=429, headers={"x-ogw-ratelimit-reset": "3"})
+        ok = Mock(status_code=200, headers={})
+        ok.content = _json_body({"code": 0, "data": {"document": {"document_id": "docx_1"}}})
+        mock_request.side_effect = [throttled, ok]
+
+        assert feishu_client.create_document("测试文档") == "docx_1"
+        mock_sleep.assert_called_once_with(3.0)
+
+    @patch("services.feishu_client.time.sleep")
+    @patch("services.feishu_client.requests.Session.request")
+    def test_rate_limit_code_uses_exponential_backoff(self, mock_request, mock_sleep, feishu_client):
+        """测试限流错误码且无响应头时指数退避"""
+        _authorize(feishu_client)
+        throttled = Mock(status_code=200, headers={})
+        throttled.content = _json_body({"code": 99991400, "msg": "request trigger frequency limit"})
+        ok = Mock(status_code=200, headers={})
+        ok.content = _json_body({"code": 0, "data": {"document": {"document_id": "docx_1"}}})
+        mock_request.side_effect = [throttled, throttled, ok]
+
+        assert feishu_client.create_document("测试文档") == "docx_1"
+        assert [c[0][0] for c in mock_sleep.call_args_list] == [1.0, 2.0]
+
+    @patch("services.feishu_client.time.sleep")
+    @patch("services.feishu_client.requests.Session.request")
+    def test_gives_up_after_max_retries(self, mock_request, mock_sleep, feishu_client):
+        """测试超过最大重试次数后抛出异常"""
+        from services.feishu_client import FEISHU_MAX_RETRIES
+        _authorize(feishu_client)
+        throttled = Mock(status_code=429, headers={})
+        throttled.raise_for_status.side_effect = Exception("429 Too Many Requests")
+        mock_request.return_value = throttled
+
+        with pytest.raises(Exception):
+            feishu_client.create_document("测试文档")
+
+        assert mock_request.call_count == FEISHU_MAX_RETRIES + 1
+
+    @patch("services.feishu_client.asyncio.sleep")
+    async def test_async_limiter_halves_rate_on_429(self, mock_sleep, feishu_client):
+        """测试异步客户端被限流时降速并重试"""
+        _authorize(feishu_client)
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "1"}),
+            httpx.Response(200, json={"code": 0})
+        ]
+
+        def handler(request):
+            return responses.pop(0)
+
+        async with AsyncFeishuClient(feishu_client, qps=40, transport=httpx.MockTransport(handler)) as client:
+            await client.set_table_cell("docx_1", "tbl_1", 0, 0, "x")
+            assert client._limiter.rate == 20
+
+    def test_async_limiter_recovers_gradually(self):
+        """测试连续成功后速率逐步恢复且不超过上限"""
+        from services.feishu_client import _AsyncRateLimiter
+        limiter = _AsyncRateLimiter(100)
+        limiter.on_throttled()
+        assert limiter.rate == 50
+
+        for _ in range(_AsyncRateLimiter.RATE_GROWTH_INTERVAL):
+            limiter.on_success()
+        assert limiter.rate == pytest.approx(55)
+
+        for _ in range(_AsyncRateLimiter.RATE_GROWTH_INTERVAL * 20):
+            limiter.on_success()
+        assert limiter.rate == 100
+
+
+class TestPreSerializedPayloads:
+    """测试预序列化的请求体"""
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_text_and_heading_bodies(self, mock_request, feishu_client):
+        """测试文本块/标题块请求体与原结构一致，特殊字符正确转义"""
+        _authorize(feishu_client)
+        response = Mock(status_code=200, headers={})
+        response.content = _json_body({"code": 0, "data": {"block": {"block_id": "blk"}}})
+        mock_request.return_value = response
+        text = 'say "hi"\n你好'
+
+        feishu_client.add_text_block("docx_1", "page", text)
+        feishu_client.add_heading_block("docx_1", "page", text, level=2)
+        feishu_client.add_heading_block("docx_1", "page", text, level=7)
+
+        bodies = [json.loads(c.kwargs["data"]) for c in mock_request.call_args_list]
+        elements = [{"text_run": {"content": text}}]
+        assert bodies[0] == {"children": [{"text_block": {"elements": elements}}], "index": -1}
+        assert bodies[1] == {"children": [{"heading2": {"elements": elements}}], "index": -1}
+        assert bodies[2] == {"children": [{"heading3": {"elements": elements}}], "index": -1}
+        assert mock_request.call_args_list[0].kwargs["headers"]["Content-Type"].startswith("application/json")
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_table_and_cell_bodies(self, mock_request, feishu_client):
+        """测试表格块/单元格请求体"""
+        _authorize(feishu_client)
+        response = Mock(status_code=200, headers={})
+        response.content = _json_body({"code": 0, "data": {"block": {"block_id": "blk", "table_id": "tbl"}}})
+        mock_request.return_value = response
+
+        feishu_client.add_table_block("docx_1", "page", 3, 4)
+        feishu_client.set_table_cell("docx_1", "tbl", 1, 2, "单元格")
+
+        table_body, cell_body = [json.loads(c.kwargs["data"]) for c in mock_request.call_args_list]
+        assert table_body["children"][0]["table"]["table_property"] == {"row_size": 3, "column_size": 4}
+        assert cell_body == {
+            "block_id": "tbl",
+            "table_cell": {"elements": [{"text_run": {"content": "单元格"}}]}
+        }
+
+
+class TestGetFeishuClient:
+    """测试飞书客户端单例"""
+
+    def test_concurrent_calls_create_one_instance(self, monkeypatch):
+        """测试多线程同时获取时只创建一个实例"""
+        monkeypatch.setattr(feishu_module, "_feishu_client", None)
+        created = []
+        barrier = threading.Barrier(8)
+
+        def slow_client():
+            created.append(1)
+            time.sleep(0.05)
+            return Mock()
+
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(get_feishu_client())
+
+        with patch("services.feishu_client.FeishuClient", side_effect=slow_client):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        assert len(created) == 1
+        assert all(r is results[0] for r in results)
+
+
+class TestConnectTimeoutFailFast:
+    """测试连接超时后的快速失败"""
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_fail_fast_after_consecutive_connect_timeouts(self, mock_request, feishu_client):
+        """测试连续连接超时后，冷却期内的请求不再发出"""
+        _authorize(feishu_client)
+        mock_request.side_effect = requests.exceptions.ConnectTimeout()
+
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectTimeout):
+                feishu_client.create_document("报告")
+
+        with pytest.raises(Exception, match="连续超时"):
+            feishu_client.create_document("报告")
+        assert mock_request.call_count == 2
+        assert mock_request.call_args.kwargs["timeout"] == (3.05, 15)
+
+    @patch("services.feishu_client.requests.Session.request")
+    def test_success_resets_connect_timeout_count(self, mock_request, feishu_client):
+        """测试请求成功后重新计数"""
+        _authorize(feishu_client)
+        ok = Mock(status_code=200, headers={})
+        ok.content = _json_body({"code": 0, "data": {"document": {"document_id": "docx_1"}}})
+        mock_request.side_effect = [requests.exceptions.ConnectTimeout(), ok, requests.exceptions.ConnectTimeout(), ok]
+
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            feishu_client.create_document("报告")
+        assert feishu_client.create_document("报告") == "docx_1"
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            feishu_client.create_document("报告")
+        assert feishu_client.create_document("报告") == "docx_1"
+
+
+class TestClassifyPassRate:
+    """测试通过率分档"""
+
+    @pytest.mark.parametrize("pass_rate, expected", [
+        (100, ("🎉", "优秀", "green")),
+        (95, ("🎉", "优秀", "green")),
+        (94.9, ("👍", "良好", "orange")),
+        (80, ("👍", "良好", "orange")),
+        (50, ("⚠️", "需改进", "red")),
+        (49.9, ("❌", "失败", "red")),
+        (0, ("❌", "失败", "red")),
+    ])
+    def test_thresholds(self, pass_rate, expected):
+        """测试各档位边界"""
+        assert _classify_pass_rate(pass_rate) == expected
+
+
+class TestSendTestNotification:
+    """测试群机器人通知"""
+
+    @patch("services.feishu_client._WEBHOOK_SESSION")
+    def test_card_fields(self, mock_session):
+        """测试卡片头部和字段内容"""
+        response = Mock()
+        response.content = _json_body({"code": 0})
+        mock_session.post.return_value = response
+
+        send_test_notification("https://hook", 10, 9, 1, 90.0, "https://doc", duration=1.5)
+
+        kwargs = mock_session.post.call_args.kwargs
+        card = json.loads(kwargs["data"])["card"]
+        assert card["header"]["title"]["content"] == "👍 测试报告 - 良好"
+        assert card["header"]["template"] == "orange"
+        contents = [f["text"]["content"] for f in card["elements"][0]["fields"]]
+        assert contents == [
+            "**总测试数**: 10",
+            "**通过率**: 90.0%",
+            "**通过**: 9 ✅",
+            "**失败**: 1 ❌",
+            "**执行时间**: 1.50s",
+        ]
+        assert card["elements"][1]["actions"][0]["url"] == "https://doc"
+        assert kwargs["headers"]["Content-Type"].startswith("application/json")
+        assert kwargs["timeout"] == (1, 5)
@@ -4,12 +4,14 @@
 import pytest
 import asyncio
 import os
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, ANY
 from sqlalchemy.orm import Session
 
-from services.file_cleanup import FileCleanupService, cleanup_service
+from services.file_cleanup import FileCleanupService, get_cleanup_service, _remove_file
 
 
 @pytest.fixture
@@ -30,6 +32,20 @@ def mock_db_session():
     return session
 
 
+@pytest.fixture
+def mock_session_local(mock_db_session):
+    """Mock 会话工厂，返回 mock_db_session"""
+    with patch("services.file_cleanup.SessionLocal", return_value=mock_db_session) as session_local:
+        yield session_local
+
+
+@pytest.fixture
+def mock_mark_deleted(mock_session_local):
+    """Mock 批量标记已清理的 DAO 调用（清理服务与数据库的唯一接缝）"""
+    with patch("services.file_cleanup.mark_records_deleted") as mark_deleted:
+        yield mark_deleted
+
+
 class TestFileCleanupServiceInit:
     """测试 FileCleanupService 初始化"""
 
@@ -37,13 +53,13 @@ class TestFileCleanupServiceInit:
         """测试默认初始化"""
         service = FileCleanupService()
         assert service.cleanup_delay_hours == 1
-        assert service.cleanup_tasks == {}
+        assert service.get_pending_cleanups() == 0
 
     def test_custom_delay_hours(self):
         """测试自定义延迟时间"""
         service = FileCleanupService(cleanup_delay_hours=2)
         assert service.cleanup_delay_hours == 2
-        assert service.cleanup_tasks == {}
+        assert service.get_pending_cleanups() == 0
 
 
 class TestScheduleCleanup:
@@ -57,7 +73,6 @@ class TestScheduleCleanup:
 
         service.schedule_cleanup(test_record_id, audio_files)
 
-        assert test_record_id in service.cleanup_tasks
         assert service.get_pending_cleanups() == 1
 
         # 取消任务避免影响其他测试
@@ -82,59 +97,36 @@ class TestScheduleCleanup:
 class TestCleanupAfterDelay:
     """测试延迟清理执行"""
 
-    @pytest.mark.asyncio
-    async def test_cleanup_after_delay_deletes_files(self, temp_audio_files):
+    async def test_cleanup_after_delay_deletes_files(self, temp_audio_files, mock_mark_deleted, mock_db_session):
         """测试延迟后删除文件"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
 
-        # Mock database
-        mock_audio_record_1 = Mock()
-        mock_audio_record_2 = Mock()
-        mock_audio_record_3 = Mock()
-
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_session.query.return_value.filter.return_value.all.return_value = [
-                mock_audio_record_1,
-                mock_audio_record_2,
-                mock_audio_record_3
-            ]
-
-            # 执行清理
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
-
-            # 验证文件被删除
-            for file_path in temp_audio_files:
-                assert not os.path.exists(file_path)
-
-            # 验证数据库更新
-            assert mock_session.query.called
-            for record in [mock_audio_record_1, mock_audio_record_2, mock_audio_record_3]:
-                assert record.file_path is None
-                assert record.deleted_at is not None
-
-    @pytest.mark.asyncio
-    async def test_cleanup_handles_nonexistent_files(self):
+        # 执行清理
+        await service._run_cleanup({test_record_id: temp_audio_files})
+
+        # 验证文件被删除
+        for file_path in temp_audio_files:
+            assert not os.path.exists(file_path)
+
+        # 验证整批记录通过一次 DAO 调用标记已清理
+        mock_mark_deleted.assert_called_once_with(mock_db_session, [test_record_id], ANY)
+        assert isinstance(mock_mark_deleted.call_args.args[2], datetime)
+
+    async def test_cleanup_handles_nonexistent_files(self, mock_mark_deleted, mock_db_session):
         """测试处理不存在的文件"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
         nonexistent_files = ["/nonexistent/file1.m4a", "/nonexistent/file2.m4a"]
 
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_session.query.return_value.filter.return_value.all.return_value = []
-
-            # 不应该抛出异常
-            await service._cleanup_after_delay(test_record_id, nonexistent_files)
+        # 不应该抛出异常
+        await service._run_cleanup({test_record_id: nonexistent_files})
 
-            # 验证数据库操作仍然执行
-            mock_session.commit.assert_called_once()
+        # 验证数据库操作仍然执行
+        mock_mark_deleted.assert_called_once_with(ANY, [test_record_id], ANY)
+        mock_db_session.commit.assert_called_once()
 
-    @pytest.mark.asyncio
-    async def test_cleanup_handles_file_deletion_errors(self, temp_audio_files):
+    async def test_cleanup_handles_file_deletion_errors(self, temp_audio_files, mock_mark_deleted):
         """测试处理文件删除错误"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
@@ -150,16 +142,36 @@ class TestCleanupAfterDelay:
             return original_remove(path)
 
         with patch("os.remove", side_effect=mock_remove_with_error):
-            with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-                mock_session = Mock()
-                mock_session_local.return_value = mock_session
-                mock_session.query.return_value.filter.return_value.all.return_value = []
+            # 应该继续执行，不抛出异常
+            await service._run_cleanup({test_record_id: temp_audio_files})
+
+        # 验证至少尝试删除了文件，且数据库仍被更新
+        assert call_count[0] > 0
+        mock_mark_deleted.assert_called_once_with(ANY, [test_record_id], ANY)
+
+    def test_remove_missing_file_without_exists_check(self, tmp_path):
+        """测试删除不存在的文件直接返回 False，不先做 exists 检查"""
+        with patch("services.file_cleanup.os.path.exists") as mock_exists:
+            assert _remove_file(str(tmp_path / "missing.m4a")) is False
+            assert _remove_file(str(tmp_path)) is False  # 删除失败（目录）同样返回 False
+
+        mock_exists.assert_not_called()
+
+    async def test_files_deleted_off_event_loop_thread(self, temp_audio_files, mock_mark_deleted):
+        """测试文件删除在线程池中执行，不阻塞事件循环所在线程"""
+        service = FileCleanupService(cleanup_delay_hours=0)
+        loop_thread = threading.get_ident()
+        delete_threads = []
+
+        def record_thread(path):
+            delete_threads.append(threading.get_ident())
+            return True
 
-                # 应该继续执行，不抛出异常
-                await service._cleanup_after_delay(test_record_id, temp_audio_files)
+        with patch("services.file_cleanup._remove_file", side_effect=record_thread):
+            await service._run_cleanup({123: temp_audio_files})
 
-                # 验证至少尝试删除了文件
-                assert call_count[0] > 0
+        assert len(delete_threads) == len(temp_audio_files)
+        assert loop_thread not in delete_threads
 
 
 class TestCancelCleanup:
@@ -176,7 +188,31 @@ class TestCancelCleanup:
         service.cancel_cleanup(test_record_id)
 
         assert service.get_pending_cleanups() == 0
-        assert test_record_id not in service.cleanup_tasks
+
+    async def test_cancel_last_record_lets_worker_exit(self):
+        """测试取消最后一条记录后，后台协程不等原到期时间直接退出"""
+        service = FileCleanupService(cleanup_delay_hours=1)
+        service.schedule_cleanup(1, ["/path1.m4a"])
+        worker = service._worker_task
+
+        service.cancel_cleanup(1)
+        await asyncio.wait_for(worker, timeout=1)
+
+        assert worker.done() and not worker.cancelled()
+        assert service._heap == []
+
+    async def test_shutdown_awaits_worker(self):
+        """测试 shutdown 取消并等待后台协程结束"""
+        service = FileCleanupService(cleanup_delay_hours=1)
+        service.schedule_cleanup(1, ["/path1.m4a"])
+        worker = service._worker_task
+
+        await service.shutdown()
+
+        assert worker.cancelled()
+        assert service._worker_task is None
+        # 重复调用无副作用
+        await service.shutdown()
 
     def test_cancel_nonexistent_task(self):
         """测试取消不存在的任务"""
@@ -210,108 +246,164 @@ class TestGetPendingCleanups:
         service.cancel_cleanup(1)
         assert service.get_pending_cleanups() == 1
 
+    def test_get_pending_cleanups_is_constant_time(self):
+        """测试大量待清理记录时计数仍为 O(1)（不遍历任务）"""
+        service = FileCleanupService()
+        for test_record_id in range(10_000):
+            service.schedule_cleanup(test_record_id, [])
+
+        timings = []
+        for _ in range(100):
+            start = time.perf_counter_ns()
+            assert service.get_pending_cleanups() == 10_000
+            timings.append(time.perf_counter_ns() - start)
+
+        # 取最快一次，避免调度抖动导致误报
+        assert min(timings) < 10_000
+
 
 class TestAsyncTaskCleanup:
-    """测试异步任务自动清理"""
+    """测试后台清理协程"""
 
-    @pytest.mark.asyncio
-    async def test_task_removed_after_completion(self, temp_audio_files):
-        """测试任务完成后自动移除"""
+    async def test_task_removed_after_completion(self, temp_audio_files, mock_mark_deleted):
+        """测试到期任务由后台协程执行并从待清理中移除"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
 
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_session.query.return_value.filter.return_value.all.return_value = []
+        service.schedule_cleanup(test_record_id, temp_audio_files)
+        await service._worker_task
+
+        assert service.get_pending_cleanups() == 0
+        for file_path in temp_audio_files:
+            assert not os.path.exists(file_path)
+
+    async def test_single_worker_for_many_records(self):
+        """测试多条待清理记录只占用一个后台协程"""
+        service = FileCleanupService(cleanup_delay_hours=1)
+
+        service.schedule_cleanup(1, ["/path1.m4a"])
+        worker = service._worker_task
+        service.schedule_cleanup(2, ["/path2.m4a"])
+        service.schedule_cleanup(3, ["/path3.m4a"])
+
+        assert service._worker_task is worker
+        assert service.get_pending_cleanups() == 3
+
+        worker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await worker
+
+    async def test_bursty_scheduling_adds_one_task(self):
+        """测试突发调度大量记录时事件循环中只新增一个任务"""
+        service = FileCleanupService(cleanup_delay_hours=1)
+        tasks_before = len(asyncio.all_tasks())
+
+        for test_record_id in range(100):
+            service.schedule_cleanup(test_record_id, [f"/path{test_record_id}.m4a"])
+
+        assert len(asyncio.all_tasks()) == tasks_before + 1
+        assert service.get_pending_cleanups() == 100
+
+        service._worker_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await service._worker_task
+
+    async def test_expiry_order(self):
+        """测试按到期时间先后清理"""
+        service = FileCleanupService(cleanup_delay_hours=0)
+        cleaned = []
+
+        def record_cleanup(expired):
+            cleaned.extend(expired)
+
+        with patch.object(service, "_delete_files_and_update_db", side_effect=record_cleanup):
+            service.schedule_cleanup(2, [])
+            service.schedule_cleanup(1, [])
+            await service._worker_task
+
+        assert cleaned == [2, 1]
 
-            # 等待清理完成
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
 
-            # 任务应该被自动移除
-            assert test_record_id not in service.cleanup_tasks
+    async def test_simultaneous_expiries_share_one_commit(self, tmp_path, mock_mark_deleted, mock_session_local, mock_db_session):
+        """测试同时到期的多条记录合并为一次数据库更新和提交"""
+        service = FileCleanupService(cleanup_delay_hours=0)
+        audio_files = []
+        for i in range(50):
+            file_path = tmp_path / f"audio_{i}.m4a"
+            file_path.write_text("dummy")
+            audio_files.append(str(file_path))
+
+        for test_record_id, file_path in enumerate(audio_files):
+            service.schedule_cleanup(test_record_id, [file_path])
+        await service._worker_task
+
+        mock_session_local.assert_called_once()
+        mock_db_session.commit.assert_called_once()
+        mock_mark_deleted.assert_called_once_with(mock_db_session, list(range(50)), ANY)
+        assert list(tmp_path.iterdir()) == []
+        assert service.get_pending_cleanups() == 0
 
 
 class TestDatabaseIntegration:
     """测试数据库集成"""
 
-    @pytest.mark.asyncio
-    async def test_database_session_closed(self, temp_audio_files):
+    async def test_database_session_closed(self, temp_audio_files, mock_mark_deleted, mock_db_session):
         """测试数据库会话正确关闭"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
 
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_session.query.return_value.filter.return_value.all.return_value = []
-
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
+        await service._run_cleanup({test_record_id: temp_audio_files})
 
-            # 验证会话被关闭
-            mock_session.close.assert_called_once()
+        # 验证会话被关闭
+        mock_db_session.close.assert_called_once()
 
-    @pytest.mark.asyncio
-    async def test_database_commit_on_success(self, temp_audio_files):
+    async def test_database_commit_on_success(self, temp_audio_files, mock_mark_deleted, mock_db_session):
         """测试成功时提交数据库更改"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
 
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_audio_record = Mock()
-            mock_session.query.return_value.filter.return_value.all.return_value = [mock_audio_record]
-
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
-
-            # 验证提交
-            mock_session.commit.assert_called_once()
+        await service._run_cleanup({test_record_id: temp_audio_files})
 
-            # 验证字段更新
-            assert mock_audio_record.file_path is None
-            assert isinstance(mock_audio_record.deleted_at, datetime)
+        # 验证先标记已清理再提交
+        mock_mark_deleted.assert_called_once_with(mock_db_session, [test_record_id], ANY)
+        mock_db_session.commit.assert_called_once()
 
 
 class TestCancelledErrorHandling:
-    """测试任务取消错误处理"""
+    """测试取消后的清理行为"""
 
-    @pytest.mark.asyncio
-    async def test_cleanup_handles_cancelled_error(self):
-        """测试处理 CancelledError"""
-        service = FileCleanupService(cleanup_delay_hours=1)
-        test_record_id = 123
+    async def test_cancelled_record_is_skipped(self, temp_audio_files, mock_mark_deleted):
+        """测试已取消的记录到期后不会被清理"""
+        service = FileCleanupService(cleanup_delay_hours=0)
 
-        # 创建一个会被取消的任务
-        task = asyncio.create_task(
-            service._cleanup_after_delay(test_record_id, ["/path.m4a"])
-        )
+        service.schedule_cleanup(1, temp_audio_files[:1])
+        service.schedule_cleanup(2, temp_audio_files[1:])
+        service.cancel_cleanup(1)
+        await service._worker_task
 
-        # 立即取消
-        task.cancel()
+        mock_mark_deleted.assert_called_once_with(ANY, [2], ANY)
 
-        # 应该抛出 CancelledError
-        with pytest.raises(asyncio.CancelledError):
-            await task
+        assert os.path.exists(temp_audio_files[0])
+        for file_path in temp_audio_files[1:]:
+            assert not os.path.exists(file_path)
+        assert service.get_pending_cleanups() == 0
 
 
 class TestGeneralExceptionHandling:
     """测试一般异常处理"""
 
-    @pytest.mark.asyncio
-    async def test_cleanup_handles_database_errors(self, temp_audio_files):
+    async def test_cleanup_handles_database_errors(self, temp_audio_files, mock_mark_deleted, mock_db_session):
         """测试处理数据库错误"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
+        # 模拟数据库更新失败
+        mock_mark_deleted.side_effect = Exception("Database connection lost")
 
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            # 模拟数据库查询失败
-            mock_session.query.side_effect = Exception("Database connection lost")
+        # 不应该抛出异常
+        await service._run_cleanup({test_record_id: temp_audio_files})
 
-            # 不应该抛出异常
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
+        mock_db_session.commit.assert_not_called()
+        mock_db_session.close.assert_called_once()
 
 
 class TestGlobalCleanupService:
@@ -319,19 +411,18 @@ class TestGlobalCleanupService:
 
     def test_global_service_exists(self):
         """测试全局服务实例存在"""
-        assert cleanup_service is not None
-        assert isinstance(cleanup_service, FileCleanupService)
+        assert isinstance(get_cleanup_service(), FileCleanupService)
+        assert get_cleanup_service() is get_cleanup_service()
 
     def test_global_service_default_config(self):
         """测试全局服务默认配置"""
-        assert cleanup_service.cleanup_delay_hours == 1
+        assert get_cleanup_service().cleanup_delay_hours == 1
 
 
 class TestFileCleanupIntegration:
     """集成测试"""
 
-    @pytest.mark.asyncio
-    async def test_full_cleanup_workflow(self, temp_audio_files):
+    async def test_full_cleanup_workflow(self, temp_audio_files, mock_mark_deleted):
         """测试完整的清理工作流"""
         service = FileCleanupService(cleanup_delay_hours=0)
         test_record_id = 123
@@ -341,12 +432,7 @@ class TestFileCleanupIntegration:
         assert service.get_pending_cleanups() == 1
 
         # 2. 等待清理完成
-        with patch("services.file_cleanup.SessionLocal") as mock_session_local:
-            mock_session = Mock()
-            mock_session_local.return_value = mock_session
-            mock_session.query.return_value.filter.return_value.all.return_value = []
-
-            await service._cleanup_after_delay(test_record_id, temp_audio_files)
+        await service._worker_task
 
         # 3. 验证文件被删除
         for file_path in temp_audio_files:
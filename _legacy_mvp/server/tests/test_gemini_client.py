@@ -2,14 +2,38 @@
 测试 Gemini API 客户端
 """
 import pytest
+import random
+import ssl
+import httpx
 from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock, mock_open
+from unittest.mock import Mock, patch, MagicMock, AsyncMock, mock_open
 import time
+from google.genai import errors as genai_errors
 
-from services.gemini_client import GeminiClient, gemini_client, MODEL_NAME, GEMINI_API_KEY
+from services.gemini_client import (
+    GeminiClient, gemini_client, MODEL_NAME, GEMINI_API_KEY, _read_audio, _read_audio_cached, _is_retryable_error, _get_client,
+    _retry_wait, _audio_mime_type, HTTP_POOL_LIMITS
+)
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def no_jitter():
+    """固定抖动系数为 1，便于断言精确的退避时间"""
+    with patch("services.gemini_client.random.uniform", return_value=1.0) as mock_uniform:
+        yield mock_uniform
+
+
+@pytest.fixture(autouse=True)
+def clear_client_cache():
+    """每个测试使用各自 patch 的 genai.Client 和 open，不复用缓存的 SDK 客户端和音频内容"""
+    _get_client.cache_clear()
+    _read_audio_cached.cache_clear()
+    yield
+    _get_client.cache_clear()
+    _read_audio_cached.cache_clear()
+
+
+@pytest.fixture(scope="session")
 def mock_gemini_response():
     """Mock Gemini API 响应"""
     mock_response = Mock()
@@ -24,10 +48,10 @@ def mock_client():
     return client
 
 
-@pytest.fixture
-def sample_audio_file(tmp_path):
-    """创建示例音频文件"""
-    audio_file = tmp_path / "test_audio.webm"
+@pytest.fixture(scope="session")
+def sample_audio_file(tmp_path_factory):
+    """创建示例音频文件（只读，整个测试会话共用一份）"""
+    audio_file = tmp_path_factory.mktemp("audio") / "test_audio.webm"
     audio_file.write_bytes(b"fake audio data")
     return str(audio_file)
 
@@ -41,7 +65,28 @@ class TestGeminiClientInit:
         mock_api_key = "test-api-key"
         with patch("services.gemini_client.GEMINI_API_KEY", mock_api_key):
             client = GeminiClient()
-            mock_genai_client.assert_called_once_with(api_key=mock_api_key)
+            mock_genai_client.assert_called_once()
+            assert mock_genai_client.call_args.kwargs["api_key"] == mock_api_key
+
+    @patch("services.gemini_client.genai.Client")
+    def test_init_configures_connection_pool(self, mock_genai_client):
+        """测试 SDK 客户端的同步/异步 httpx 连接池均配置了长连接上限"""
+        GeminiClient()
+
+        http_options = mock_genai_client.call_args.kwargs["http_options"]
+        assert http_options.client_args["limits"] is HTTP_POOL_LIMITS
+        assert http_options.async_client_args["limits"] is HTTP_POOL_LIMITS
+        assert HTTP_POOL_LIMITS.max_keepalive_connections == 32
+        assert HTTP_POOL_LIMITS.max_connections == 64
+
+    @patch("services.gemini_client.genai.Client")
+    def test_instances_share_sdk_client(self, mock_genai_client):
+        """测试多个实例共用同一个 SDK 客户端"""
+        first = GeminiClient()
+        second = GeminiClient()
+
+        mock_genai_client.assert_called_once()
+        assert first.client is second.client
 
 
 class TestAnalyzeAudioFromPath:
@@ -72,12 +117,11 @@ class TestAnalyzeAudioFromPath:
         mock_genai_client.return_value = mock_client_instance
 
         # 第一次调用失败，第二次成功
-        mock_response_1 = Mock(side_effect=Exception("503 Service Unavailable"))
         mock_response_2 = Mock()
         mock_response_2.text = "重试后成功"
 
         mock_client_instance.models.generate_content.side_effect = [
-            mock_response_1,
+            Exception("503 Service Unavailable"),
             mock_response_2
         ]
 
@@ -147,6 +191,8 @@ class TestAnalyzeAudioFromPath:
         result = client.analyze_audio_from_path(sample_audio_file, "分析这个音频")
 
         assert result == "第三次成功"
+        # 音频只读取一次，重试复用同一份数据
+        mock_file.assert_called_once()
         # 验证指数退避: 2秒, 4秒
         assert mock_sleep.call_count == 2
         assert mock_sleep.call_args_list[0][0][0] == 2
@@ -159,12 +205,11 @@ class TestAnalyzeAudioFromPath:
         mock_client_instance = Mock()
         mock_genai_client.return_value = mock_client_instance
 
-        mock_response_1 = Mock(side_effect=Exception("SSL error"))
         mock_response_2 = Mock()
         mock_response_2.text = "重试成功"
 
         mock_client_instance.models.generate_content.side_effect = [
-            mock_response_1,
+            Exception("SSL error"),
             mock_response_2
         ]
 
@@ -176,32 +221,30 @@ class TestAnalyzeAudioFromPath:
         assert result == "重试成功"
         assert mock_client_instance.models.generate_content.call_count == 2
 
+    @pytest.mark.parametrize("error_msg", [
+        "EOF error",
+        "Connection reset",
+        "Connection timeout",
+        "Service overloaded",
+    ])
     @patch("services.gemini_client.genai.Client")
     @patch("builtins.open", new_callable=mock_open, read_data=b"fake audio data")
     @patch("services.gemini_client.time.sleep")
-    def test_retryable_connection_errors(self, mock_sleep, mock_file, mock_genai_client, sample_audio_file):
+    def test_retryable_connection_errors(self, mock_sleep, mock_file, mock_genai_client, sample_audio_file, error_msg):
         """测试各种可重试的连接错误"""
         mock_client_instance = Mock()
         mock_genai_client.return_value = mock_client_instance
-
-        retryable_errors = [
-            "EOF error",
-            "Connection reset",
-            "Connection timeout",
-            "Service overloaded"
+        mock_client_instance.models.generate_content.side_effect = [
+            Exception(error_msg),
+            Mock(text="成功")
         ]
 
-        for error_msg in retryable_errors:
-            mock_client_instance.models.generate_content.reset_mock()
-            mock_client_instance.models.generate_content.side_effect = [
-                Exception(error_msg),
-                Mock(text="成功")
-            ]
-
-            client = GeminiClient()
-            result = client.analyze_audio_from_path(sample_audio_file, "分析这个音频")
+        client = GeminiClient()
+        result = client.analyze_audio_from_path(sample_audio_file, "分析这个音频")
 
-            assert result == "成功"
+        assert result == "成功"
+        assert mock_client_instance.models.generate_content.call_count == 2
+        mock_sleep.assert_called_once()
 
     @patch("services.gemini_client.genai.Client")
     def test_analyze_audio_file_not_found(self, mock_genai_client, sample_audio_file):
@@ -215,6 +258,134 @@ class TestAnalyzeAudioFromPath:
             client.analyze_audio_from_path("/nonexistent/file.webm", "分析这个音频")
 
 
+class TestRetryJitter:
+    """测试重试等待的随机抖动"""
+
+    def test_wait_scaled_by_jitter(self, no_jitter):
+        """测试等待时间乘以抖动系数，系数范围为 [0.5, 1.5]"""
+        no_jitter.return_value = 1.5
+
+        assert _retry_wait(Exception("503 Service Unavailable"), 1) == 6.0
+        no_jitter.assert_called_once_with(0.5, 1.5)
+
+    def test_real_jitter_stays_in_range(self, no_jitter):
+        """测试真实随机抖动落在退避时间的 ±50% 以内"""
+        no_jitter.side_effect = random.Random(0).uniform  # 独立实例，不受 patch 影响
+
+        waits = [_retry_wait(Exception("503 Service Unavailable"), 0) for _ in range(50)]
+
+        assert all(1.0 <= w <= 3.0 for w in waits)
+        assert len(set(waits)) > 1
+
+
+class TestAnalyzeAudioFromPathAsync:
+    """测试 analyze_audio_from_path_async 方法"""
+
+    @patch("services.gemini_client.genai.Client")
+    async def test_analyze_audio_async_success(self, mock_genai_client, sample_audio_file, mock_gemini_response):
+        """测试异步接口成功分析音频"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.aio.models.generate_content = AsyncMock(return_value=mock_gemini_response)
+
+        client = GeminiClient()
+        result = await client.analyze_audio_from_path_async(sample_audio_file, "分析这个音频")
+
+        assert result == "这是测试响应内容"
+        mock_client_instance.aio.models.generate_content.assert_awaited_once()
+        call_args = mock_client_instance.aio.models.generate_content.call_args
+        assert call_args.kwargs["model"] == MODEL_NAME
+        mock_client_instance.models.generate_content.assert_not_called()
+
+    @patch("services.gemini_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("services.gemini_client.genai.Client")
+    async def test_analyze_audio_async_retry_503(self, mock_genai_client, mock_sleep, sample_audio_file, mock_gemini_response):
+        """测试异步接口 503 错误重试"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.aio.models.generate_content = AsyncMock(side_effect=[
+            Exception("503 Service Unavailable"),
+            mock_gemini_response
+        ])
+
+        client = GeminiClient()
+        result = await client.analyze_audio_from_path_async(sample_audio_file, "分析这个音频")
+
+        assert result == "这是测试响应内容"
+        assert mock_client_instance.aio.models.generate_content.await_count == 2
+        mock_sleep.assert_awaited_once_with(2)
+
+    @patch("services.gemini_client.time.sleep")
+    @patch("services.gemini_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("services.gemini_client.genai.Client")
+    async def test_analyze_audio_async_exponential_backoff(
+        self, mock_genai_client, mock_sleep, mock_time_sleep, sample_audio_file, mock_gemini_response
+    ):
+        """测试异步接口按指数退避等待，且不调用阻塞的 time.sleep"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.aio.models.generate_content = AsyncMock(side_effect=[
+            Exception("503 Service Unavailable"),
+            Exception("503 Service Unavailable"),
+            mock_gemini_response
+        ])
+
+        client = GeminiClient()
+        result = await client.analyze_audio_from_path_async(sample_audio_file, "分析这个音频")
+
+        assert result == "这是测试响应内容"
+        assert [c.args[0] for c in mock_sleep.await_args_list] == [2, 4]
+        mock_time_sleep.assert_not_called()
+
+    @patch("services.gemini_client.genai.Client")
+    async def test_analyze_audio_async_non_retryable_error(self, mock_genai_client, sample_audio_file):
+        """测试异步接口不可重试的错误直接抛出"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.aio.models.generate_content = AsyncMock(side_effect=Exception("Invalid API key"))
+
+        client = GeminiClient()
+        with pytest.raises(Exception) as exc_info:
+            await client.analyze_audio_from_path_async(sample_audio_file, "分析这个音频")
+
+        assert "分析失败" in str(exc_info.value)
+        assert mock_client_instance.aio.models.generate_content.await_count == 1
+
+
+def _api_error(error_class, code, status):
+    """构造 SDK 返回的 API 错误"""
+    return error_class(code, {"error": {"code": code, "message": "test", "status": status}})
+
+
+class TestIsRetryableError:
+    """测试可重试错误的判断"""
+
+    @pytest.mark.parametrize("error", [
+        ssl.SSLError("EOF occurred in violation of protocol"),
+        ConnectionResetError("Connection reset by peer"),
+        TimeoutError(),
+        httpx.ConnectError("connect failed"),
+        httpx.ReadTimeout("read timed out"),
+        _api_error(genai_errors.ServerError, 503, "UNAVAILABLE"),
+        _api_error(genai_errors.ServerError, 504, "DEADLINE_EXCEEDED"),
+        _api_error(genai_errors.ClientError, 429, "RESOURCE_EXHAUSTED"),
+        Exception("503 Service Unavailable"),  # 通用异常按错误信息判断
+    ])
+    def test_retryable(self, error):
+        """测试网络异常和过载/限流状态码可重试"""
+        assert _is_retryable_error(error)
+
+    @pytest.mark.parametrize("error", [
+        _api_error(genai_errors.ClientError, 400, "INVALID_ARGUMENT"),
+        _api_error(genai_errors.ServerError, 500, "INTERNAL"),
+        ValueError("Connection string 503 is invalid"),  # 具体类型的异常不按错误信息匹配
+        Exception("400 Bad Request"),
+    ])
+    def test_not_retryable(self, error):
+        """测试请求错误和其他类型的异常不重试"""
+        assert not _is_retryable_error(error)
+
+
 class TestUploadAndAnalyzeAudio:
     """测试 upload_and_analyze_audio 方法"""
 
@@ -241,6 +412,24 @@ class TestUploadAndAnalyzeAudio:
         mock_client_instance.files.upload.assert_called_once_with(file=sample_audio_file)
         mock_client_instance.models.generate_content.assert_called_once()
 
+    @patch("services.gemini_client.types.Part.from_bytes")
+    @patch("services.gemini_client.types.Part.from_uri")
+    @patch("services.gemini_client.genai.Client")
+    def test_upload_references_file_by_uri(self, mock_genai_client, mock_from_uri, mock_from_bytes, sample_audio_file):
+        """测试上传后按 URI 引用文件，不再内嵌音频数据"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.files.upload.return_value = Mock(uri="uploaded-file-uri")
+        mock_client_instance.models.generate_content.return_value = Mock(text="分析结果")
+
+        client = GeminiClient()
+        client.upload_and_analyze_audio(sample_audio_file, "分析这个音频")
+
+        mock_from_uri.assert_called_once_with(file_uri="uploaded-file-uri", mime_type="audio/webm")
+        mock_from_bytes.assert_not_called()
+        contents = mock_client_instance.models.generate_content.call_args.kwargs["contents"]
+        assert contents == ["分析这个音频", mock_from_uri.return_value]
+
     @patch("services.gemini_client.genai.Client")
     def test_upload_and_analyze_upload_failure(self, mock_genai_client, sample_audio_file):
         """测试上传失败"""
@@ -278,6 +467,45 @@ class TestUploadAndAnalyzeAudio:
         assert "Failed to upload and analyze" in str(exc_info.value)
 
 
+class TestUploadAndAnalyzeAudioAsync:
+    """测试 upload_and_analyze_audio_async 方法"""
+
+    @patch("services.gemini_client.genai.Client")
+    async def test_upload_and_analyze_async_success(self, mock_genai_client, sample_audio_file):
+        """测试异步接口上传并分析音频"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+
+        mock_uploaded_file = Mock(uri="uploaded-file-uri")
+        mock_client_instance.aio.files.upload = AsyncMock(return_value=mock_uploaded_file)
+        mock_client_instance.aio.models.generate_content = AsyncMock(return_value=Mock(text="分析结果"))
+
+        client = GeminiClient()
+        result = await client.upload_and_analyze_audio_async(sample_audio_file, "分析这个音频")
+
+        assert result == "分析结果"
+        mock_client_instance.aio.files.upload.assert_awaited_once_with(file=sample_audio_file)
+        call_args = mock_client_instance.aio.models.generate_content.call_args
+        prompt, part = call_args.kwargs["contents"]
+        assert prompt == "分析这个音频"
+        assert part.file_data.file_uri == "uploaded-file-uri"
+        mock_client_instance.files.upload.assert_not_called()
+
+    @patch("services.gemini_client.genai.Client")
+    async def test_upload_and_analyze_async_failure(self, mock_genai_client, sample_audio_file):
+        """测试异步接口上传失败"""
+        mock_client_instance = Mock()
+        mock_genai_client.return_value = mock_client_instance
+        mock_client_instance.aio.files.upload = AsyncMock(side_effect=Exception("Upload failed"))
+
+        client = GeminiClient()
+
+        with pytest.raises(Exception) as exc_info:
+            await client.upload_and_analyze_audio_async(sample_audio_file, "分析这个音频")
+
+        assert "Failed to upload and analyze" in str(exc_info.value)
+
+
 class TestModuleConstants:
     """测试模块常量"""
 
@@ -288,7 +516,8 @@ class TestModuleConstants:
     def test_gemini_api_key_exists(self):
         """测试 API KEY 存在"""
         # 在测试环境中可能没有设置，所以只验证变量存在
-        assert "GEMINI_API_KEY" in dir("services.gemini_client")
+        import services.gemini_client
+        assert hasattr(services.gemini_client, "GEMINI_API_KEY")
 
 
 class TestGlobalGeminiClient:
@@ -358,3 +587,41 @@ class TestContentType:
         call_kwargs = mock_part_from_bytes.call_args.kwargs
         assert call_kwargs["mime_type"] == "audio/webm"
         assert call_kwargs["data"] == b"audio data"
+
+    @pytest.mark.parametrize("filename, expected", [
+        ("part1.webm", "audio/webm"),
+        ("part1.M4A", "audio/mp4"),
+        ("part1.mp3", "audio/mpeg"),
+        ("part1.wav", "audio/wav"),
+        ("part1.ogg", "audio/ogg"),
+        ("part1", "audio/webm"),
+        ("part1.unknown", "audio/webm"),
+    ])
+    def test_mime_type_from_extension(self, filename, expected):
+        """测试按扩展名确定 MIME 类型，未知扩展名使用 webm"""
+        assert _audio_mime_type(f"/uploads/{filename}") == expected
+
+
+class TestReadAudioCache:
+    """测试音频读取缓存"""
+
+    def test_same_file_read_once(self, tmp_path):
+        """测试同一文件多次读取只读盘一次"""
+        audio = tmp_path / "cached.webm"
+        audio.write_bytes(b"first")
+
+        with patch("builtins.open", wraps=open) as spy_open:
+            assert _read_audio(str(audio)) == b"first"
+            assert _read_audio(str(audio)) == b"first"
+
+        assert spy_open.call_count == 1
+
+    def test_rewritten_file_is_reread(self, tmp_path):
+        """测试文件内容变化后重新读取"""
+        audio = tmp_path / "changed.webm"
+        audio.write_bytes(b"first")
+        assert _read_audio(str(audio)) == b"first"
+
+        audio.write_bytes(b"second version")
+
+        assert _read_audio(str(audio)) == b"second version"
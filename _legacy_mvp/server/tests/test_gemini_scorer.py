@@ -45,7 +45,7 @@ class TestPromptCreation:
 
     def test_create_part1_prompt(self):
         """测试 Part 1 prompt 创建"""
-        words = ["apple", "banana", "cherry"]
+        words = ("apple", "banana", "cherry")
         prompt = create_part1_prompt(words)
 
         assert "apple" in prompt
@@ -55,6 +55,12 @@ class TestPromptCreation:
         assert "3分" in prompt  # 总分
         assert "JSON" in prompt
 
+    def test_create_part1_prompt_cached(self):
+        """测试相同单词元组复用缓存的 prompt"""
+        words = ("apple", "banana", "cherry")
+
+        assert create_part1_prompt(words) is create_part1_prompt(tuple(list(words)))
+
     def test_create_part2_prompt(self):
         """测试 Part 2 prompt 创建"""
         words = ["cat", "dog"]
@@ -109,6 +115,13 @@ class TestParseGeminiResponse:
 
         assert result["score"] == 10
 
+    def test_parse_json_with_surrounding_text(self):
+        """测试从前后带说明文字的响应中提取 JSON"""
+        response = '评分结果如下：\n{"score": 7, "feedback": "发音清晰，注意 {重音}",\n}\n以上。'
+        result = parse_gemini_response(response)
+
+        assert result == {"score": 7, "feedback": "发音清晰，注意 {重音}"}
+
     def test_parse_invalid_json_raises_error(self):
         """测试无效 JSON 抛出错误"""
         with pytest.raises(Exception):
@@ -1,27 +1,33 @@
 """
 测试 Part 3 评估函数
 """
+import asyncio
 import pytest
-from unittest.mock import Mock, patch, call
+from types import SimpleNamespace
+from unittest.mock import Mock, patch, call, AsyncMock
 from typing import Dict
 
 from services.part3_evaluator import (
     evaluate_part3_single_question,
     evaluate_part3_group,
-    evaluate_part2_all
+    evaluate_part2_all,
+    evaluate_part2_all_async,
+    evaluate_part3_group_async,
+    evaluate_part3_groups_async,
+    _build_prompt
 )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_dialogue():
-    """示例对话数据"""
+    """示例对话数据（以下对话 fixture 整个测试会话共享，需要修改的测试请先 deepcopy）"""
     return {
         "teacher": "What's your favorite food?",
         "student_options": ["I like pizza", "I love sushi", "My favorite is pasta"]
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_dialogues_part3():
     """Part 3 对话数据（6个问题）"""
     return [
@@ -30,7 +36,7 @@ def sample_dialogues_part3():
     ]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_dialogues_part2():
     """Part 2 对话数据（12个问题）"""
     return [
@@ -39,71 +45,45 @@ def sample_dialogues_part2():
     ]
 
 
-@pytest.fixture
-def mock_audio_path(tmp_path):
-    """模拟音频文件路径"""
-    audio_file = tmp_path / "test_audio.m4a"
+@pytest.fixture(scope="session")
+def mock_audio_path(tmp_path_factory):
+    """模拟音频文件路径（Gemini 调用均被 mock，文件只读不改，整个测试会话只写一次）"""
+    audio_file = tmp_path_factory.mktemp("audio") / "test_audio.m4a"
     audio_file.write_bytes(b"fake audio")
     return str(audio_file)
 
 
-class TestEvaluatePart3SingleQuestion:
-    """测试 evaluate_part3_single_question 函数"""
-
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_single_question_success(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
-        """测试成功评估单个问题"""
-        # Setup mocks
-        mock_gemini_response = {"score": 2, "student_answer": "I like pizza", "feedback": "很好"}
-        mock_parse.return_value = mock_gemini_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "mocked response"
-
-        score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 1)
-
-        assert score == 2
-        assert result["student_answer"] == "I like pizza"
-        assert result["feedback"] == "很好"
-        mock_client_instance.analyze_audio_from_path.assert_called_once()
-
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_single_question_partial_score(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
-        """测试部分正确得分"""
-        mock_gemini_response = {"score": 1, "student_answer": "Pizza", "feedback": "不完整"}
-        mock_parse.return_value = mock_gemini_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
-
-        score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 5)
-
-        assert score == 1
-        assert result["feedback"] == "不完整"
-
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_single_question_zero_score(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
-        """测试零分"""
-        mock_gemini_response = {"score": 0, "student_answer": "", "feedback": "无法回答"}
-        mock_parse.return_value = mock_gemini_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+@pytest.fixture
+def patched_gemini(monkeypatch):
+    """替换评估模块中的 GeminiClient 和 parse_gemini_response（客户端默认返回 "response"）"""
+    client_cls = Mock()
+    client = client_cls.return_value
+    client.analyze_audio_from_path.return_value = "response"
+    client.analyze_audio_from_path_async = AsyncMock(return_value="response")
+    parse = Mock()
+    monkeypatch.setattr("services.part3_evaluator.GeminiClient", client_cls)
+    monkeypatch.setattr("services.part3_evaluator.parse_gemini_response", parse)
+    return SimpleNamespace(client=client, parse=parse)
 
-        score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 3)
 
-        assert score == 0
-        assert result["feedback"] == "无法回答"
+class TestEvaluatePart3SingleQuestion:
+    """测试 evaluate_part3_single_question 函数"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_with_additional_scores(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
+    @pytest.mark.parametrize("score,answer,feedback,question_num", [
+        (2, "I like pizza", "很好", 1),
+        (1, "Pizza", "不完整", 5),
+        (0, "", "无法回答", 3),
+    ], ids=["full", "partial", "zero"])
+    def test_evaluate_single_question(self, patched_gemini, sample_dialogue, mock_audio_path,
+                                      score, answer, feedback, question_num):
+        """测试单个问题评估返回得分与解析结果"""
+        expected = {"score": score, "student_answer": answer, "feedback": feedback}
+        patched_gemini.parse.return_value = expected
+
+        assert evaluate_part3_single_question(mock_audio_path, sample_dialogue, question_num) == (score, expected)
+        patched_gemini.client.analyze_audio_from_path.assert_called_once()
+
+    def test_evaluate_with_additional_scores(self, patched_gemini, sample_dialogue, mock_audio_path):
         """测试包含额外评分字段"""
         mock_gemini_response = {
             "score": 2,
@@ -113,11 +93,7 @@ class TestEvaluatePart3SingleQuestion:
             "pronunciation_score": 9.0,
             "confidence_score": 7.5
         }
-        mock_parse.return_value = mock_gemini_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_gemini_response
 
         score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 1)
 
@@ -125,16 +101,10 @@ class TestEvaluatePart3SingleQuestion:
         assert result["pronunciation_score"] == 9.0
         assert result["confidence_score"] == 7.5
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_single_question_missing_score(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
+    def test_evaluate_single_question_missing_score(self, patched_gemini, sample_dialogue, mock_audio_path):
         """测试返回结果缺少 score 字段"""
         mock_gemini_response = {"student_answer": "Some answer", "feedback": "No score"}
-        mock_parse.return_value = mock_gemini_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_gemini_response
 
         score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 1)
 
@@ -145,9 +115,7 @@ class TestEvaluatePart3SingleQuestion:
 class TestEvaluatePart3Group:
     """测试 evaluate_part3_group 函数"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_group_six_questions(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_evaluate_group_six_questions(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试评估6个问题"""
         mock_response = {
             "questions": [
@@ -162,11 +130,7 @@ class TestEvaluatePart3Group:
             "pronunciation_score": 7.5,
             "confidence_score": 8.5
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
@@ -175,9 +139,7 @@ class TestEvaluatePart3Group:
         assert results[0]["score"] == 2
         assert results[3]["score"] == 0
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_group_with_start_question_7(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_evaluate_group_with_start_question_7(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试起始问题编号为7"""
         mock_response = {
             "questions": [
@@ -188,11 +150,7 @@ class TestEvaluatePart3Group:
             "pronunciation_score": 7.5,
             "confidence_score": 8.5
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 7)
 
@@ -201,9 +159,7 @@ class TestEvaluatePart3Group:
         assert results[0]["question_num"] == 7
         assert results[5]["question_num"] == 12
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_group_incomplete_results(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_evaluate_group_incomplete_results(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试返回结果不完整时补充默认值"""
         # 只返回3个问题结果
         mock_response = {
@@ -216,11 +172,7 @@ class TestEvaluatePart3Group:
             "pronunciation_score": 7.0,
             "confidence_score": 7.0
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
@@ -236,9 +188,7 @@ class TestEvaluatePart3Group:
         assert results[4]["score"] == 0
         assert results[5]["score"] == 0
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_group_overall_scores_added(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_evaluate_group_overall_scores_added(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试整体评分被添加到每个问题结果"""
         mock_response = {
             "questions": [
@@ -249,11 +199,7 @@ class TestEvaluatePart3Group:
             "pronunciation_score": 9.0,
             "confidence_score": 7.5
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
@@ -263,9 +209,7 @@ class TestEvaluatePart3Group:
             assert result["pronunciation_score"] == 9.0
             assert result["confidence_score"] == 7.5
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_group_default_overall_scores(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_evaluate_group_default_overall_scores(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试默认整体评分"""
         mock_response = {
             "questions": [
@@ -274,11 +218,7 @@ class TestEvaluatePart3Group:
             ]
             # 缺少整体评分
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
@@ -292,36 +232,36 @@ class TestEvaluatePart3Group:
 class TestEvaluatePart2All:
     """测试 evaluate_part2_all 函数"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_part2_twelve_questions(self, mock_parse, mock_client, sample_dialogues_part2, mock_audio_path):
-        """测试评估12个Part 2问题"""
-        mock_response = {
+    @pytest.mark.parametrize("scores,overall,expected_total", [
+        ([2] * 12, (8.0, 7.5, 8.5), 24),  # 12个问题，每个2分
+        ([1] * 12, (9.0, 8.5, 9.5), 12),
+        ([1, 2] * 6, (7.5, 7.5, 7.5), 18),  # 6个2分，6个1分
+    ], ids=["full", "partial", "mixed"])
+    def test_evaluate_part2_scores(self, patched_gemini, sample_dialogues_part2, mock_audio_path,
+                                   scores, overall, expected_total):
+        """测试评估12个Part 2问题并返回整体评分"""
+        fluency, pronunciation, confidence = overall
+        patched_gemini.parse.return_value = {
             "questions": [
-                {"question_num": i, "score": 2, "student_answer": f"Ans {i}", "feedback": "好"}
-                for i in range(1, 13)
+                {"question_num": i, "score": score, "student_answer": f"Ans {i}", "feedback": "好"}
+                for i, score in enumerate(scores, 1)
             ],
-            "fluency_score": 8.0,
-            "pronunciation_score": 7.5,
-            "confidence_score": 8.5
+            "fluency_score": fluency,
+            "pronunciation_score": pronunciation,
+            "confidence_score": confidence
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
 
         total_score, results, overall_scores = evaluate_part2_all(mock_audio_path, sample_dialogues_part2)
 
-        assert total_score == 24  # 12个问题，每个2分
+        assert total_score == expected_total
         assert len(results) == 12
-        assert overall_scores["fluency_score"] == 8.0
-        assert overall_scores["pronunciation_score"] == 7.5
-        assert overall_scores["confidence_score"] == 8.5
+        assert overall_scores == {
+            "fluency_score": fluency,
+            "pronunciation_score": pronunciation,
+            "confidence_score": confidence
+        }
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_part2_incomplete_results(self, mock_parse, mock_client, sample_dialogues_part2, mock_audio_path):
+    def test_evaluate_part2_incomplete_results(self, patched_gemini, sample_dialogues_part2, mock_audio_path):
         """测试Part 2返回结果不完整时补充默认值"""
         # 只返回8个问题结果
         mock_response = {
@@ -333,11 +273,7 @@ class TestEvaluatePart2All:
             "pronunciation_score": 7.0,
             "confidence_score": 7.0
         }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = mock_response
 
         total_score, results, overall_scores = evaluate_part2_all(mock_audio_path, sample_dialogues_part2)
 
@@ -350,82 +286,50 @@ class TestEvaluatePart2All:
         assert results[8]["feedback"] == "未能识别回答"
         assert results[11]["score"] == 0
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_part2_returns_overall_scores(self, mock_parse, mock_client, sample_dialogues_part2, mock_audio_path):
-        """测试Part 2返回整体评分"""
-        mock_response = {
-            "questions": [
-                {"question_num": i, "score": 1, "student_answer": f"Ans {i}", "feedback": "一般"}
-                for i in range(1, 13)
-            ],
-            "fluency_score": 9.0,
-            "pronunciation_score": 8.5,
-            "confidence_score": 9.5
-        }
-        mock_parse.return_value = mock_response
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
 
-        total_score, results, overall_scores = evaluate_part2_all(mock_audio_path, sample_dialogues_part2)
+class TestEvaluatePart2AllAsync:
+    """测试 evaluate_part2_all_async 函数"""
 
-        assert total_score == 12
-        assert overall_scores["fluency_score"] == 9.0
-        assert overall_scores["pronunciation_score"] == 8.5
-        assert overall_scores["confidence_score"] == 9.5
-
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_evaluate_part2_mixed_scores(self, mock_parse, mock_client, sample_dialogues_part2, mock_audio_path):
-        """测试Part 2混合得分"""
-        mock_response = {
+    async def test_evaluate_part2_async_matches_sync(self, patched_gemini, sample_dialogues_part2, mock_audio_path):
+        """测试异步版本使用异步客户端，并返回与同步版本相同的结构"""
+        patched_gemini.parse.return_value = {
             "questions": [
-                {"question_num": i, "score": 2 if i % 2 == 0 else 1, "student_answer": f"Ans {i}", "feedback": "好"}
-                for i in range(1, 13)
+                {"question_num": i, "score": 2, "student_answer": f"Ans {i}", "feedback": "好"}
+                for i in range(1, 11)
             ],
-            "fluency_score": 7.5,
+            "fluency_score": 8.0,
             "pronunciation_score": 7.5,
-            "confidence_score": 7.5
+            "confidence_score": 8.5
         }
-        mock_parse.return_value = mock_response
 
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        total_score, results, overall_scores = await evaluate_part2_all_async(mock_audio_path, sample_dialogues_part2)
 
-        total_score, results, overall_scores = evaluate_part2_all(mock_audio_path, sample_dialogues_part2)
-
-        # 6个2分，6个1分 = 18分
-        assert total_score == 18
+        # 10个问题各2分，缺失的2个补0分
+        assert total_score == 20
+        assert len(results) == 12
+        assert results[11]["feedback"] == "未能识别回答"
+        assert overall_scores["fluency_score"] == 8.0
+        patched_gemini.client.analyze_audio_from_path_async.assert_awaited_once()
+        patched_gemini.client.analyze_audio_from_path.assert_not_called()
 
 
 class TestPromptGeneration:
     """测试 Prompt 生成"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_single_question_prompt_contains_question_num(self, mock_parse, mock_client, sample_dialogue, mock_audio_path):
+    def test_single_question_prompt_contains_question_num(self, patched_gemini, sample_dialogue, mock_audio_path):
         """测试单个问题prompt包含问题编号"""
-        mock_parse.return_value = {"score": 2, "student_answer": "Ans", "feedback": "好"}
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = {"score": 2, "student_answer": "Ans", "feedback": "好"}
 
         evaluate_part3_single_question(mock_audio_path, sample_dialogue, 5)
 
         # 验证调用时的prompt包含问题编号
-        call_args = mock_client_instance.analyze_audio_from_path.call_args
+        call_args = patched_gemini.client.analyze_audio_from_path.call_args
         prompt = call_args[0][1]
         assert "问题 5" in prompt
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_group_prompt_contains_all_questions(self, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    def test_group_prompt_contains_all_questions(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试组评估prompt包含所有问题"""
-        mock_parse.return_value = {
+        patched_gemini.parse.return_value = {
             "questions": [
                 {"question_num": i, "score": 2, "student_answer": f"Ans {i}", "feedback": "好"}
                 for i in range(1, 7)
@@ -435,23 +339,17 @@ class TestPromptGeneration:
             "confidence_score": 7.0
         }
 
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
-
         evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
-        call_args = mock_client_instance.analyze_audio_from_path.call_args
+        call_args = patched_gemini.client.analyze_audio_from_path.call_args
         prompt = call_args[0][1]
         # 验证包含所有6个问题
         for i in range(1, 7):
             assert f"问题 {i}" in prompt
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_part2_prompt_contains_twelve_questions(self, mock_parse, mock_client, sample_dialogues_part2, mock_audio_path):
+    def test_part2_prompt_contains_twelve_questions(self, patched_gemini, sample_dialogues_part2, mock_audio_path):
         """测试Part 2 prompt包含12个问题"""
-        mock_parse.return_value = {
+        patched_gemini.parse.return_value = {
             "questions": [
                 {"question_num": i, "score": 1, "student_answer": f"Ans {i}", "feedback": "好"}
                 for i in range(1, 13)
@@ -461,13 +359,9 @@ class TestPromptGeneration:
             "confidence_score": 7.0
         }
 
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
-
         evaluate_part2_all(mock_audio_path, sample_dialogues_part2)
 
-        call_args = mock_client_instance.analyze_audio_from_path.call_args
+        call_args = patched_gemini.client.analyze_audio_from_path.call_args
         prompt = call_args[0][1]
         # 验证包含所有12个问题
         for i in range(1, 13):
@@ -477,33 +371,25 @@ class TestPromptGeneration:
 class TestRetryBehavior:
     """测试重试行为"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    @patch("services.part3_evaluator.time.sleep")
-    def test_single_question_retry_on_failure(self, mock_sleep, mock_parse, mock_client, sample_dialogue, mock_audio_path):
+    @patch("services.retry_decorator.time.sleep")
+    def test_single_question_retry_on_failure(self, mock_sleep, patched_gemini, sample_dialogue, mock_audio_path):
         """测试单个问题评估失败重试"""
         # 前两次失败，第三次成功
-        mock_parse.side_effect = [
+        patched_gemini.parse.side_effect = [
             Exception("Parse error"),
             Exception("Parse error"),
             {"score": 2, "student_answer": "Ans", "feedback": "好"}
         ]
 
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
-
         score, result = evaluate_part3_single_question(mock_audio_path, sample_dialogue, 1)
 
         assert score == 2
-        assert mock_parse.call_count == 3
+        assert patched_gemini.parse.call_count == 3
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    @patch("services.part3_evaluator.time.sleep")
-    def test_group_retry_on_failure(self, mock_sleep, mock_parse, mock_client, sample_dialogues_part3, mock_audio_path):
+    @patch("services.retry_decorator.time.sleep")
+    def test_group_retry_on_failure(self, mock_sleep, patched_gemini, sample_dialogues_part3, mock_audio_path):
         """测试组评估失败重试"""
-        mock_parse.side_effect = [
+        patched_gemini.parse.side_effect = [
             Exception("API error"),
             {
                 "questions": [
@@ -516,53 +402,107 @@ class TestRetryBehavior:
             }
         ]
 
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
-
         total_score, results = evaluate_part3_group(mock_audio_path, sample_dialogues_part3, 1)
 
         assert total_score == 12
-        assert mock_parse.call_count == 2
+        assert patched_gemini.parse.call_count == 2
 
 
 class TestEdgeCases:
     """测试边界情况"""
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_empty_dialogue_student_options(self, mock_parse, mock_client, mock_audio_path):
+    def test_empty_dialogue_student_options(self, patched_gemini, mock_audio_path):
         """测试空的学生选项"""
         empty_dialogue = {
             "teacher": "Test question",
             "student_options": []
         }
 
-        mock_parse.return_value = {"score": 0, "student_answer": "", "feedback": "无回答"}
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = {"score": 0, "student_answer": "", "feedback": "无回答"}
 
         score, result = evaluate_part3_single_question(mock_audio_path, empty_dialogue, 1)
 
         assert score == 0
 
-    @patch("services.part3_evaluator.GeminiClient")
-    @patch("services.part3_evaluator.parse_gemini_response")
-    def test_dialogue_missing_student_options(self, mock_parse, mock_client, mock_audio_path):
+    def test_dialogue_missing_student_options(self, patched_gemini, mock_audio_path):
         """测试对话缺少student_options字段"""
         no_options_dialogue = {
             "teacher": "Test question"
         }
 
-        mock_parse.return_value = {"score": 1, "student_answer": "Something", "feedback": "一般"}
-
-        mock_client_instance = Mock()
-        mock_client.return_value = mock_client_instance
-        mock_client_instance.analyze_audio_from_path.return_value = "response"
+        patched_gemini.parse.return_value = {"score": 1, "student_answer": "Something", "feedback": "一般"}
 
         score, result = evaluate_part3_single_question(mock_audio_path, no_options_dialogue, 1)
 
         # get() 返回空列表，应该能处理
         assert score == 1
+
+
+class TestBuildPrompt:
+    """测试 _build_prompt 函数"""
+
+    def test_multi_question_prompt(self, sample_dialogues_part3):
+        """测试多题prompt按起始编号列出问题并填充数量与范围"""
+        prompt = _build_prompt(sample_dialogues_part3, 7, 6)
+
+        assert "请评估学生对以下6个问题的回答" in prompt
+        assert "**问题 7**：\nTeacher: Question 1\nExpected answers: Answer 1A / Answer 1B\n" in prompt
+        assert "**问题 12**：\nTeacher: Question 6" in prompt
+        assert '"question_num": 7,' in prompt
+        assert "按顺序对应问题 7 到 12" in prompt
+
+    def test_single_question_prompt(self, sample_dialogue):
+        """测试单题prompt使用单题返回格式"""
+        prompt = _build_prompt([sample_dialogue], 3, 1)
+
+        assert "请评估学生对这个问题的回答" in prompt
+        assert "**问题 3**：\nTeacher: What's your favorite food?" in prompt
+        assert '"questions"' not in prompt
+
+    def test_braces_in_dialogue_are_kept(self):
+        """测试题目中的花括号原样保留"""
+        prompt = _build_prompt([{"teacher": "Say {name}"}], 1, 1)
+
+        assert "Teacher: Say {name}\nExpected answers: \n" in prompt
+
+
+class TestEvaluatePart3GroupsAsync:
+    """测试 Part 3 分组的异步并发评估"""
+
+    async def test_group_async_uses_async_client(self, patched_gemini, sample_dialogues_part3, mock_audio_path):
+        """测试单组异步评估使用异步客户端并补齐缺失问题"""
+        patched_gemini.parse.return_value = {
+            "questions": [{"question_num": 7, "score": 2, "student_answer": "A", "feedback": "好"}],
+            "fluency_score": 9.0
+        }
+
+        total_score, results = await evaluate_part3_group_async(mock_audio_path, sample_dialogues_part3, 7)
+
+        assert total_score == 2
+        assert [r["question_num"] for r in results] == [7, 8, 9, 10, 11, 12]
+        assert all(r["fluency_score"] == 9.0 for r in results)
+        patched_gemini.client.analyze_audio_from_path.assert_not_called()
+
+    async def test_groups_run_concurrently_within_limit(self, patched_gemini, sample_dialogues_part3):
+        """测试多组并发执行、不超过并发上限且结果保持输入顺序"""
+        patched_gemini.parse.side_effect = lambda text: {
+            "questions": [{"question_num": 1, "score": int(text), "student_answer": "", "feedback": ""}]
+        }
+        in_flight = 0
+        peak = 0
+
+        async def fake_analyze(audio_path, prompt):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return audio_path
+
+        patched_gemini.client.analyze_audio_from_path_async = fake_analyze
+
+        groups = [(str(score), sample_dialogues_part3, 1) for score in (0, 1, 2)]
+        results = await evaluate_part3_groups_async(groups, max_concurrency=2)
+
+        assert [total for total, _ in results] == [0, 1, 2]
+        assert peak == 2
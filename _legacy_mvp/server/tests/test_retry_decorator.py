@@ -3,10 +3,17 @@
 """
 import pytest
 import time
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from services.retry_decorator import retry_on_error
 
 
+@pytest.fixture(autouse=True)
+def no_jitter():
+    """固定抖动系数为 1，便于断言精确的退避时间"""
+    with patch("services.retry_decorator.random.uniform", return_value=1.0) as mock_uniform:
+        yield mock_uniform
+
+
 class TestRetryOnError:
     """测试 retry_on_error 装饰器"""
 
@@ -94,7 +101,7 @@ class TestRetryOnError:
         assert mock_sleep.call_args_list[1][0][0] == 0.2
         assert mock_sleep.call_args_list[2][0][0] == 0.4
 
-    def test_location_error_message(self):
+    def test_location_error_message(self, caplog):
         """测试地域限制错误消息"""
         call_count = [0]
 
@@ -105,27 +112,25 @@ class TestRetryOnError:
                 raise Exception("User location is not supported")
             return "success"
 
-        with patch("services.retry_decorator.print") as mock_print:
+        with caplog.at_level("WARNING", logger="services.retry_decorator"):
             result = location_restricted_function()
 
         assert result == "success"
-        # 验证打印了地域限制错误
-        print_calls = [str(call) for call in mock_print.call_args_list]
-        assert any("地域限制错误" in str(call) for call in print_calls)
+        # 验证记录了地域限制错误
+        assert any("地域限制错误" in r.getMessage() for r in caplog.records)
 
-    def test_general_error_message(self):
+    def test_general_error_message(self, caplog):
         """测试一般错误消息"""
         @retry_on_error(max_retries=1, delay=0.1, backoff=1.0)
         def failing_function():
             raise Exception("API error")
 
-        with patch("services.retry_decorator.print") as mock_print:
+        with caplog.at_level("WARNING", logger="services.retry_decorator"):
             with pytest.raises(Exception):
                 failing_function()
 
-        # 验证打印了 API 调用失败
-        print_calls = [str(call) for call in mock_print.call_args_list]
-        assert any("API调用失败" in str(call) for call in print_calls)
+        # 验证记录了 API 调用失败
+        assert any("API调用失败" in r.getMessage() for r in caplog.records)
 
     def test_default_parameters(self):
         """测试默认参数"""
@@ -350,6 +355,122 @@ class TestRetryOnErrorEdgeCases:
         assert mock_sleep.call_args_list[1][0][0] == 0.5
 
 
+class TestRetryOnErrorClassification:
+    """测试可重试/永久性错误的区分与抖动"""
+
+    def test_non_retryable_message_fails_fast(self):
+        """测试鉴权类错误不重试"""
+        call_count = [0]
+
+        @retry_on_error(max_retries=3, delay=0.1, backoff=2.0)
+        def unauthorized_function():
+            call_count[0] += 1
+            raise Exception("400 INVALID_ARGUMENT: API key not valid. Please pass a valid API key.")
+
+        with patch("services.retry_decorator.time.sleep") as mock_sleep:
+            with pytest.raises(Exception):
+                unauthorized_function()
+
+        assert call_count[0] == 1
+        mock_sleep.assert_not_called()
+
+    def test_exception_outside_whitelist_fails_fast(self):
+        """测试不在 retryable_exceptions 中的异常类型不重试"""
+        call_count = [0]
+
+        @retry_on_error(max_retries=3, delay=0.1, retryable_exceptions=(ConnectionError, TimeoutError))
+        def value_error_function():
+            call_count[0] += 1
+            raise ValueError("bad input")
+
+        with patch("services.retry_decorator.time.sleep"):
+            with pytest.raises(ValueError):
+                value_error_function()
+
+        assert call_count[0] == 1
+
+    def test_whitelisted_exception_retries(self):
+        """测试白名单内的异常继续重试"""
+        call_count = [0]
+
+        @retry_on_error(max_retries=3, delay=0.1, retryable_exceptions=(ConnectionError,))
+        def flaky_function():
+            call_count[0] += 1
+            if call_count[0] < 3:
+                raise ConnectionError("reset by peer")
+            return "success"
+
+        with patch("services.retry_decorator.time.sleep"):
+            assert flaky_function() == "success"
+
+        assert call_count[0] == 3
+
+    def test_jitter_scales_delay(self, no_jitter):
+        """测试等待时间乘以随机抖动系数"""
+        no_jitter.side_effect = [0.5, 1.5]
+
+        @retry_on_error(max_retries=2, delay=1.0, backoff=2.0, jitter=0.5)
+        def failing_function():
+            raise Exception("Error")
+
+        with patch("services.retry_decorator.time.sleep") as mock_sleep:
+            with pytest.raises(Exception):
+                failing_function()
+
+        assert [c[0][0] for c in mock_sleep.call_args_list] == [0.5, 3.0]
+        assert no_jitter.call_args_list[0][0] == (0.5, 1.5)
+
+    def test_zero_jitter_is_deterministic(self, no_jitter):
+        """测试 jitter=0 时不调用随机数"""
+        @retry_on_error(max_retries=1, delay=1.0, jitter=0)
+        def failing_function():
+            raise Exception("Error")
+
+        with patch("services.retry_decorator.time.sleep") as mock_sleep:
+            with pytest.raises(Exception):
+                failing_function()
+
+        assert mock_sleep.call_args_list[0][0][0] == 1.0
+        no_jitter.assert_not_called()
+
+
+class TestRetryOnErrorAsync:
+    """测试 retry_on_error 装饰协程函数"""
+
+    @patch("services.retry_decorator.asyncio.sleep", new_callable=AsyncMock)
+    @patch("services.retry_decorator.time.sleep")
+    async def test_async_retry_uses_asyncio_sleep(self, mock_time_sleep, mock_async_sleep):
+        """测试协程函数重试时使用 asyncio.sleep，不阻塞事件循环"""
+        call_count = [0]
+
+        @retry_on_error(max_retries=3, delay=1.0, backoff=2.0)
+        async def flaky_coroutine():
+            call_count[0] += 1
+            if call_count[0] < 3:
+                raise Exception("Temporary error")
+            return "success"
+
+        result = await flaky_coroutine()
+
+        assert result == "success"
+        assert call_count[0] == 3
+        assert [c[0][0] for c in mock_async_sleep.call_args_list] == [1.0, 2.0]
+        mock_time_sleep.assert_not_called()
+
+    @patch("services.retry_decorator.asyncio.sleep", new_callable=AsyncMock)
+    async def test_async_max_retries_exceeded(self, mock_async_sleep):
+        """测试协程函数超过最大重试次数"""
+        @retry_on_error(max_retries=2, delay=0.1, backoff=1.0)
+        async def failing_coroutine():
+            raise Exception("Persistent error")
+
+        with pytest.raises(Exception) as exc_info:
+            await failing_coroutine()
+
+        assert "Persistent error" in str(exc_info.value)
+        assert mock_async_sleep.call_count == 2
+
+
 class TestRetryOnErrorWithRealSleep:
     """使用真实 sleep 的测试（测试时间流逝）"""
 
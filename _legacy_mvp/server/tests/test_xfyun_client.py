@@ -1,14 +1,16 @@
 """
 测试讯飞语音评测客户端
 """
+import asyncio
 import pytest
-from unittest.mock import Mock, patch, MagicMock, mock_open
+from unittest.mock import Mock, patch, MagicMock, AsyncMock, mock_open
 import base64
 import json
 from xml.etree import ElementTree as ET
 
 from services.xfyun_client import (
     XfyunIseClient,
+    _prepare_audio_cached,
     get_xfyun_client,
     ISE_URL,
     XFYUN_APP_ID,
@@ -108,6 +110,50 @@ class TestCreateUrl:
         assert "date=" in url
         assert "host=" in url
 
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.time.monotonic")
+    def test_create_url_reused_within_window(self, mock_monotonic):
+        """测试有效期内复用签名，过期或失效后重新签名"""
+        client = XfyunIseClient()
+
+        with patch.object(client, "_sign_url", side_effect=["url_1", "url_2", "url_3"]) as mock_sign:
+            mock_monotonic.return_value = 100.0
+            assert client._create_url() == "url_1"
+            mock_monotonic.return_value = 159.0
+            assert client._create_url() == "url_1"
+            mock_monotonic.return_value = 160.0
+            assert client._create_url() == "url_2"
+            client._invalidate_url()
+            assert client._create_url() == "url_3"
+        assert mock_sign.call_count == 3
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.datetime")
+    def test_sign_url_signature_matches_fresh_hmac(self, mock_datetime):
+        """测试复用 HMAC 模板的签名与单次计算一致，且多次签名互不影响"""
+        import hashlib
+        import hmac
+        from urllib.parse import parse_qs, urlparse
+
+        date = "Mon, 01 Jan 2024 00:00:00 GMT"
+        mock_datetime.datetime.now.return_value.strftime.return_value = date
+        expected = base64.b64encode(hmac.new(
+            b"test_api_secret",
+            f"host: ise-api.xfyun.cn\ndate: {date}\nGET /v2/open-ise HTTP/1.1".encode("utf-8"),
+            digestmod=hashlib.sha256
+        ).digest()).decode("utf-8")
+
+        client = XfyunIseClient()
+        urls = [client._sign_url(), client._sign_url()]
+
+        assert urls[0] == urls[1]
+        authorization = base64.b64decode(parse_qs(urlparse(urls[0]).query)["authorization"][0]).decode("utf-8")
+        assert f'signature="{expected}"' in authorization
+
 
 class TestBuildIseText:
     """测试 _build_ise_text 方法"""
@@ -224,6 +270,21 @@ class TestParseResult:
         # dp_message=0 表示正确
         assert result["details"][0]["dp_message"] == "0"
 
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    def test_parse_integer_and_missing_scores(self):
+        """测试整数分数查表、小数分数和缺失属性都解析为 float"""
+        xml = '<rec_paper total_score="90" accuracy_score="73.5"><read_word><word content="hi"/></read_word></rec_paper>'
+
+        client = XfyunIseClient()
+        result = client._parse_result(xml)
+
+        assert result["total_score"] == 90.0 and isinstance(result["total_score"], float)
+        assert result["accuracy_score"] == 73.5
+        assert result["fluency_score"] == 0.0
+        assert result["details"][0]["total_score"] == 0.0
+
 
 class TestPrepareAudio:
     """测试 _prepare_audio 方法"""
@@ -249,48 +310,164 @@ class TestPrepareAudio:
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_prepare_wav_audio(self, mock_audio_segment, sample_audio_file):
-        """测试准备 WAV 音频"""
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"converted pcm data"
-        mock_audio_segment.from_wav.return_value = mock_audio
+    @patch("services.xfyun_client.subprocess.run")
+    def test_prepare_wav_audio(self, mock_run, sample_audio_file):
+        """测试准备 WAV 音频（一次 ffmpeg 调用输出 16kHz 单声道 PCM）"""
+        mock_run.return_value = Mock(returncode=0, stdout=b"converted pcm data", stderr=b"")
 
         client = XfyunIseClient()
         result = client._prepare_audio(sample_audio_file)
 
-        mock_audio_segment.from_wav.assert_called_once_with(sample_audio_file)
-        mock_audio.set_frame_rate.assert_called_once_with(16000)
-        mock_audio.set_channels.assert_called_once_with(1)
+        mock_run.assert_called_once()
+        cmd = mock_run.call_args.args[0]
+        assert cmd[cmd.index("-i") + 1] == sample_audio_file
+        assert cmd[cmd.index("-ar") + 1] == "16000"
+        assert cmd[cmd.index("-ac") + 1] == "1"
+        assert cmd[cmd.index("-f") + 1] == "s16le"
+        assert cmd[-1] == "pipe:1"
         assert result == b"converted pcm data"
 
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_prepare_webm_audio(self, mock_audio_segment, sample_audio_file):
+    @patch("services.xfyun_client.subprocess.run")
+    def test_prepare_webm_audio(self, mock_run, sample_audio_file):
         """测试准备 WebM 音频"""
         # 重命名为 .webm
         webm_file = sample_audio_file.replace(".wav", ".webm")
         import os
         os.rename(sample_audio_file, webm_file)
 
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"webm pcm data"
-        mock_audio_segment.from_file.return_value = mock_audio
+        mock_run.return_value = Mock(returncode=0, stdout=b"webm pcm data", stderr=b"")
 
         client = XfyunIseClient()
         result = client._prepare_audio(webm_file)
 
-        mock_audio_segment.from_file.assert_called_once_with(webm_file, format='webm')
+        assert webm_file in mock_run.call_args.args[0]
         assert result == b"webm pcm data"
 
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.subprocess.run")
+    def test_prepare_audio_ffmpeg_failure(self, mock_run, sample_audio_file):
+        """测试 ffmpeg 转换失败时抛出带错误信息的异常"""
+        mock_run.return_value = Mock(returncode=1, stdout=b"", stderr=b"Invalid data found\n")
+
+        client = XfyunIseClient()
+
+        with pytest.raises(Exception, match="音频转换失败: Invalid data found"):
+            client._prepare_audio(sample_audio_file)
+
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.subprocess.run")
+    def test_prepare_audio_cached_per_file_version(self, mock_run, sample_audio_file):
+        """测试同一文件只转换一次，文件改写后重新转换"""
+        mock_run.side_effect = [
+            Mock(returncode=0, stdout=b"pcm v1", stderr=b""),
+            Mock(returncode=0, stdout=b"pcm v2", stderr=b""),
+        ]
+        client = XfyunIseClient()
+
+        assert client._prepare_audio(sample_audio_file) == b"pcm v1"
+        assert client._prepare_audio(sample_audio_file) == b"pcm v1"
+        assert mock_run.call_count == 1
+
+        with open(sample_audio_file, "wb") as f:
+            f.write(b"re-recorded wav data")
+
+        assert client._prepare_audio(sample_audio_file) == b"pcm v2"
+        assert mock_run.call_count == 2
+
+class TestSoundfileDecode:
+    """测试进程内解码（需要 numpy / scipy / soundfile）"""
+
+    @patch("services.xfyun_client.subprocess.run")
+    def test_wav_16k_mono_round_trips_without_ffmpeg(self, mock_run, tmp_path):
+        """测试 16kHz 单声道 WAV 原样转为 PCM，不调用 ffmpeg"""
+        np = pytest.importorskip("numpy")
+        soundfile = pytest.importorskip("soundfile")
+        pytest.importorskip("scipy")
+        samples = (np.sin(np.arange(1600) / 10) * 10000).astype(np.int16)
+        path = tmp_path / "mono.wav"
+        soundfile.write(str(path), samples, 16000, subtype="PCM_16")
+
+        pcm = _prepare_audio_cached(str(path), 1, 1)
+
+        assert pcm == samples.astype("<i2").tobytes()
+        mock_run.assert_not_called()
+
+    @patch("services.xfyun_client.subprocess.run")
+    def test_wav_48k_stereo_resampled(self, mock_run, tmp_path):
+        """测试 48kHz 立体声 WAV 混为单声道并降采样到 16kHz"""
+        np = pytest.importorskip("numpy")
+        soundfile = pytest.importorskip("soundfile")
+        pytest.importorskip("scipy")
+        samples = np.zeros((4800, 2), dtype=np.int16)
+        samples[:, 0] = 8000
+        path = tmp_path / "stereo.wav"
+        soundfile.write(str(path), samples, 48000, subtype="PCM_16")
+
+        pcm = np.frombuffer(_prepare_audio_cached(str(path), 1, 1), dtype="<i2")
+
+        assert len(pcm) == 1600
+        assert abs(int(pcm[800]) - 4000) <= 2
+        mock_run.assert_not_called()
+
+
+class FakeWebSocket:
+    """模拟 websockets 连接：记录发送的消息，按顺序返回预设响应"""
+
+    def __init__(self, responses=(), connect_error=None, wait_for_audio=False):
+        self.sent = []
+        self.responses = [json.dumps(r) for r in responses]
+        self.connect_error = connect_error
+        # 像真实服务端一样，收到最后一帧音频后才返回结果
+        self.wait_for_audio = wait_for_audio
+        self.audio_done = asyncio.Event()
+        self.closed = False
+
+    def __await__(self):
+        async def handshake():
+            if self.connect_error:
+                raise self.connect_error
+            return self
+        return handshake().__await__()
+
+    async def __aenter__(self):
+        return self
+
+    async def close(self):
+        self.closed = True
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+    async def send(self, data):
+        frame = json.loads(data)
+        self.sent.append(frame)
+        if frame["data"]["status"] == 2:
+            self.audio_done.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.wait_for_audio:
+            await self.audio_done.wait()
+        if not self.responses:
+            raise StopAsyncIteration
+        return self.responses.pop(0)
+
+
+def _success_response(xml: bytes) -> dict:
+    """构造评测结束的响应"""
+    return {"code": 0, "data": {"status": 2, "data": base64.b64encode(xml).decode('utf-8')}}
+
 
 class TestEvaluateAudio:
     """测试 evaluate_audio 方法"""
@@ -298,38 +475,13 @@ class TestEvaluateAudio:
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.websocket.WebSocketApp")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_evaluate_audio_success(self, mock_audio_segment, mock_websocket_app, sample_audio_file):
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_audio_success(self, mock_prepare_audio, mock_connect, sample_audio_file):
         """测试成功评测音频"""
-        # Mock audio
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"audio data"
-        mock_audio_segment.from_wav.return_value = mock_audio
-
-        # Mock WebSocket
-        mock_ws = Mock()
-        mock_websocket_app.return_value = mock_ws
-
-        # Mock response callback
-        def mock_run_forever(**kwargs):
-            # 模拟服务器响应
-            response = {
-                "code": 0,
-                "data": {
-                    "status": 2,  # 评测结束
-                    "data": base64.b64encode(
-                        b'<?xml version="1.0"?><rec_paper total_score="85.5"/>'
-                    ).decode('utf-8')
-                }
-            }
-            # 调用 on_message
-            mock_ws.on_message(mock_ws, json.dumps(response))
-
-        mock_ws.run_forever = mock_run_forever
+        mock_connect.return_value = FakeWebSocket([
+            _success_response(b'<?xml version="1.0"?><rec_paper total_score="85.5"/>')
+        ])
 
         client = XfyunIseClient()
         result = client.evaluate_audio(sample_audio_file, "hello world")
@@ -340,143 +492,194 @@ class TestEvaluateAudio:
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.websocket.WebSocketApp")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_evaluate_audio_error_code(self, mock_audio_segment, mock_websocket_app, sample_audio_file):
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_audio_error_code(self, mock_prepare_audio, mock_connect, sample_audio_file):
         """测试评测返回错误码"""
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"audio data"
-        mock_audio_segment.from_wav.return_value = mock_audio
+        mock_connect.return_value = FakeWebSocket([
+            {"code": 101, "message": "Invalid parameter"}
+        ])
 
-        mock_ws = Mock()
-        mock_websocket_app.return_value = mock_ws
+        client = XfyunIseClient()
+        result = client.evaluate_audio(sample_audio_file, "hello")
 
-        def mock_run_forever(**kwargs):
-            response = {
-                "code": 101,
-                "message": "Invalid parameter"
-            }
-            mock_ws.on_message(mock_ws, json.dumps(response))
+        assert result["status"] == "error"
+        assert "101" in result["error"]
 
-        mock_ws.run_forever = mock_run_forever
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_audio_websocket_error(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试 WebSocket 错误（并丢弃缓存的鉴权 URL）"""
+        mock_connect.return_value = FakeWebSocket(connect_error=OSError("Connection failed"))
+
+        client = XfyunIseClient()
+        result = client.evaluate_audio(sample_audio_file, "hello")
+
+        assert result["status"] == "error"
+        assert "WebSocket 错误" in result["error"]
+        assert client._url_cache == (0.0, None)
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_audio_closed_before_result(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试连接在评测结束前关闭"""
+        mock_connect.return_value = FakeWebSocket([{"code": 0, "data": {"status": 1}}])
 
         client = XfyunIseClient()
         result = client.evaluate_audio(sample_audio_file, "hello")
 
         assert result["status"] == "error"
-        assert "101" in result["error"]
 
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.websocket.WebSocketApp")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_evaluate_audio_websocket_error(self, mock_audio_segment, mock_websocket_app, sample_audio_file):
-        """测试 WebSocket 错误"""
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"audio data"
-        mock_audio_segment.from_wav.return_value = mock_audio
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"\x00" * 3000)
+    async def test_evaluate_audio_async_sends_all_frames(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试异步接口先发参数帧再发全部音频帧"""
+        fake_ws = FakeWebSocket([_success_response(b'<rec_paper total_score="70.0"/>')], wait_for_audio=True)
+        mock_connect.return_value = fake_ws
+
+        client = XfyunIseClient()
+        result = await client.evaluate_audio_async(sample_audio_file, "hello")
+
+        assert result["status"] == "success"
+        assert fake_ws.sent[0]["business"]["cmd"] == "ssb"
+        assert [f["data"]["status"] for f in fake_ws.sent[1:]] == [1, 1, 2]
+
 
-        mock_ws = Mock()
-        mock_websocket_app.return_value = mock_ws
+class TestEarlyHandshake:
+    """测试握手与音频转换并行"""
 
-        def mock_run_forever(**kwargs):
-            mock_ws.on_error(mock_ws, "Connection failed")
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    def test_connect_starts_before_audio_ready(self, mock_connect, sample_audio_file):
+        """测试转换音频时连接已经发起"""
+        fake_ws = FakeWebSocket([_success_response(b'<rec_paper total_score="70.0"/>')])
+        mock_connect.return_value = fake_ws
+        connect_called_during_prepare = []
 
-        mock_ws.run_forever = mock_run_forever
+        def prepare(audio_path):
+            connect_called_during_prepare.append(mock_connect.called)
+            return b"audio data"
+
+        client = XfyunIseClient()
+        with patch.object(XfyunIseClient, "_prepare_audio", side_effect=prepare):
+            result = client.evaluate_audio(sample_audio_file, "hello")
+
+        assert result["status"] == "success"
+        assert connect_called_during_prepare == [True]
+        assert fake_ws.closed
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", side_effect=Exception("音频转换失败: bad file"))
+    def test_prepare_failure_discards_connection(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试音频转换失败时放弃提前建立的连接"""
+        fake_ws = FakeWebSocket()
+        mock_connect.return_value = fake_ws
 
         client = XfyunIseClient()
         result = client.evaluate_audio(sample_audio_file, "hello")
 
         assert result["status"] == "error"
-        assert "WebSocket 错误" in result["error"]
+        assert "音频转换失败" in result["error"]
+        assert fake_ws.sent == []
 
 
-class TestEvaluateAudioParameters:
-    """测试评测参数"""
+class TestResultCache:
+    """测试评测结果缓存"""
 
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.websocket.WebSocketApp")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_evaluate_with_category_read_word(self, mock_audio_segment, mock_websocket_app, sample_audio_file):
-        """测试单词评测"""
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"audio data"
-        mock_audio_segment.from_wav.return_value = mock_audio
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_same_audio_and_text_hits_cache(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试同一录音 + 同一文本只请求一次，其他参数或文件变化后重新请求"""
+        mock_connect.side_effect = lambda *args, **kwargs: FakeWebSocket(
+            [_success_response(b'<rec_paper total_score="80"/>')]
+        )
 
-        mock_ws = Mock()
-        mock_websocket_app.return_value = mock_ws
+        client = XfyunIseClient()
+        first = client.evaluate_audio(sample_audio_file, "hello")
+        first["data"]["total_score"] = -1
+        second = client.evaluate_audio(sample_audio_file, "hello")
 
-        sent_frames = []
+        assert mock_connect.call_count == 1
+        assert second["data"]["total_score"] == 80.0
 
-        def mock_send(data):
-            sent_frames.append(json.loads(data))
+        client.evaluate_audio(sample_audio_file, "hello", category="read_word")
+        assert mock_connect.call_count == 2
 
-        def mock_run_forever(**kwargs):
-            mock_ws.send = mock_send
-            response = {
-                "code": 0,
-                "data": {"status": 2, "data": base64.b64encode(b'<rec_paper total_score="90.0"/>').decode()}
-            }
-            mock_ws.on_message(mock_ws, json.dumps(response))
+        with open(sample_audio_file, "ab") as f:
+            f.write(b"more")
+        client.evaluate_audio(sample_audio_file, "hello")
+        assert mock_connect.call_count == 3
 
-        mock_ws.run_forever = mock_run_forever
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_errors_are_not_cached(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试失败结果不缓存"""
+        mock_connect.side_effect = lambda *args, **kwargs: FakeWebSocket(
+            [{"code": 10114, "message": "timeout"}]
+        )
+
+        client = XfyunIseClient()
+        client.evaluate_audio(sample_audio_file, "hello")
+        client.evaluate_audio(sample_audio_file, "hello")
+
+        assert mock_connect.call_count == 2
+
+
+class TestEvaluateAudioParameters:
+    """测试评测参数"""
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_with_category_read_word(self, mock_prepare_audio, mock_connect, sample_audio_file):
+        """测试单词评测"""
+        fake_ws = FakeWebSocket([_success_response(b'<rec_paper total_score="90.0"/>')])
+        mock_connect.return_value = fake_ws
 
         client = XfyunIseClient()
         result = client.evaluate_audio(sample_audio_file, "hello", category="read_word")
 
         # 验证第一帧包含正确的 category
-        first_frame = sent_frames[0]
+        first_frame = fake_ws.sent[0]
         assert first_frame["business"]["category"] == "read_word"
 
     @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
     @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
     @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
-    @patch("services.xfyun_client.websocket.WebSocketApp")
-    @patch("services.xfyun_client.AudioSegment")
-    def test_evaluate_with_language_chinese(self, mock_audio_segment, mock_websocket_app, sample_audio_file):
+    @patch("services.xfyun_client.websockets.connect")
+    @patch("services.xfyun_client.XfyunIseClient._prepare_audio", return_value=b"audio data")
+    def test_evaluate_with_language_chinese(self, mock_prepare_audio, mock_connect, sample_audio_file):
         """测试中文评测"""
-        mock_audio = Mock()
-        mock_audio.set_frame_rate.return_value = mock_audio
-        mock_audio.set_channels.return_value = mock_audio
-        mock_audio.set_sample_width.return_value = mock_audio
-        mock_audio.raw_data = b"audio data"
-        mock_audio_segment.from_wav.return_value = mock_audio
-
-        mock_ws = Mock()
-        mock_websocket_app.return_value = mock_ws
-
-        sent_frames = []
-
-        def mock_send(data):
-            sent_frames.append(json.loads(data))
-
-        def mock_run_forever(**kwargs):
-            mock_ws.send = mock_send
-            response = {
-                "code": 0,
-                "data": {"status": 2, "data": base64.b64encode(b'<rec_paper total_score="85.0"/>').decode()}
-            }
-            mock_ws.on_message(mock_ws, json.dumps(response))
-
-        mock_ws.run_forever = mock_run_forever
+        fake_ws = FakeWebSocket([_success_response(b'<rec_paper total_score="85.0"/>')])
+        mock_connect.return_value = fake_ws
 
         client = XfyunIseClient()
         result = client.evaluate_audio(sample_audio_file, "你好", category="read_sentence", language="zh_cn")
 
         # 验证使用中文引擎
-        first_frame = sent_frames[0]
+        first_frame = fake_ws.sent[0]
         assert first_frame["business"]["ent"] == "cn_vip"
 
 
@@ -511,3 +714,71 @@ class TestModuleConstants:
     def test_ise_url(self):
         """测试 WebSocket URL"""
         assert ISE_URL == "wss://ise-api.xfyun.cn/v2/open-ise"
+
+
+class TestSendAudioFrames:
+    """测试音频分帧发送"""
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("services.xfyun_client.time.monotonic")
+    async def test_pacing_absorbs_send_latency(self, mock_monotonic, mock_sleep):
+        """测试只睡到下一帧截止时间，最后一帧后不等待"""
+        client = XfyunIseClient()
+        ws = AsyncMock()
+        # start=0；每帧发送后分别在 0.01 / 0.05 / 0.09 秒检查剩余时间
+        mock_monotonic.side_effect = [0.0, 0.01, 0.05]
+        audio = b"\x01" * (1280 * 2 + 100)
+
+        await client._send_audio_frames(ws, client._build_audio_frames(audio))
+
+        frames = [json.loads(c.args[0]) for c in ws.send.call_args_list]
+        assert [f["business"]["aus"] for f in frames] == [1, 2, 3]
+        assert [f["data"]["status"] for f in frames] == [1, 1, 2]
+        assert base64.b64decode(frames[2]["data"]["data"]) == b"\x01" * 100
+        slept = [c.args[0] for c in mock_sleep.call_args_list]
+        assert slept == pytest.approx([0.03, 0.03])
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    @patch("services.xfyun_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("services.xfyun_client.time.monotonic")
+    async def test_no_sleep_when_behind_schedule(self, mock_monotonic, mock_sleep):
+        """测试发送耗时超过帧间隔时不再额外等待"""
+        client = XfyunIseClient()
+        ws = AsyncMock()
+        mock_monotonic.side_effect = [0.0, 0.1]
+
+        await client._send_audio_frames(ws, client._build_audio_frames(b"\x00" * 2000))
+
+        assert ws.send.call_count == 2
+        mock_sleep.assert_not_called()
+
+
+class TestBuildAudioFrames:
+    """测试音频预切帧"""
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    def test_frames_cover_audio_in_order(self):
+        """测试各帧按顺序拼回原始音频"""
+        client = XfyunIseClient()
+        audio = bytes(range(256)) * 11  # 2816 字节 -> 3 帧
+
+        frames = [json.loads(f) for f in client._build_audio_frames(audio)]
+
+        assert len(frames) == 3
+        assert b"".join(base64.b64decode(f["data"]["data"]) for f in frames) == audio
+        assert [f["data"]["status"] for f in frames] == [1, 1, 2]
+
+    @patch("services.xfyun_client.XFYUN_APP_ID", "test_app_id")
+    @patch("services.xfyun_client.XFYUN_API_KEY", "test_api_key")
+    @patch("services.xfyun_client.XFYUN_API_SECRET", "test_api_secret")
+    def test_empty_audio_has_no_frames(self):
+        """测试空音频不生成帧"""
+        client = XfyunIseClient()
+        assert client._build_audio_frames(b"") == []
@@ -1,14 +1,19 @@
 """
 测试讯飞语音评分服务
 """
+import asyncio
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 from typing import Dict, List
 
 from services.xfyun_scorer import (
     evaluate_words_with_xfyun,
     evaluate_sentence_with_xfyun,
     evaluate_part2_all_with_xfyun,
+    evaluate_words_with_xfyun_async,
+    evaluate_part2_all_with_xfyun_async,
+    evaluate_sentences_with_xfyun_async,
+    evaluate_words_batch_with_xfyun_async,
     _get_dp_message_text,
     _generate_part1_feedback,
     _generate_part2_feedback,
@@ -238,6 +243,82 @@ class TestEvaluateSentenceWithXfyun:
         assert "feedback" in result
 
 
+class TestAsyncVariants:
+    """测试异步评测接口"""
+
+    @patch("services.xfyun_scorer.get_xfyun_client")
+    async def test_words_async_matches_sync(self, mock_get_client, mock_audio_path, mock_xfyun_result_success):
+        """测试异步 Part 1 与同步版本结果一致"""
+        mock_client = Mock()
+        mock_client.evaluate_audio.return_value = mock_xfyun_result_success
+        mock_client.evaluate_audio_async = AsyncMock(return_value=mock_xfyun_result_success)
+        mock_get_client.return_value = mock_client
+        words = ["hello", "world", "test"]
+
+        result = await evaluate_words_with_xfyun_async(mock_audio_path, words)
+
+        assert result == evaluate_words_with_xfyun(mock_audio_path, words)
+        mock_client.evaluate_audio_async.assert_awaited_once()
+
+    @patch("services.xfyun_scorer.get_xfyun_client")
+    async def test_part2_all_async_error(self, mock_get_client, mock_audio_path):
+        """测试异步 Part 2 评测失败"""
+        mock_client = Mock()
+        mock_client.evaluate_audio_async = AsyncMock(return_value={"status": "error", "error": "超时"})
+        mock_get_client.return_value = mock_client
+
+        result = await evaluate_part2_all_with_xfyun_async(mock_audio_path, ["Q1"])
+
+        assert result == {"error": "超时", "total_score": 0, "question_scores": []}
+
+
+class TestBatchEvaluation:
+    """测试批量并发评测"""
+
+    @patch("services.xfyun_scorer.get_xfyun_client")
+    async def test_sentences_keep_order_and_limit_concurrency(self, mock_get_client):
+        """测试结果保持输入顺序且并发不超过上限"""
+        running = 0
+        peak = 0
+
+        async def fake_evaluate(audio_path, text, category, language):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            score = float(audio_path.split("_")[1])
+            return {"status": "success", "data": {"accuracy_score": score, "fluency_score": score}}
+
+        mock_client = Mock()
+        mock_client.evaluate_audio_async = fake_evaluate
+        mock_get_client.return_value = mock_client
+        audio_paths = [f"q_{score}" for score in (100, 50, 0, 100, 50)]
+
+        results = await evaluate_sentences_with_xfyun_async(
+            audio_paths, [f"Q{i}" for i in range(5)], max_concurrency=2
+        )
+
+        assert [r["scores"]["pronunciation"] for r in results] == [2.0, 1.0, 0.0, 2.0, 1.0]
+        assert peak == 2
+
+    @patch("services.xfyun_scorer.get_xfyun_client")
+    async def test_words_batch_isolates_failures(self, mock_get_client, mock_xfyun_result_success):
+        """测试单段失败不影响其他段"""
+        mock_client = Mock()
+        mock_client.evaluate_audio_async = AsyncMock(
+            side_effect=[mock_xfyun_result_success, Exception("连接失败")]
+        )
+        mock_get_client.return_value = mock_client
+
+        results = await evaluate_words_batch_with_xfyun_async(
+            ["a.wav", "b.wav"], [["hello", "world", "test"], ["cat"]]
+        )
+
+        assert results[0]["score"] == 3
+        assert results[1]["error"] == "连接失败"
+
+
 class TestEvaluatePart2AllWithXfyun:
     """测试 evaluate_part2_all_with_xfyun 函数"""
 